@@ -0,0 +1,12 @@
+## Purpose: synthetic data and throughput benchmarks for the gvcf_to_denovo calling scripts
+'''
+Modules:
+  bgzip        - BGZF compression and tabix (.tbi) indexing without htslib
+  generate     - deterministic synthetic trio gVCFs (python -m benchmark.generate)
+  run          - end to end / per stage timing, peak RSS and output equivalence of every code path
+                 (python -m benchmark.run)
+
+Example:
+  python -m benchmark.generate -o bench --length 5000000 --bgzip
+  python -m benchmark.run -d bench --paths v4-stream,v4-index,ALT,ALT-t4,ALT-merge --json bench.json
+'''
@@ -0,0 +1,149 @@
+## Purpose: BGZF compression and tabix (.tbi) indexing of VCF files, without htslib
+'''
+The inverse of denovo.bgzf / denovo.tabix, so that synthetic gVCFs can be bgzipped and indexed
+on machines without bgzip / tabix (or pysam).  Blocks hold at most BLOCK_SIZE uncompressed bytes
+and end with the standard empty EOF block; the index uses the vcf preset (sequence column 1,
+position column 2, '#' header lines, record END from END= in INFO or POS + len(REF) - 1) with
+UCSC bins (min_shift 14, depth 5) and a 16 kb linear index, like `tabix -p vcf`.
+'''
+import struct
+import zlib
+
+from denovo.evidence import record_end
+from denovo.tabix import MIN_SHIFT, TBI_MAGIC
+
+
+BLOCK_SIZE = 0xff00 # uncompressed bytes per BGZF block (as bgzip)
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+TBI_VCF = 2 # tabix format code of the vcf preset
+META_BIN = 37450 # pseudo-bin holding the file offsets and record count of a contig
+
+####################################################################################################
+## Function that deflates one block of data into a BGZF block
+####################################################################################################
+def bgzf_block(data, level=6):
+  c = zlib.compressobj(level, zlib.DEFLATED, -15)
+  cdata = c.compress(data) + c.flush()
+  head = struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, len(cdata) + 25)
+  return(head + cdata + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)))
+
+
+class BgzfWriter(object):
+  '''
+  Sequential BGZF writer.
+  write(data)  -> append bytes
+  tell()       -> virtual offset of the next byte written (coffset << 16 | offset in block)
+  close()      -> write the last block and the EOF block
+  '''
+
+  def __init__(self, path, level=6):
+    self.handle = open(path, 'wb')
+    self.level = level
+    self.buf = bytearray()
+    self.coffset = 0
+
+  def write(self, data):
+    self.buf.extend(data)
+    while len(self.buf) >= BLOCK_SIZE:
+      self._flush(BLOCK_SIZE)
+
+  def _flush(self, n):
+    block = bgzf_block(bytes(self.buf[:n]), self.level)
+    self.handle.write(block)
+    self.coffset += len(block)
+    del self.buf[:n]
+
+  def tell(self):
+    return((self.coffset << 16) | len(self.buf))
+
+  def close(self):
+    if len(self.buf) > 0:
+      self._flush(len(self.buf))
+    self.handle.write(BGZF_EOF)
+    self.handle.close()
+
+####################################################################################################
+## Function that returns the UCSC bin of a 0-based [beg, end) interval (min_shift 14, depth 5)
+####################################################################################################
+def reg2bin(beg, end):
+  end -= 1
+  for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+    if beg >> shift == end >> shift:
+      return(offset + (beg >> shift))
+  return(0)
+
+
+class TabixIndex(object):
+  '''
+  .tbi index built while the records are written.
+  add(chr, beg, end, vbeg, vend) -> index one record: 0-based [beg, end), virtual offsets of its
+                                    first byte and of the byte after it
+  write(path)                    -> write the BGZF compressed index
+  '''
+
+  def __init__(self):
+    self.names = []
+    self.refs = {} # {chr: ({bin: [[vbeg, vend], ...]}, {window: voffset}, [vbeg, vend, records])}
+
+  def add(self, chr, beg, end, vbeg, vend):
+    if not chr in self.refs:
+      self.names.append(chr)
+      self.refs[chr] = ({}, {}, [vbeg, vend, 0])
+    bins, linear, meta = self.refs[chr]
+    meta[1] = vend
+    meta[2] += 1
+    chunks = bins.setdefault(reg2bin(beg, end), [])
+    if len(chunks) > 0 and chunks[-1][1] == vbeg: # contiguous with the last chunk of the bin
+      chunks[-1][1] = vend
+    else:
+      chunks.append([vbeg, vend])
+    for w in range(beg >> MIN_SHIFT, ((max(end, beg + 1) - 1) >> MIN_SHIFT) + 1):
+      linear.setdefault(w, vbeg)
+
+  def write(self, path):
+    names = b''.join([n.encode('utf8') + b'\x00' for n in self.names])
+    out = [TBI_MAGIC, struct.pack('<8i', len(self.names), TBI_VCF, 1, 2, 0, ord('#'), 0, len(names)), names]
+    for name in self.names:
+      bins, linear, meta = self.refs[name]
+      out.append(struct.pack('<i', len(bins) + 1))
+      for b in sorted(bins):
+        out.append(struct.pack('<Ii', b, len(bins[b])))
+        for vbeg, vend in bins[b]:
+          out.append(struct.pack('<QQ', vbeg, vend))
+      out.append(struct.pack('<IiQQQQ', META_BIN, 2, meta[0], meta[1], meta[2], 0)) # no unmapped records
+      ## windows without records start where the previous one does
+      n = max(linear) + 1
+      ioff = []
+      last = linear[min(linear)]
+      for w in range(n):
+        last = linear.get(w, last)
+        ioff.append(last)
+      out.append(struct.pack('<i', n))
+      out.append(struct.pack('<%dQ'%(n), *ioff))
+    out.append(struct.pack('<Q', 0)) # records without coordinates
+
+    w = BgzfWriter(path)
+    w.write(b''.join(out))
+    w.close()
+
+####################################################################################################
+## Function that bgzips a plain text VCF to <path>.gz and writes the tabix index <path>.gz.tbi
+## return path of the bgzipped VCF
+####################################################################################################
+def bgzip_and_index(path):
+  gz = path + '.gz'
+  out = BgzfWriter(gz)
+  index = TabixIndex()
+  with open(path, 'rb') as f:
+    for raw in f:
+      vbeg = out.tell()
+      out.write(raw)
+      if raw.startswith(b'#'):
+        continue
+      tmp = raw.rstrip(b'\n').split(b'\t', 8)
+      pos = int(tmp[1])
+      end = record_end(pos, tmp[3].decode('utf8'), tmp[7].decode('utf8'))
+      index.add(tmp[0].decode('utf8'), pos - 1, end, vbeg, out.tell())
+  out.close()
+  index.write(gz + '.tbi')
+  return(gz)
@@ -0,0 +1,331 @@
+#!/usr/bin/python3
+## Purpose: deterministic synthetic trio gVCFs (proband, father, mother) for benchmarking
+'''
+Usage: python -m benchmark.generate -o <output directory> \
+                                    --seed <random seed> \
+                                    --length <bp per contig> --contigs <number of contigs> \
+                                    --block_size <mean reference block length> \
+                                    --variant_rate <proband variant records per bp> \
+                                    --multiallelic_rate <fraction of variant sites with two ALT alleles> \
+                                    --indel_rate <fraction of variant sites that are indels> \
+                                    --denovo_rate <fraction of proband variant sites absent from both parents> \
+                                    --missing_rate <fraction of variant genotypes ./.> \
+                                    --bgzip
+
+Writes GATK HaplotypeCaller style single-sample gVCFs <prefix>-pb / -fa / -mo.g.vcf (variant
+records with AD / DP / F1R2 / F2R1 / PL / SB and <NON_REF>, reference blocks with END= in between),
+the trio gVCF <prefix>-trio.g.vcf merged from them, a pedigree file and manifest.json with the
+paths and record counts used by benchmark.run.  The trio gVCF is the reference input of the
+gvcf_to_denovo_ALT.py paths, so it is not built with denovo.trio_merge (whose in-memory merge
+benchmark.run checks against it): with bcftools on PATH it is `bcftools merge -g <prefix>.ref.fa
+-m all` of the bgzipped samples, otherwise the generator writes one trio record per variant site
+from the records it generated (samples in a reference block get its GT / DP / GQ, AD '.').  The same options and seed always produce the same files.  With --bgzip every gVCF
+is also bgzipped and tabix indexed (benchmark.bgzip, no htslib needed).
+
+Inherited proband variants are carried by one or both parents with alternate read support; de novo
+variants fall in parental reference blocks; parents also carry variants of their own.
+'''
+import bisect
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+from optparse import OptionParser
+
+from benchmark.bgzip import bgzip_and_index
+from denovo.classify import is_ref_block, snv_candidate
+
+
+BASES = 'ACGT'
+VAR_FORMAT = 'GT:AD:DP:F1R2:F2R1:GQ:PL:SB'
+BLOCK_FORMAT = 'GT:DP:GQ:MIN_DP:PL'
+HEADER = ['##fileformat=VCFv4.2',
+          '##ALT=<ID=NON_REF,Description="Represents any possible alternative allele not already represented at this location by REF and ALT">',
+          '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths for the ref and alt alleles in the order listed">',
+          '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth (reads with MQ=255 or with bad mates are filtered)">',
+          '##FORMAT=<ID=F1R2,Number=R,Type=Integer,Description="Count of reads in F1R2 pair orientation supporting each allele">',
+          '##FORMAT=<ID=F2R1,Number=R,Type=Integer,Description="Count of reads in F2R1 pair orientation supporting each allele">',
+          '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype Quality">',
+          '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+          '##FORMAT=<ID=MIN_DP,Number=1,Type=Integer,Description="Minimum DP observed within the GVCF block">',
+          '##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Normalized, Phred-scaled likelihoods for genotypes as defined in the VCF specification">',
+          '##FORMAT=<ID=SB,Number=4,Type=Integer,Description="Per-sample component statistics which comprise the Fisher\'s Exact Test to detect strand bias.">',
+          '##INFO=<ID=END,Number=1,Type=Integer,Description="Stop position of the interval">',
+          '##INFO=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth; some reads may have been filtered">',
+          '##INFO=<ID=AS_RAW_MQ,Number=1,Type=String,Description="Allele-specfic raw data for RMS Mapping Quality">']
+SAMPLES = ['pb', 'fa', 'mo']
+
+
+class Settings(object):
+  '''
+  Generator settings (see the module usage for their meaning).
+  '''
+
+  def __init__(self, seed=1, length=1000000, contigs=2, block_size=30, variant_rate=0.002,
+               multiallelic_rate=0.05, indel_rate=0.1, denovo_rate=0.05, missing_rate=0.01,
+               prefix='SYN', bgzip=False):
+    self.seed = seed
+    self.length = length
+    self.contigs = contigs
+    self.block_size = block_size
+    self.variant_rate = variant_rate
+    self.multiallelic_rate = multiallelic_rate
+    self.indel_rate = indel_rate
+    self.denovo_rate = denovo_rate
+    self.missing_rate = missing_rate
+    self.prefix = prefix
+    self.bgzip = bgzip
+
+####################################################################################################
+## Function that returns the (pseudo-random, fixed) reference base at a position
+####################################################################################################
+def reference_base(pos):
+  return(BASES[((pos * 2654435761) >> 13) & 3])
+
+####################################################################################################
+## Function that formats a variant record of one sample
+## alts: ALT alleles (without <NON_REF>); carried: ALT allele index carried by the sample (0: none,
+## the sample only has reference reads); het: heterozygous (else homozygous alternate)
+####################################################################################################
+def variant_record(rng, settings, chr, pos, ref, alts, carried, het=True):
+  n = len(alts) + 2 # REF, ALTs, <NON_REF>
+  dp = rng.randint(10, 45)
+  ad = [0] * n
+  if carried == 0:
+    ad[0] = dp - rng.randint(0, 1)
+    gt = '0/0'
+  else:
+    alt_dp = int(dp * (rng.uniform(0.25, 0.6) if het else rng.uniform(0.9, 1.0)))
+    ad[carried] = alt_dp
+    ad[0] = dp - alt_dp
+    gt = '0/%d'%(carried) if het else '%d/%d'%(carried, carried)
+  if rng.random() < settings.missing_rate:
+    gt = './.'
+  f1r2 = [a // 2 for a in ad]
+  f2r1 = [a - a // 2 for a in ad]
+  pl = [0 if k == 0 else rng.randint(20, 900) for k in range(n * (n + 1) // 2)]
+  sb = [ad[0] // 2, ad[0] - ad[0] // 2, sum(ad[1:]) // 2, sum(ad[1:]) - sum(ad[1:]) // 2]
+  info = 'AS_RAW_MQ=%d.00|0.00;DP=%d'%(dp * 3600, dp)
+  sample = ':'.join([gt, ','.join(map(str, ad)), str(sum(ad)), ','.join(map(str, f1r2)), ','.join(map(str, f2r1)), str(rng.randint(20, 99)), ','.join(map(str, pl)), ','.join(map(str, sb))])
+  return('\t'.join([chr, str(pos), '.', ref, ','.join(alts + ['<NON_REF>']), '%.2f'%(rng.uniform(30, 900)), '.', info, VAR_FORMAT, sample]))
+
+####################################################################################################
+## Function that formats a reference block of one sample, chr:beg-end
+####################################################################################################
+def block_record(rng, chr, beg, end):
+  dp = rng.randint(0, 45)
+  gq = min(99, 3 * dp)
+  return('\t'.join([chr, str(beg), '.', reference_base(beg), '<NON_REF>', '.', '.', 'END=%d'%(end), BLOCK_FORMAT, '0/0:%d:%d:%d:0,%d,%d'%(dp, gq, max(0, dp - rng.randint(0, 3)), gq, 10 * gq)]))
+
+####################################################################################################
+## Function that draws the variant sites of one contig
+## return list of (pos, ref, alts, {sample: (carried ALT index, het)}) in position order
+####################################################################################################
+def contig_sites(rng, settings, length):
+  sites = []
+  pos = 1
+  rate = settings.variant_rate * 1.3 # proband sites + parent-only sites
+  while True:
+    pos += int(rng.expovariate(rate)) + 4 # sites never overlap (indels span at most 4 bp)
+    if pos >= length - 5:
+      return(sites)
+    ref = reference_base(pos)
+    others = [b for b in BASES if b != ref]
+    r = rng.random()
+    if r < settings.indel_rate / 2: # deletion
+      ref = ref + ''.join(reference_base(pos + k) for k in range(1, rng.randint(2, 4)))
+      alts = [ref[0]]
+    elif r < settings.indel_rate: # insertion
+      alts = [ref + ''.join(rng.choice(BASES) for k in range(rng.randint(1, 3)))]
+    elif r < settings.indel_rate + settings.multiallelic_rate:
+      alts = rng.sample(others, 2)
+    else:
+      alts = [rng.choice(others)]
+
+    carriers = {}
+    r = rng.random()
+    if r < 0.3 / 1.3: # parent-only site
+      carriers[rng.choice(['fa', 'mo'])] = (rng.randint(1, len(alts)), True)
+    else:
+      a = rng.randint(1, len(alts))
+      het = rng.random() > 0.1
+      carriers['pb'] = (a, het)
+      if rng.random() >= settings.denovo_rate: # inherited from one or both parents
+        parents = [rng.choice(['fa', 'mo'])] if het else ['fa', 'mo']
+        for p in parents:
+          carriers[p] = (a, True)
+        ## the other parent sometimes has a variant record without the allele
+        for p in ['fa', 'mo']:
+          if not p in carriers and rng.random() < 0.2:
+            carriers[p] = (0, True)
+    sites.append((pos, ref, alts, carriers))
+
+####################################################################################################
+## Function that writes the records of one sample for one contig: variant records at its sites,
+## reference blocks (mean length block_size) everywhere else
+## written: {'variants': {pos: columns}, 'blocks': [(beg, columns)]} of the records, for write_trio()
+####################################################################################################
+def write_sample_contig(f, rng, settings, chr, length, sites, sample, counts, written):
+  pos = 1
+  for site_pos, ref, alts, carriers in sites + [(length + 1, None, None, {sample: None})]:
+    if not sample in carriers:
+      continue
+    while pos < site_pos: # reference blocks up to the site
+      end = min(site_pos - 1, pos + int(rng.expovariate(1.0 / settings.block_size)))
+      line = block_record(rng, chr, pos, end)
+      f.write(line + '\n')
+      written['blocks'].append((pos, line.split('\t')))
+      counts['ref_blocks'] += 1
+      pos = end + 1
+    if ref is None:
+      return
+    carried, het = carriers[sample]
+    line = variant_record(rng, settings, chr, site_pos, ref, alts, carried, het)
+    f.write(line + '\n')
+    written['variants'][site_pos] = line.split('\t')
+    counts['variants'] += 1
+    pos = site_pos + len(ref)
+
+####################################################################################################
+## Function that writes the trio gVCF from the generated records, without denovo.trio_merge: one
+## record per variant site (sites never overlap and every sample with a record there has the
+## site's REF / ALT), columns of the first sample with a variant record; a sample inside a
+## reference block gets the block's GT, DP and GQ, AD '.'
+## written: {sample: {chr: write_sample_contig() records}}
+####################################################################################################
+def write_trio(path, contigs, sites, written, ids):
+  with open(path, 'w') as f:
+    for line in HEADER + ['##contig=<ID=%s,length=%d>'%(chr, length) for chr, length in contigs]:
+      f.write(line + '\n')
+    f.write('\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + [ids[s] for s in SAMPLES]) + '\n')
+    for chr, length in contigs:
+      starts = dict((s, [beg for beg, cols in written[s][chr]['blocks']]) for s in SAMPLES)
+      for site_pos, ref, alts, carriers in sites[chr]:
+        columns = [written[s][chr]['variants'].get(site_pos) for s in SAMPLES]
+        first = [cols for cols in columns if cols is not None][0]
+        samples = []
+        for s, cols in zip(SAMPLES, columns):
+          if cols is None: # inside a reference block: GT:DP:GQ:MIN_DP:PL
+            block = written[s][chr]['blocks'][bisect.bisect_right(starts[s], site_pos) - 1][1]
+            gt, dp, gq = block[9].split(':')[:3]
+            samples.append(':'.join([gt, '.', dp, '.', '.', gq, '.', '.']))
+          else:
+            samples.append(cols[9])
+        f.write('\t'.join(first[:9] + samples) + '\n')
+
+####################################################################################################
+## Function that writes the reference sequence (reference_base()) of the contigs as <path> and
+## its faidx index, for bcftools merge -g
+####################################################################################################
+def write_reference(path, contigs):
+  with open(path, 'w') as f, open(path + '.fai', 'w') as fai:
+    for chr, length in contigs:
+      f.write('>%s\n'%(chr))
+      fai.write('%s\t%d\t%d\t60\t61\n'%(chr, length, f.tell()))
+      for beg in range(1, length + 1, 60):
+        f.write(''.join(reference_base(pos) for pos in range(beg, min(beg + 60, length + 1))) + '\n')
+
+####################################################################################################
+## Function that counts the records, reference blocks and SNV candidate records of a VCF
+####################################################################################################
+def count_records(path):
+  counts = {'records': 0, 'ref_blocks': 0, 'snv_sites': 0}
+  with open(path, 'r') as f:
+    for line in f:
+      if line.startswith('#'):
+        continue
+      counts['records'] += 1
+      if is_ref_block(line):
+        counts['ref_blocks'] += 1
+      elif snv_candidate(line):
+        counts['snv_sites'] += 1
+  return(counts)
+
+####################################################################################################
+## Function that generates a synthetic trio into outdir
+## return the manifest dictionary (also written to <outdir>/manifest.json)
+####################################################################################################
+def generate(outdir, settings):
+  if not os.path.isdir(outdir):
+    os.makedirs(outdir)
+  rng = random.Random(settings.seed)
+  contigs = [('chr%d'%(k + 1), settings.length) for k in range(settings.contigs)]
+  sites = dict((chr, contig_sites(rng, settings, length)) for chr, length in contigs)
+
+  ids = dict((s, '%s-%s'%(settings.prefix, s)) for s in SAMPLES)
+  paths = {}
+  written = {}
+  for s in SAMPLES:
+    paths[s] = os.path.join(outdir, ids[s] + '.g.vcf')
+    counts = {'ref_blocks': 0, 'variants': 0}
+    srng = random.Random('%d-%s'%(settings.seed, s))
+    written[s] = dict((chr, {'variants': {}, 'blocks': []}) for chr, length in contigs)
+    with open(paths[s], 'w') as f:
+      for line in HEADER + ['##contig=<ID=%s,length=%d>'%(chr, length) for chr, length in contigs]:
+        f.write(line + '\n')
+      f.write('\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT', ids[s]]) + '\n')
+      for chr, length in contigs:
+        write_sample_contig(f, srng, settings, chr, length, sites[chr], s, counts, written[s][chr])
+
+  ## reference trio gVCF, independent of denovo.trio_merge
+  paths['trio'] = os.path.join(outdir, '%s-trio.g.vcf'%(settings.prefix))
+  if shutil.which('bcftools') is not None:
+    fasta = os.path.join(outdir, '%s.ref.fa'%(settings.prefix))
+    write_reference(fasta, contigs)
+    gz = [bgzip_and_index(paths[s]) for s in SAMPLES]
+    subprocess.check_call(['bcftools', 'merge', '-g', fasta, '-m', 'all', '-O', 'v', '-o', paths['trio']] + gz)
+    trio_source = 'bcftools merge'
+  else:
+    write_trio(paths['trio'], contigs, sites, written, ids)
+    trio_source = 'generate'
+  written = None
+
+  ped = os.path.join(outdir, '%s.ped.txt'%(settings.prefix))
+  with open(ped, 'w') as f:
+    f.write('\t'.join([settings.prefix, ids['pb'], ids['fa'], ids['mo'], '1', '2']) + '\n')
+    f.write('\t'.join([settings.prefix, ids['fa'], '0', '0', '1', '1']) + '\n')
+    f.write('\t'.join([settings.prefix, ids['mo'], '0', '0', '2', '1']) + '\n')
+
+  manifest = {'settings': vars(settings), 'ids': ids, 'trio_source': trio_source, 'ped': os.path.basename(ped), 'files': {}, 'gz': {}, 'counts': {}}
+  for s in SAMPLES + ['trio']:
+    manifest['files'][s] = os.path.basename(paths[s])
+    manifest['counts'][s] = count_records(paths[s])
+    if settings.bgzip:
+      manifest['gz'][s] = os.path.basename(bgzip_and_index(paths[s]))
+  with open(os.path.join(outdir, 'manifest.json'), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  return(manifest)
+
+
+if __name__ == '__main__':
+  defaults = Settings()
+  parser = OptionParser()
+  parser.add_option('-o', '--outdir', dest='outdir', help='output directory')
+  parser.add_option('--seed', dest='seed', type='int', default=defaults.seed, help='random seed (default %d)'%(defaults.seed))
+  parser.add_option('--length', dest='length', type='int', default=defaults.length, help='bp per contig (default %d)'%(defaults.length))
+  parser.add_option('--contigs', dest='contigs', type='int', default=defaults.contigs, help='number of contigs (default %d)'%(defaults.contigs))
+  parser.add_option('--block_size', dest='block_size', type='float', default=defaults.block_size, help='mean reference block length, bp (default %d)'%(defaults.block_size))
+  parser.add_option('--variant_rate', dest='variant_rate', type='float', default=defaults.variant_rate, help='proband variant records per bp (default %g)'%(defaults.variant_rate))
+  parser.add_option('--multiallelic_rate', dest='multiallelic_rate', type='float', default=defaults.multiallelic_rate, help='fraction of variant sites with two ALT alleles (default %g)'%(defaults.multiallelic_rate))
+  parser.add_option('--indel_rate', dest='indel_rate', type='float', default=defaults.indel_rate, help='fraction of variant sites that are indels (default %g)'%(defaults.indel_rate))
+  parser.add_option('--denovo_rate', dest='denovo_rate', type='float', default=defaults.denovo_rate, help='fraction of proband variant sites absent from both parents (default %g)'%(defaults.denovo_rate))
+  parser.add_option('--missing_rate', dest='missing_rate', type='float', default=defaults.missing_rate, help='fraction of variant genotypes set to ./. (default %g)'%(defaults.missing_rate))
+  parser.add_option('--prefix', dest='prefix', default=defaults.prefix, help='sample id prefix (default %s)'%(defaults.prefix))
+  parser.add_option('--bgzip', dest='bgzip', action='store_true', default=False, help='also bgzip and tabix index every gVCF')
+  (options, args) = parser.parse_args()
+
+  if options.outdir == None:
+    print('\n' + '## ERROR: missing arguments' + '\n')
+    parser.print_help()
+    print('\n')
+    sys.exit()
+
+  settings = Settings(options.seed, options.length, options.contigs, options.block_size, options.variant_rate,
+                      options.multiallelic_rate, options.indel_rate, options.denovo_rate, options.missing_rate,
+                      options.prefix, options.bgzip)
+  manifest = generate(options.outdir, settings)
+  print('## TRIO GVCF FROM %s'%(manifest['trio_source'].upper()))
+  for s in SAMPLES + ['trio']:
+    print('## %s: %d records, %d reference blocks, %d SNV sites'%(manifest['files'][s], manifest['counts'][s]['records'], manifest['counts'][s]['ref_blocks'], manifest['counts'][s]['snv_sites']))
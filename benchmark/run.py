@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+## Purpose: time the calling scripts end to end and per stage on a synthetic trio, and check that
+## every code path writes the same calls
+'''
+Usage: python -m benchmark.run -d <directory written by benchmark.generate (with --bgzip)> \
+                               --paths <path1,path2,...> \
+                               --repeat <runs per path, the fastest is reported> \
+                               --json <report file> \
+                               -x <proband min vaf> -y <parent max altdp> -z <parent min dp>
+
+Each code path (an entry point with one set of options, e.g. v4-stream, ALT-t4) runs in its own
+directory under <directory>/runs/.  Reported per run:
+  wall          -> end to end seconds, interpreter start included
+  lines/sec     -> input records read (proband gVCF for v4 / RT, trio gVCF for ALT) per second
+  sites/sec     -> proband SNV candidate records per second
+  peak RSS      -> maximum resident set size of the process (os.wait4)
+  stages        -> seconds per calling stage (setup, read, parse, parent, criteria, write, ...)
+                   from the --profile JSON report of the script (denovo.profile; summed over the
+                   worker processes with -t); none for RT, which has no --profile
+Paths of the same group write the same output format; each group's outputs are compared byte for
+byte with the first path of the group.  ALT-merge merges the single-sample gVCFs in memory
+(denovo.trio_merge) while the ALT group reads the trio gVCF benchmark.generate wrote without it
+(bcftools merge, or the generator's own merge); the merged text of the two differs in columns the
+calls do not depend on, so ALT-merge is compared with the ALT group on the CALL_COLUMNS of the
+calls.  The exit status is 1 if any comparison fails.  Paths needing the tabix command line
+(v4-tabix, v4-regions, RT) are skipped when it is not on PATH.
+'''
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ['setup', 'read', 'parse', 'parent', 'criteria', 'write', 'wait', 'finish'] # denovo.profile stages, reported in this order
+CALL_COLUMNS = 12 # id ... adralt: the called allele and the proband depths
+
+
+class CodePath(object):
+  '''
+  One way of calling the trio.
+  name, group   -> path name; paths of a group must write identical outputs
+  script        -> entry point (file name in the repository)
+  args(m, out)  -> command line arguments, given the manifest and the output file
+  lines         -> manifest file whose records the script reads ('pb' or 'trio')
+  tabix         -> needs the tabix command line
+  profile       -> takes --profile <JSON report> (per-stage times)
+  calls_of      -> group whose calls (CALL_COLUMNS) this path must reproduce, None if only its own
+                   group is compared
+  '''
+
+  def __init__(self, name, group, script, args, lines, tabix=False, profile=True, calls_of=None):
+    self.name = name
+    self.group = group
+    self.script = script
+    self.args = args
+    self.lines = lines
+    self.tabix = tabix
+    self.profile = profile
+    self.calls_of = calls_of
+
+####################################################################################################
+## Functions that build the arguments of the entry points (d: dataset directory, m: manifest)
+####################################################################################################
+def v4_args(engine):
+  def args(d, m, criteria, out):
+    ids = m['ids']
+    return(['-s', ids['pb'], '-p', os.path.join(d, m['gz']['pb']), '-f', os.path.join(d, m['gz']['fa']), '-m', os.path.join(d, m['gz']['mo']),
+            '-r', os.path.join(d, m['ped'])] + criteria + ['-o', out, '-e', engine, '--checkpoint_interval', '0'])
+  return(args)
+
+def rt_args(d, m, criteria, out):
+  ids = m['ids']
+  return(['-s', ids['pb'], '-p', os.path.join(d, m['files']['pb']), '-f', os.path.join(d, m['gz']['fa']), '-m', os.path.join(d, m['gz']['mo']),
+          '-r', os.path.join(d, m['ped'])] + criteria + ['-o', out])
+
+def alt_args(extra, merge=False):
+  def args(d, m, criteria, out):
+    ids = m['ids']
+    if merge:
+      gvcfs = ['--pb_gvcf', os.path.join(d, m['gz']['pb']), '--fa_gvcf', os.path.join(d, m['gz']['fa']), '--mo_gvcf', os.path.join(d, m['gz']['mo'])]
+    else:
+      gvcfs = ['-g', os.path.join(d, m['gz']['trio'])]
+    return(['-s', ids['pb'], '-f', ids['fa'], '-m', ids['mo']] + gvcfs + criteria + ['-o', out, '--checkpoint_interval', '0'] + extra)
+  return(args)
+
+
+CODE_PATHS = [CodePath('v4-auto', 'v4', 'gvcf_to_denovo_v4.py', v4_args('auto'), 'pb'),
+              CodePath('v4-stream', 'v4', 'gvcf_to_denovo_v4.py', v4_args('stream'), 'pb'),
+              CodePath('v4-interval', 'v4', 'gvcf_to_denovo_v4.py', v4_args('interval'), 'pb'),
+              CodePath('v4-index', 'v4', 'gvcf_to_denovo_v4.py', v4_args('index'), 'pb'),
+              CodePath('v4-regions', 'v4', 'gvcf_to_denovo_v4.py', v4_args('regions'), 'pb', tabix=True),
+              CodePath('v4-tabix', 'v4', 'gvcf_to_denovo_v4.py', v4_args('tabix'), 'pb', tabix=True),
+              CodePath('RT', 'v4', 'gvcf_to_denovo_RT.py', rt_args, 'pb', tabix=True, profile=False),
+              CodePath('ALT', 'ALT', 'gvcf_to_denovo_ALT.py', alt_args([]), 'trio'),
+              CodePath('ALT-scalar', 'ALT', 'gvcf_to_denovo_ALT.py', alt_args(['-b', '0']), 'trio'),
+              CodePath('ALT-t4', 'ALT', 'gvcf_to_denovo_ALT.py', alt_args(['-t', '4']), 'trio'),
+              CodePath('ALT-merge', 'ALT-merge', 'gvcf_to_denovo_ALT.py', alt_args([], merge=True), 'trio', calls_of='ALT')]
+
+####################################################################################################
+## Function that runs one command, with its output to log
+## profile: the --profile JSON report the command writes (None: no stage times)
+## return dictionary: wall, stages [(name, seconds)], peak_rss_kb, returncode
+####################################################################################################
+def timed_run(cmd, cwd, log, profile=None):
+  env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get('PYTHONPATH', ''))
+  if profile is not None:
+    cmd = cmd + ['--profile', profile]
+    if os.path.exists(profile):
+      os.remove(profile)
+  start = time.time()
+  with open(log, 'w') as logf:
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=logf, stderr=subprocess.STDOUT)
+    pid, status, rusage = os.wait4(proc.pid, 0)
+  end = time.time()
+  proc.returncode = os.waitstatus_to_exitcode(status)
+  stages = []
+  if profile is not None and os.path.exists(profile):
+    with open(profile, 'r') as f:
+      times = json.load(f)['stages']
+    stages = [(name, round(times[name], 3)) for name in STAGES if name in times]
+    stages += [(name, round(t, 3)) for name, t in sorted(times.items()) if not name in STAGES]
+  return({'wall': end - start, 'stages': stages, 'peak_rss_kb': rusage.ru_maxrss, 'returncode': proc.returncode})
+
+####################################################################################################
+## Function that returns the sha1 hex digest of a file, None if it does not exist
+####################################################################################################
+def file_sha1(path):
+  if not os.path.exists(path):
+    return(None)
+  h = hashlib.sha1()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+      h.update(chunk)
+  return(h.hexdigest())
+
+####################################################################################################
+## Function that returns the sha1 hex digest of the first CALL_COLUMNS columns of the calls in an
+## output (header included), None if it does not exist
+####################################################################################################
+def calls_sha1(path):
+  if not os.path.exists(path):
+    return(None)
+  h = hashlib.sha1()
+  with open(path, 'r') as f:
+    for line in f:
+      h.update(('\t'.join(line.rstrip('\n').split('\t')[:CALL_COLUMNS]) + '\n').encode('utf8'))
+  return(h.hexdigest())
+
+####################################################################################################
+## Function that benchmarks code paths on a generated dataset
+## return report dictionary (runs, groups)
+####################################################################################################
+def benchmark(d, paths, criteria, repeat=1):
+  with open(os.path.join(d, 'manifest.json'), 'r') as f:
+    m = json.load(f)
+  if len(m['gz']) == 0:
+    raise IOError('## ERROR: %s was generated without --bgzip'%(d))
+  has_tabix = shutil.which('tabix') is not None
+  sites = m['counts']['pb']['snv_sites']
+
+  runs = []
+  for path in paths:
+    if path.tabix and not has_tabix:
+      print('## SKIPPING %s: tabix not on PATH'%(path.name))
+      continue
+    rundir = os.path.join(d, 'runs', path.name)
+    if not os.path.isdir(rundir):
+      os.makedirs(rundir)
+    out = os.path.join(rundir, 'denovo.txt')
+    cmd = [sys.executable, os.path.join(REPO, path.script)] + path.args(os.path.abspath(d), m, criteria, os.path.abspath(out))
+    best = None
+    for r in range(repeat):
+      if os.path.exists(out):
+        os.remove(out)
+      res = timed_run(cmd, rundir, os.path.join(rundir, 'log.txt'), os.path.join(rundir, 'profile.json') if path.profile else None)
+      if best is None or res['wall'] < best['wall']:
+        best = res
+    lines = m['counts'][path.lines]['records']
+    best.update({'name': path.name, 'group': path.group, 'lines': lines, 'sites': sites,
+                 'lines_per_sec': lines / best['wall'], 'sites_per_sec': sites / best['wall'],
+                 'output': out, 'sha1': file_sha1(out), 'calls_sha1': calls_sha1(out), 'calls_of': path.calls_of})
+    best['calls'] = sum(1 for line in open(out)) - 1 if best['sha1'] is not None else None
+    runs.append(best)
+    print('## %-12s %8.2f s %10.0f lines/s %8.0f sites/s %8.1f MB peak RSS  %s calls%s'%(path.name, best['wall'], best['lines_per_sec'], best['sites_per_sec'],
+          best['peak_rss_kb'] / 1024.0, best['calls'], '' if best['returncode'] == 0 else '  (EXIT %d)'%(best['returncode'])))
+    if len(best['stages']) > 0:
+      print('##   stages: ' + ', '.join(['%s %.2f s'%(name, s) for name, s in best['stages']]))
+
+  groups = {}
+  for run in runs:
+    g = groups.setdefault(run['group'], {'reference': run['name'], 'sha1': run['sha1'], 'differs': []})
+    if run['sha1'] is None or run['sha1'] != g['sha1'] or run['returncode'] != 0:
+      g['differs'].append(run['name'])
+  ## calls of a group against those of an independent group (ALT-merge: the ALT group)
+  for run in runs:
+    ref = groups.get(run['calls_of'])
+    if run['calls_of'] is None or ref is None:
+      continue
+    g = groups[run['group']]
+    g['calls_of'] = run['calls_of']
+    if run['calls_sha1'] is None or run['calls_sha1'] != [r['calls_sha1'] for r in runs if r['name'] == ref['reference']][0]:
+      g['differs'].append(run['name'])
+  for g in groups.values():
+    g['identical'] = len(g['differs']) == 0
+  return({'dataset': os.path.abspath(d), 'trio_source': m.get('trio_source'), 'counts': m['counts'], 'criteria': criteria, 'runs': runs, 'groups': groups})
+
+
+if __name__ == '__main__':
+  parser = OptionParser()
+  parser.add_option('-d', '--dataset', dest='dataset', help='directory written by benchmark.generate --bgzip')
+  parser.add_option('--paths', dest='paths', help='comma-separated code paths to run (default all): %s'%(','.join([p.name for p in CODE_PATHS])))
+  parser.add_option('--repeat', dest='repeat', type='int', default=1, help='runs per code path; the fastest is reported (default 1)')
+  parser.add_option('--json', dest='json', help='write the report to this JSON file')
+  parser.add_option('-x', '--min_vaf', dest='pb_min_vaf', default='0.2', help='proband minimum variant allele frequency (default 0.2)')
+  parser.add_option('-y', '--max_alt', dest='par_max_alt', default='3', help='parent maximum alternate allele read depth (default 3)')
+  parser.add_option('-z', '--min_dp', dest='par_min_dp', default='5', help='parent minimum read depth (default 5)')
+  (options, args) = parser.parse_args()
+
+  if options.dataset == None:
+    print('\n' + '## ERROR: missing arguments' + '\n')
+    parser.print_help()
+    print('\n')
+    sys.exit()
+
+  paths = CODE_PATHS
+  if options.paths != None:
+    names = options.paths.split(',')
+    paths = [p for p in CODE_PATHS if p.name in names]
+  criteria = ['-x', options.pb_min_vaf, '-y', options.par_max_alt, '-z', options.par_min_dp]
+
+  report = benchmark(options.dataset, paths, criteria, options.repeat)
+  if options.json != None:
+    with open(options.json, 'w') as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+
+  print('')
+  status = 0
+  for name, g in sorted(report['groups'].items()):
+    if 'calls_of' in g:
+      reference = 'calls of %s, trio gVCF from %s'%(g['calls_of'], report['trio_source'])
+    else:
+      reference = g['reference']
+    if g['identical']:
+      print('## %s OUTPUTS IDENTICAL (reference %s)'%(name, reference))
+    else:
+      print('## %s OUTPUTS DIFFER from %s: %s'%(name, reference, ','.join(g['differs'])))
+      status = 1
+  sys.exit(status)
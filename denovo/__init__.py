@@ -0,0 +1,30 @@
+## Purpose: shared helpers for the gvcf_to_denovo calling scripts
+'''
+Modules:
+  evidence     - parse parent gVCF records overlapping a proband site (tabix semantics), LRU cache
+                 of parsed parent sites shared by alleles and siblings
+  merge_join   - streaming parent lookups in step with the sorted proband gVCF
+  bgzf         - BGZF block decoder with virtual offset seeking
+  tabix        - in-process .tbi reader answering tabix region queries
+  parent       - ParentGVCF, the persistent per-parent handle used by all lookup engines
+  intervals    - array-backed per-contig interval index (binary search / batched searchsorted)
+  regions      - batched parent queries: one tabix -R per parent for all candidate sites
+  proband      - proband gVCF input: plain, bgzipped, stdin, or contigs / a region via its index
+  progress     - progress / ETA from the input position (no line-count pre-pass)
+  writer       - buffered output writer thread: periodic flush, atomic rename on completion
+  checkpoint   - checkpoint / resume file (--checkpoint, --resume) for preemptible runs
+  classify     - raw-line pre-classifier rejecting reference blocks, indels and '*' records
+  vectorized   - NumPy batch evaluation of the de novo calling criteria
+  cohort       - families from sample map + ped, position-merged reading of sibling gVCFs
+  trio_merge   - streaming in-memory merge of proband / father / mother gVCFs into trio records
+  joint        - all trios of a joint-called multi-sample VCF evaluated together on each record
+  columns      - projection of the fixed and trio sample columns out of wide multi-sample VCF lines
+  profile      - per-stage wall times and skip reason counters, JSON report (--profile)
+  engine       - the trio calling engine: one record pipeline (TrioCaller) for all calling scripts
+  backends     - parent evidence backends of the engine: stream, regions, interval, index, tabix,
+                 merged trio columns
+  planner      - per-contig choice of streaming or random-access parent lookups (-e auto)
+  metrics      - per-sample performance summary of the shard metrics sidecars, straggler shards
+  records      - compact record types of the hot path: interned FORMAT layouts, slotted candidates
+                 and parent evidence
+'''
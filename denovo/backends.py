@@ -0,0 +1,175 @@
+## Purpose: parent evidence backends of the trio calling engine (denovo.engine)
+'''
+For every proband SNV allele the engine asks one backend per parent what that parent's data
+says at the site:
+  evidence(site, a, altidx) -> ParentEvidence (denovo.records: altdp, dp, fmt, gt, info as in
+                               the parse_parent() dictionary; depths are ints from parent gVCF
+                               files, gVCF strings from trio columns), or a skip reason
+                               ('missing_gt', 'missing_ad_dp') when the parent's data rules the
+                               allele out
+  close()                   -> release readers, streams and subprocesses
+site is a denovo.engine.Site (chr, pos, tmp, layout, ...), a the proband allele and altidx its
+index in the proband ALT column (1-based, as in AD).  The file backends share a SiteCache
+(denovo.evidence) keyed by (parent gVCF, chr, pos): the other alleles of a multiallelic site
+and the siblings of a cohort run get the parsed parent site without another fetch.
+
+Backends over a parent gVCF file (open_parents(), the -e engines of gvcf_to_denovo_v4.py):
+  auto      - stream or random access (index, or tabix without a local .tbi) chosen per contig
+              from the proband candidate density (denovo.planner)
+  stream    - merge-join: the parent is read sequentially in step with the sorted proband
+              (denovo.merge_join; in-process reader when the .tbi is local, else one tabix
+              stream per contig)
+  regions   - one batched `tabix -R` per parent for all proband candidate sites, then streamed
+              (denovo.regions)
+  interval  - per-contig interval index of the parent: the proband candidate positions of each
+              contig resolved in one batch, parent lines parsed only for sites that are not in
+              a reference block (denovo.intervals)
+  index     - in-process .tbi region query per site (denovo.tabix via denovo.parent)
+  tabix     - one `tabix` subprocess per site (remote gVCFs without a local index)
+TrioColumns reads the parent's sample column of a merged trio (or joint-called) record instead,
+without any I/O (gvcf_to_denovo_ALT.py).
+'''
+import contextlib
+
+from denovo.evidence import SiteCache
+from denovo.intervals import IntervalIndex, candidate_positions
+from denovo.merge_join import ParentStream
+from denovo.parent import ParentGVCF
+from denovo.records import ParentEvidence
+from denovo.regions import batch_parent_queries
+
+
+BACKENDS = ['auto', 'stream', 'regions', 'interval', 'index', 'tabix']
+LOCAL_INDEX_BACKENDS = ['interval', 'index'] # need a local .tbi for each parent
+
+
+class FileBackend(object):
+  '''
+  Parent evidence from a parent gVCF file.
+  name     -> backend name (BACKENDS)
+  parent   -> the ParentGVCF / RegionBatch holding the file
+  lookup   -> object answering lines(chr, pos) (the parent itself, a ParentStream or an
+              IntervalIndex)
+  cache    -> SiteCache of parsed parent sites
+  '''
+
+  def __init__(self, name, parent, lookup, cache):
+    self.name = name
+    self.parent = parent
+    self.lookup = lookup
+    self.cache = cache
+
+  def evidence(self, site, a, altidx):
+    return(self.cache.site(self.parent.gvcf, self.lookup, site.chr, site.pos).evidence(a))
+
+  def close(self):
+    if self.lookup is not self.parent and hasattr(self.lookup, 'close'):
+      self.lookup.close()
+    self.parent.close()
+
+
+class IntervalBackend(FileBackend):
+  '''
+  Parent evidence from the interval index of a parent gVCF: sites resolved from the batched
+  depths of the contig (IntervalIndex.block()), the others parsed from their lines.
+  '''
+
+  def evidence(self, site, a, altidx):
+    ev = self.lookup.block(site.chr, site.pos)
+    if ev != None:
+      return(ev)
+    return(FileBackend.evidence(self, site, a, altidx))
+
+
+class PlannedBackend(object):
+  '''
+  Parent evidence from a parent gVCF file, streamed or looked up per site depending on the contig.
+  plan     -> {contig: 'stream' | 'random'} (denovo.planner); contigs not in the plan are streamed
+  Both ways share one ParentGVCF: its in-process reader re-seeks for every streamed line, so
+  random lookups in between do not disturb the stream.
+  '''
+  name = 'auto'
+
+  def __init__(self, parent, plan, cache):
+    self.parent = parent
+    self.plan = plan
+    self.cache = cache
+    self.stream = ParentStream(parent)
+
+  def evidence(self, site, a, altidx):
+    source = self.parent if self.plan.get(site.chr, 'stream') == 'random' else self.stream
+    return(self.cache.site(self.parent.gvcf, source, site.chr, site.pos).evidence(a))
+
+  def close(self):
+    self.stream.close()
+    self.parent.close()
+
+
+class TrioColumns(object):
+  '''
+  Parent evidence from the parent's sample column of a merged trio record.
+  column   -> index of the parent's column in the (projected) record
+  The parent must have a called genotype and AD and DP; AD '.' or a '.' allele depth count as 0.
+  '''
+  name = 'trio'
+
+  def __init__(self, column):
+    self.column = column
+
+  def evidence(self, site, a, altidx):
+    sample = site.tmp[self.column]
+    layout, values = site.layout, sample.split(':')
+    if layout.value(values, 'GT') == './.':
+      return('missing_gt')
+    if not (layout.has(values, 'AD') and layout.has(values, 'DP')):
+      return('missing_ad_dp')
+
+    ad = layout.value(values, 'AD')
+    if ad == '.': # handle case where AD is just .
+      altdp = '0'
+    else:
+      altdp = ad.split(',')[altidx]
+      if altdp == '.': # handle case where AD is 10,.,3
+        altdp = '0'
+    return(ParentEvidence(altdp, layout.value(values, 'DP'), site.format, sample, None))
+
+  def close(self):
+    pass
+
+####################################################################################################
+## Function that opens the father and mother backends of one parent gVCF engine
+## proband: function returning the proband lines, read once more by the 'regions' and 'interval'
+## engines to collect the candidate sites (None: 'interval' parses the lines of every site)
+## plan: {contig: 'stream' | 'random'} of the 'auto' engine
+## cache: SiteCache shared by both parents (a new one if None; pass one to share it further)
+## return (father backend, mother backend)
+####################################################################################################
+def open_parents(engine, fa_gvcf, mo_gvcf, proband=None, plan=None, cache=None):
+  if cache == None:
+    cache = SiteCache()
+  if engine == 'auto': # one handle per parent (in-process reader when the .tbi is local), mode per contig
+    if plan == None:
+      plan = {}
+    return((PlannedBackend(ParentGVCF(fa_gvcf), plan, cache), PlannedBackend(ParentGVCF(mo_gvcf), plan, cache)))
+  if engine == 'regions': # two-step mode: collect proband candidate sites, then one tabix -R query per parent
+    parents = batch_parent_queries(proband(), fa_gvcf, mo_gvcf)
+  else:
+    in_process = {'stream': None, 'interval': True, 'index': True, 'tabix': False}[engine]
+    parents = (ParentGVCF(fa_gvcf, in_process=in_process), ParentGVCF(mo_gvcf, in_process=in_process))
+
+  sites = None
+  if engine == 'interval' and proband != None: # candidate positions, resolved per contig in one batch
+    with contextlib.closing(proband()) as lines:
+      sites = candidate_positions(lines)
+
+  backends = []
+  for parent in parents:
+    if engine in ['stream', 'regions']: # sweep over parent records following the sorted proband gVCF
+      lookup = ParentStream(parent)
+    elif engine == 'interval': # per-contig interval index, depths of the candidate sites in one batch
+      backends.append(IntervalBackend(engine, parent, IntervalIndex(parent, sites), cache))
+      continue
+    else: # random access per site
+      lookup = parent
+    backends.append(FileBackend(engine, parent, lookup, cache))
+  return(tuple(backends))
@@ -0,0 +1,268 @@
+## Purpose: minimal BGZF (blocked gzip) reader with virtual offset seeking
+'''
+A BGZF file is a series of independent gzip members ("blocks") of at most 64 KB of
+uncompressed data each.  Positions inside the file are 64-bit virtual offsets:
+  (compressed offset of the block start << 16) | offset within the uncompressed block
+which is what tabix indexes store.  Because blocks are independent, a sequential read can
+inflate many of them at once on a thread pool (zlib releases the GIL) and still hand the
+lines out in file order.
+'''
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import struct
+import sys
+import zlib
+
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+DEFAULT_THREADS = min(4, os.cpu_count() or 1)
+
+####################################################################################################
+## Function that checks whether a file is BGZF compressed (starts with a BGZF block header)
+####################################################################################################
+def is_bgzf(path):
+  with open(path, 'rb') as f:
+    return(f.read(4) == BGZF_MAGIC)
+
+####################################################################################################
+## Function that reads and inflates the BGZF block starting at compressed offset coffset
+## return (uncompressed data, compressed size of the block); (b'', 0) at end of file
+####################################################################################################
+def read_block(handle, coffset):
+  handle.seek(coffset)
+  cdata, bsize = read_raw_block(handle)
+  if bsize == 0:
+    return(b'', 0)
+  return(zlib.decompress(cdata, -15), bsize)
+
+####################################################################################################
+## Function that reads the BGZF block at the current position of handle without inflating it
+## return (raw deflate data, compressed size of the block); (b'', 0) at end of file
+####################################################################################################
+def read_raw_block(handle):
+  coffset = handle.tell()
+  head = handle.read(12)
+  if len(head) < 12:
+    return(b'', 0)
+  if head[:4] != BGZF_MAGIC:
+    raise IOError('## ERROR: not a BGZF block at offset %d of %s'%(coffset, handle.name))
+  xlen = struct.unpack('<H', head[10:12])[0]
+  extra = handle.read(xlen)
+
+  ## locate the BC subfield holding the total block size - 1
+  bsize = None
+  i = 0
+  while i < xlen:
+    si1, si2, slen = struct.unpack('<BBH', extra[i:i+4])
+    if si1 == 66 and si2 == 67:
+      bsize = struct.unpack('<H', extra[i+4:i+6])[0] + 1
+    i += 4 + slen
+  if bsize is None:
+    raise IOError('## ERROR: missing BGZF block size at offset %d of %s'%(coffset, handle.name))
+
+  cdata = handle.read(bsize - xlen - 20)
+  handle.read(8) # CRC32 + ISIZE
+  return(cdata, bsize)
+
+####################################################################################################
+## Function that yields (compressed block size, inflated data) of consecutive BGZF blocks from
+## compressed offset coffset on, in file order; with threads > 1 up to 8 blocks per thread are
+## inflated ahead on a thread pool
+####################################################################################################
+def inflate_blocks(path, threads=DEFAULT_THREADS, coffset=0):
+  with open(path, 'rb') as handle:
+    handle.seek(coffset)
+    if threads <= 1:
+      while True:
+        cdata, bsize = read_raw_block(handle)
+        if bsize == 0:
+          return
+        yield (bsize, zlib.decompress(cdata, -15))
+
+    pool = ThreadPoolExecutor(threads)
+    try:
+      pending = deque()
+      eof = False
+      while True:
+        while not eof and len(pending) < 8 * threads:
+          cdata, bsize = read_raw_block(handle)
+          if bsize == 0:
+            eof = True
+          else:
+            pending.append((bsize, pool.submit(zlib.decompress, cdata, -15)))
+        if len(pending) == 0:
+          return
+        bsize, data = pending.popleft()
+        yield (bsize, data.result())
+    finally:
+      pool.shutdown(wait=True, cancel_futures=True)
+
+####################################################################################################
+## Function that yields the text lines of a BGZF file (with trailing newline, as iterating over an
+## open text file does), starting at virtual offset voffset
+## progress (denovo.progress.Progress, optional) is advanced by the compressed size of each block,
+## and progress.resume is set to the exact virtual offset of the line being yielded whenever it is
+## known (the first line completed in each block; None otherwise), for checkpoints
+####################################################################################################
+def bgzf_lines(path, threads=DEFAULT_THREADS, voffset=0, progress=None):
+  rest = b''
+  rest_voffset = voffset # virtual offset at which the pending partial line starts
+  skip = voffset & 0xFFFF
+  coffset = voffset >> 16
+  for bsize, data in inflate_blocks(path, threads, coffset):
+    if progress is not None:
+      progress.position += bsize
+    start = skip
+    if skip > 0:
+      data = data[skip:]
+      skip = 0
+    buf = rest + data
+    cut = buf.rfind(b'\n') + 1
+    if cut > 0:
+      lines = buf[:cut].decode('utf8').split('\n')[:-1]
+      for k, line in enumerate(lines):
+        if progress is not None:
+          progress.resume = rest_voffset if k == 0 else None
+        yield line + '\n'
+      within = start + cut - len(rest)
+      if within >= start + len(data):
+        rest_voffset = (coffset + bsize) << 16
+      else:
+        rest_voffset = (coffset << 16) | within
+      rest = buf[cut:]
+    else:
+      rest = buf
+    coffset += bsize
+  if rest != b'':
+    if progress is not None:
+      progress.resume = rest_voffset
+    yield rest.decode('utf8')
+
+####################################################################################################
+## Function that yields the header lines of a VCF (plain text or BGZF), i.e. the leading '#' lines
+####################################################################################################
+def header_lines(path):
+  if not is_bgzf(path):
+    with open(path, 'rb') as f:
+      for raw in f:
+        if not raw.startswith(b'#'):
+          return
+        yield raw.decode('utf8')
+    return
+
+  lines = bgzf_lines(path, 1)
+  try:
+    for line in lines:
+      if not line.startswith('#'):
+        return
+      yield line
+  finally:
+    lines.close()
+
+####################################################################################################
+## Function that yields the text lines of a VCF: plain text, BGZF (inflated on threads) or '-' (stdin)
+## progress (optional) gets the file size, is advanced by the bytes read (compressed for BGZF) and
+## gets the exact resume offset of lines where known (byte offset, or BGZF virtual offset)
+## resume (optional) is such an offset: the header lines are yielded, then reading continues there
+####################################################################################################
+def vcf_lines(path, threads=DEFAULT_THREADS, progress=None, resume=None):
+  if path == '-':
+    if resume is not None:
+      raise IOError('## ERROR: cannot resume reading from stdin')
+    for line in sys.stdin:
+      yield line
+    return
+
+  if progress is not None:
+    progress.size = os.path.getsize(path)
+  if resume is not None:
+    for line in header_lines(path):
+      yield line
+
+  if is_bgzf(path):
+    voffset = 0
+    if resume is not None:
+      voffset = resume
+      if progress is not None:
+        progress.position = resume >> 16
+    for line in bgzf_lines(path, threads, voffset, progress):
+      yield line
+  else:
+    with open(path, 'rb') as f:
+      if resume is not None:
+        f.seek(resume)
+        if progress is not None:
+          progress.position = resume
+      for raw in f:
+        if progress is not None:
+          progress.resume = progress.position
+          progress.position += len(raw)
+        yield raw.decode('utf8')
+
+
+class BgzfReader(object):
+  '''
+  Line reader over a BGZF file that keeps its handle open.
+  seek()/tell() use virtual offsets, readline() returns bytes including the trailing newline.
+  cache_size > 0 keeps that many recently inflated blocks in an LRU cache, so that
+  repeated queries into the same region of the file are not decompressed again.
+  '''
+
+  def __init__(self, path, cache_size=0):
+    self.path = path
+    self.handle = open(path, 'rb')
+    self.cache_size = cache_size
+    self.cache = OrderedDict() # {compressed offset: (data, block size)}
+    self.hits = 0
+    self.misses = 0
+    self.block_start = 0
+    self.block_size = 0
+    self.data = b''
+    self.within = 0
+    self._load(0)
+
+  def _load(self, coffset):
+    if coffset in self.cache:
+      self.cache.move_to_end(coffset)
+      self.data, self.block_size = self.cache[coffset]
+      self.hits += 1
+    else:
+      self.data, self.block_size = read_block(self.handle, coffset)
+      self.misses += 1
+      if self.cache_size > 0:
+        self.cache[coffset] = (self.data, self.block_size)
+        if len(self.cache) > self.cache_size:
+          self.cache.popitem(last=False)
+    self.block_start = coffset
+    self.within = 0
+
+  def seek(self, voffset):
+    coffset = voffset >> 16
+    if coffset != self.block_start or self.block_size == 0:
+      self._load(coffset)
+    self.within = voffset & 0xFFFF
+
+  def tell(self):
+    ## normalize the end of a block to the start of the next one (as htslib does)
+    if self.within >= len(self.data) and self.block_size > 0:
+      return((self.block_start + self.block_size) << 16)
+    return((self.block_start << 16) | self.within)
+
+  def readline(self):
+    parts = []
+    while True:
+      nl = self.data.find(b'\n', self.within)
+      if nl != -1:
+        parts.append(self.data[self.within:nl+1])
+        self.within = nl + 1
+        break
+      parts.append(self.data[self.within:])
+      if self.block_size == 0: # end of file
+        self.within = len(self.data)
+        break
+      self._load(self.block_start + self.block_size)
+    return(b''.join(parts))
+
+  def close(self):
+    self.handle.close()
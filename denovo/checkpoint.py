@@ -0,0 +1,100 @@
+## Purpose: checkpoint / resume file for preemptible calling runs
+'''
+A preempted call_denovos shard used to restart from the first input line.  With --checkpoint
+<file> the calling loop periodically hands its position to the output writer thread, which writes
+out every queued record, fsyncs <output>.tmp and then atomically replaces <file> (JSON):
+  signature     - the arguments of the run and the size of each local input file; a checkpoint of
+                  a different run is never resumed
+  target        - contig / region index being read (--contigs / --region input, else 0)
+  offset        - exact input offset of the first unprocessed line (byte or BGZF virtual offset)
+  output_bytes  - length of the partial output holding the calls of every line before offset
+  output        - that partial output itself
+  lines, calls  - counters at that point
+(the ALT --threads path records completed ranges instead of target/offset).  The checkpoint holds
+the partial output, so it is the only file that has to survive a restart, e.g. as the Cromwell
+checkpointFile of the task.  Checkpoints are only written with --checkpoint, and only read with
+--resume: a restarted run rewrites <output>.tmp from the checkpoint and continues reading at
+offset; without --resume an existing checkpoint is overwritten by the new run.
+'''
+import json
+import os
+import time
+
+
+DEFAULT_CHECKPOINT_INTERVAL = 300 # seconds between checkpoints; 0 disables checkpointing
+
+
+####################################################################################################
+## Function that returns [path, size] of each input file, for checkpoint signatures
+## (size None for stdin and remote paths; local mtimes do not survive re-localization of inputs)
+####################################################################################################
+def input_sizes(paths):
+  sizes = []
+  for path in paths:
+    if path != None and path != '-' and os.path.isfile(path):
+      sizes.append([path, os.path.getsize(path)])
+    else:
+      sizes.append([path, None])
+  return(sizes)
+
+
+class Checkpoint(object):
+  '''
+  Checkpoint file of one output file.
+  path, enabled -> the checkpoint file (None disables checkpointing)
+  due()        -> True when the checkpoint interval has passed since the last one
+  exists()     -> True if the checkpoint file exists
+  load()       -> saved state of the same run, with <output>.tmp rewritten from the checkpoint;
+                  None otherwise (start from scratch)
+  save(state)  -> atomically replace the checkpoint (called on the writer thread after fsync)
+  remove()     -> delete the checkpoint once the output is complete
+  '''
+
+  ## signature: the arguments of the run; inputs: its input files (size-checked before resuming)
+  def __init__(self, path, output_file, signature, inputs=[], interval=DEFAULT_CHECKPOINT_INTERVAL):
+    self.path = path
+    self.output_tmp = output_file + '.tmp'
+    self.signature = [signature, input_sizes(inputs)]
+    self.interval = interval
+    self.enabled = path != None and interval > 0
+    self.next_time = time.time() + interval
+
+  def due(self):
+    if not self.enabled or time.time() < self.next_time:
+      return(False)
+    self.next_time = time.time() + self.interval
+    return(True)
+
+  def exists(self):
+    return(self.path != None and os.path.exists(self.path))
+
+  def load(self):
+    if not self.enabled or not self.exists():
+      return(None)
+    try:
+      with open(self.path, 'r') as f:
+        state = json.load(f)
+    except ValueError:
+      return(None)
+    if state.get('signature') != self.signature:
+      return(None)
+    output = state.pop('output').encode('latin-1')
+    if len(output) != state['output_bytes']:
+      return(None)
+    with open(self.output_tmp, 'wb') as f:
+      f.write(output)
+    return(state)
+
+  def save(self, state):
+    with open(self.output_tmp, 'rb') as f:
+      output = f.read(state['output_bytes'])
+    state = dict(state, signature=self.signature, output=output.decode('latin-1'))
+    with open(self.path + '.tmp', 'w') as f:
+      json.dump(state, f)
+      f.flush()
+      os.fsync(f)
+    os.replace(self.path + '.tmp', self.path)
+
+  def remove(self):
+    if self.exists():
+      os.remove(self.path)
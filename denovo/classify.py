@@ -0,0 +1,41 @@
+## Purpose: pre-classification of raw gVCF record lines, before they are split into columns
+'''
+The calling loops split every record line into a full column list (one string per column, and
+per sample on multi-sample lines) before looking at it, although most gVCF records are END=
+reference blocks that can never yield a call.  snv_candidate() rejects
+  - reference blocks (INFO starting with END=) with two scans of the raw line: find the first
+    '\tEND=' and count the tabs before it (INFO is the 8th column) - nothing is allocated,
+  - records whose REF is not a single base (indels), and
+  - records without a single-base ALT allele other than '*' (after the usual ',<NON_REF>' strip)
+looking at the first five columns only (split('\t', 5)), never the sample columns.  It only
+rejects lines the per-allele criteria would reject anyway, so the full parser sees every line
+that can produce a call.  Columns are located by the fixed VCF column order
+CHROM POS ID REF ALT QUAL FILTER INFO.
+'''
+
+####################################################################################################
+## Function that tells whether a gVCF record line is a reference block (INFO starting with END=):
+## the first '\tEND=' is the tab opening INFO, i.e. 6 tabs precede it
+####################################################################################################
+def is_ref_block(line):
+  k = line.find('\tEND=')
+  return(k >= 0 and line.count('\t', 0, k) == 6)
+
+####################################################################################################
+## Function that tells whether a gVCF record line may hold a proband SNV allele
+## return False for reference blocks, indels and '*'-only records; True otherwise (including
+## lines too short to classify, which are left to the full parser)
+####################################################################################################
+def snv_candidate(line):
+  if is_ref_block(line): # non-variant block
+    return(False)
+
+  tmp = line.split('\t', 5)
+  if len(tmp) < 6:
+    return(True)
+  if len(tmp[3]) != 1: # REF is not a single base
+    return(False)
+  for a in tmp[4].strip(',<NON_REF>').split(','):
+    if len(a) == 1 and a != '*':
+      return(True)
+  return(False)
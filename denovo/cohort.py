@@ -0,0 +1,114 @@
+## Purpose: cohort mode helpers: families from sample map + ped, merged reading of sibling gVCFs
+'''
+parse_sample_map.py resolves one child per run, so the parents of a quad are localized and
+scanned once per child.  read_families() groups the children of the pedigree by parent pair and
+sibling_records() merges the gVCF records of all children of a couple into one position-sorted
+stream (contig order from the ##contig header lines), so that one sequential ParentStream per
+parent answers the lookups of every child in a single pass.
+'''
+import heapq
+import itertools
+
+
+class Family(object):
+  '''
+  Children of one father / mother pair.
+  fid, fa, mo    -> family id (first ped column) and parent ids
+  children       -> child ids, in pedigree order
+  paths          -> {id: gVCF path} of the parents and children (from the sample map)
+  '''
+
+  def __init__(self, fid, fa, mo):
+    self.fid = fid
+    self.fa = fa
+    self.mo = mo
+    self.children = []
+    self.paths = {}
+
+####################################################################################################
+## Function that reads a picard sample map (id <tab> gVCF path)
+## return {id: path}
+####################################################################################################
+def read_sample_map(sample_map):
+  pathd = {}
+  with open(sample_map, 'r') as smapf:
+    for line in smapf:
+      tmp = line.strip().split('\t')
+      if len(tmp) < 2:
+        continue
+      pathd[tmp[0]] = tmp[1]
+  return(pathd)
+
+####################################################################################################
+## Function that groups the children of a plink pedigree by parent pair
+## children without both parents listed are skipped; samples missing from the sample map raise KeyError
+## fids (optional): only the families with these ids (first ped column)
+## return list of Family, in pedigree order of their first child
+####################################################################################################
+def read_families(ped, sample_map, fids=None):
+  pathd = read_sample_map(sample_map)
+  families = {} # {(fa, mo): Family}
+  with open(ped, 'r') as pedf:
+    for line in pedf:
+      tmp = line.strip().split('\t')
+      if len(tmp) < 4:
+        continue
+      fid, sid, faid, moid = tmp[0], tmp[1], tmp[2], tmp[3]
+      if faid == '0' or moid == '0': # parent sample
+        continue
+      if fids is not None and not fid in fids:
+        continue
+      if not (faid, moid) in families:
+        families[(faid, moid)] = Family(fid, faid, moid)
+        families[(faid, moid)].paths[faid] = pathd[faid]
+        families[(faid, moid)].paths[moid] = pathd[moid]
+      families[(faid, moid)].children.append(sid)
+      families[(faid, moid)].paths[sid] = pathd[sid]
+  return(list(families.values()))
+
+####################################################################################################
+## Function that returns the contigs declared by VCF header lines (##contig=<ID=...>), in order
+####################################################################################################
+def contig_order(header):
+  order = []
+  for line in header:
+    if line.startswith('##contig=<ID='):
+      order.append(line[len('##contig=<ID='):].split(',', 1)[0].split('>', 1)[0])
+  return(order)
+
+####################################################################################################
+## Function that merges the lines of several position-sorted gVCFs into one sorted stream
+## streams: list of line iterables (header first, as denovo.proband.proband_lines yields them)
+## return generator of (k, idx, line): stream number, {column: index} of its #CHROM line, record line
+## ties (same position) come in stream order; records of a contig without a ##contig header line
+## raise KeyError
+####################################################################################################
+def sibling_records(streams):
+  ranks = {}
+  heads = []
+  for k, lines in enumerate(streams):
+    lines = iter(lines)
+    header = []
+    idx = None
+    first = None
+    for line in lines:
+      if not line.startswith('#'):
+        first = line
+        break
+      header.append(line)
+      if line.startswith('#CHROM'):
+        idx = {col:index for index, col in enumerate(line.strip().split('\t'))}
+    for chr in contig_order(header):
+      ranks.setdefault(chr, len(ranks))
+    heads.append((idx, first, lines))
+
+  def keyed(k, idx, first, lines):
+    if first is None:
+      return
+    for line in itertools.chain([first], lines):
+      tmpv = line.split('\t', 2)
+      yield ((ranks[tmpv[0]], int(tmpv[1]), k), idx, line)
+
+  merged = heapq.merge(*[keyed(k, idx, first, lines) for k, (idx, first, lines) in enumerate(heads)], key=lambda r: r[0])
+  for key, idx, line in merged:
+    yield (key[2], idx, line)
@@ -0,0 +1,52 @@
+## Purpose: project the fixed columns and a few sample columns out of wide multi-sample VCF lines
+'''
+gvcf_to_denovo_ALT.py splits every record line on tabs (line.strip().split('\t')), which builds
+one string per sample column of a cohort-wide VCF just so that the proband, father and mother
+columns can be indexed.  ColumnProjector keeps #CHROM ... FORMAT and the requested sample columns
+only: on wide lines the tab positions are found in one NumPy pass over the line bytes and the
+wanted columns are sliced out between the tabs around them, so the number of Python strings
+built per line depends on the trio, not on the cohort width.  Narrow lines (e.g. a trio gVCF),
+non-ASCII lines and runs without NumPy are split whole as before.
+'''
+from denovo.vectorized import np
+
+
+WIDE_COLUMNS = 64 # lines with fewer columns are split whole
+
+
+class ColumnProjector(object):
+  '''
+  Projection of VCF record lines onto the fixed columns and some sample columns.
+  keep         -> header column indices kept, in header order
+  idx          -> {column: index} of the projected records (same names as the #CHROM line)
+  split(line)  -> projected columns of one record line (as line.strip().split('\t') restricted to
+                  keep), None if the line does not have one field per header column
+  '''
+
+  def __init__(self, columns, samples):
+    self.ncols = len(columns)
+    self.fixed = columns.index('FORMAT') + 1
+    self.keep = list(range(self.fixed)) + sorted(set([columns.index(s) for s in samples]))
+    self.idx = dict((columns[c], k) for k, c in enumerate(self.keep))
+    self.whole = np is None or self.ncols < WIDE_COLUMNS
+    self.identity = self.keep == list(range(self.ncols))
+
+  def split(self, line):
+    if self.whole or not line.isascii(): # byte offsets are character offsets only for ASCII
+      tmp = line.strip().split('\t')
+      if len(tmp) != self.ncols:
+        return(None)
+      if self.identity:
+        return(tmp)
+      return([tmp[c] for c in self.keep])
+
+    tabs = np.flatnonzero(np.frombuffer(line.encode('ascii'), dtype=np.uint8) == 9)
+    if len(tabs) != self.ncols - 1:
+      return(None)
+    tmp = line[:tabs[self.fixed-1]].lstrip().split('\t')
+    for c in self.keep[self.fixed:]:
+      if c == self.ncols - 1: # last column: up to the end of the line
+        tmp.append(line[tabs[c-1]+1:].strip())
+      else:
+        tmp.append(line[tabs[c-1]+1:tabs[c]])
+    return(tmp)
@@ -0,0 +1,292 @@
+## Purpose: the trio calling engine: one record pipeline over pluggable parent evidence backends
+'''
+Every calling script used to carry its own copy of the per-record loop body (split multiallelic
+sites, parse the proband sample, look the parents up, apply the criteria, format the call).
+TrioCaller is that loop body, once:
+  record     -> reference blocks (record-level skip)
+  alleles    -> '*' and indel alleles skipped; SNV alleles in ALT order
+  proband    -> proband evidence of the allele (proband())
+  criteria   -> de novo criteria as a lazy chain in cost order: proband predicates, father
+                lookup (denovo.backends) and predicates, mother lookup and predicates (only
+                for alleles the father leaves viable), optional parent GT blacklist; NumPy
+                masks over fully looked up batches in call_batch()
+  output     -> output record (format())
+with profiling stages and skip reasons recorded on the way (denovo.profile).  The two output
+formats of the scripts are the two subclasses:
+  GVCFTrioCaller    - proband gVCF (sample in the last column) + parent gVCF backends
+                      (gvcf_to_denovo_v4.py, gvcf_to_denovo_RT.py, gvcf_to_denovo_cohort.py)
+  MergedTrioCaller  - merged trio gVCF, parents from their sample columns (TrioColumns)
+                      (gvcf_to_denovo_ALT.py)
+so any backend can be swapped in and compared on the same records, e.g.
+  fa, mo = open_parents('index', fa_gvcf, mo_gvcf)
+  caller = GVCFTrioCaller(sample_id, idx, fa, mo, Criteria(0.2, 3, 5))
+  records = caller.call(line.strip().split('\t'))
+'''
+from denovo.backends import TrioColumns
+from denovo.profile import NullProfile
+from denovo.records import Candidate, format_layout
+from denovo.vectorized import AlleleBatch
+
+
+OUTPUT_HEAD = ['id', 'chr', 'pos', 'ref', 'alt', 'refdp', 'altdp', 'dp', 'adfref', 'adfalt', 'adrref', 'adralt', 'CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT', 'S_GT', 'FA_FORMAT', 'FA_GT', 'MO_FORMAT', 'MO_GT']
+TRIO_OUTPUT_HEAD = ['id', 'chr', 'pos', 'ref', 'alt', 'refdp', 'altdp', 'dp', 'adfref', 'adfalt', 'adrref', 'adralt', 'CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT', 'S_GT', 'FA_GT', 'MO_GT']
+
+## parental genotypes rejected by gvcf_to_denovo_RT.py (compared with the whole parent sample column)
+GT_BLACKLIST = ['0/1', '0|1', '0/2', '0|2', '1/1', '1|1', '1/2', '1|2', '2/2', '2|2', '1/0', '1|0', '1/3', '1|3', '2/3', '2|3', '3/3', '3|3']
+
+
+class Site(object):
+  '''
+  One split record line being called.
+  tmp              -> the record's columns
+  chr, pos, ref    -> proband variant information (strings, as in the gVCF)
+  alts             -> ALT alleles without <NON_REF>
+  format, layout   -> FORMAT column, and its interned layout (denovo.records.FormatLayout)
+  '''
+  __slots__ = ('tmp', 'chr', 'pos', 'ref', 'alts', 'format', 'layout')
+
+  def __init__(self, tmp, idx):
+    self.tmp = tmp
+    self.chr, self.pos, self.ref = tmp[idx['#CHROM']], tmp[idx['POS']], tmp[idx['REF']]
+    self.alts = tmp[idx['ALT']].strip(',<NON_REF>').split(',')
+    self.format = tmp[idx['FORMAT']]
+    self.layout = format_layout(self.format)
+
+
+class TrioCaller(object):
+  '''
+  Record pipeline calling one proband against two parent backends.
+  head               -> output header (list of column names)
+  lazy               -> call() looks the parents up inside the criteria chain (True), or before it
+  proband_candidates(tmp) -> candidate alleles (denovo.records.Candidate) of one split record
+                        with the proband evidence (a, altidx, values, pb_* depths, site)
+  candidates(tmp)    -> the same with both parents looked up (fa_*, mo_* depths, fa / mo
+                        ParentEvidence); alleles a parent's data rules out are dropped
+  evaluate(c)        -> lazy criteria chain (denovo.vectorized.Criteria.chain, then the parent GT
+                        blacklist), looking up the parents missing from c as it reaches them:
+                        the first reason a candidate is skipped or fails, None if it is called
+  failed(c)          -> first criterion (or 'par_gt') a fully looked up candidate fails, None if
+                        it is called (scalar fallback of call_batch())
+  call(tmp)          -> output records (lists of fields) of one split record line
+  call_batch(tmps)   -> output records of many split record lines, in order; the criteria are
+                        evaluated on NumPy arrays when every depth converts
+                        (by the criteria chain, once per candidate, when profiling)
+  Subclasses provide
+  reference_block(tmp)        -> True if the record is a reference block
+  sample(site)                -> proband sample values (split on ':'), once per record
+  proband(site, values, a, altidx) -> Candidate with the proband depths, or a skip reason
+  format(c)                   -> output record of a called candidate
+  '''
+  head = OUTPUT_HEAD
+  lazy = True
+
+  def __init__(self, sample_id, idx, fa, mo, criteria, prof=None, gt_blacklist=None):
+    self.sample_id = sample_id
+    self.idx = idx
+    self.fa = fa
+    self.mo = mo
+    self.parents = {'fa': fa, 'mo': mo}
+    self.criteria = criteria
+    self.prof = prof if prof != None else NullProfile()
+    self.gt_blacklist = gt_blacklist
+
+  def proband_candidates(self, tmp):
+    prof = self.prof
+    cands = []
+    if self.reference_block(tmp):
+      prof.record('ref_block')
+      return(cands)
+
+    site = Site(tmp, self.idx)
+    values = self.sample(site)
+    ## how to handle multiallelic sites? e.g. chr1    1646352 .       A       C,G,<NON_REF>
+    ## iterate over all alternate alleles present in ALT
+    for a in site.alts:
+      prof.enter('parse')
+      if a == '*': # ignore point deletions for now; messy when matching alleles with parents
+        prof.allele('star')
+        continue
+      if not (len(site.ref) == 1 and len(a) == 1): # ignore indels for now
+        prof.allele('indel')
+        continue
+
+      altidx = site.alts.index(a) + 1 # index of the allele in AD
+      c = self.proband(site, values, a, altidx)
+      if isinstance(c, str):
+        prof.allele(c)
+        continue
+      cands.append(c)
+    return(cands)
+
+  def lookup(self, c, party):
+    ev = self.parents[party].evidence(c.site, c.a, c.altidx)
+    if isinstance(ev, str):
+      return(ev)
+    self.prof.count('parent_lookups')
+    if ev.hit: # a parent record at the site
+      self.prof.count('parent_hits')
+    c.set_parent(party, ev)
+    return(None)
+
+  def candidates(self, tmp):
+    cands = []
+    for c in self.proband_candidates(tmp):
+      self.prof.enter('parent')
+      skip = self.lookup(c, 'fa')
+      if skip == None:
+        skip = self.lookup(c, 'mo')
+      if skip != None:
+        self.prof.allele(skip)
+        continue
+      cands.append(c)
+    return(cands)
+
+  def blacklisted(self, c):
+    return(self.gt_blacklist != None and (c.fa.gt in self.gt_blacklist or c.mo.gt in self.gt_blacklist))
+
+  def failed(self, c):
+    failed = self.criteria.failed(c.pb_refdp, c.pb_altdp, c.pb_dp, c.fa_altdp, c.fa_dp, c.mo_altdp, c.mo_dp)
+    if failed == None and self.blacklisted(c):
+      return('par_gt')
+    return(failed)
+
+  def evaluate(self, c):
+    ## lazy criteria chain: a parent is looked up (unless it already is) only when every earlier
+    ## predicate passed, so most proband candidates never cost a lookup, and the mother is only
+    ## looked up for alleles the father's evidence leaves viable
+    prof = self.prof
+    for party, predicates in self.criteria.chain:
+      if party != 'pb' and getattr(c, party) == None:
+        prof.enter('parent')
+        skip = self.lookup(c, party)
+        if skip != None:
+          return(skip)
+        prof.enter('criteria')
+      for name, reason, test in predicates:
+        passed = test(c)
+        prof.predicate(name, passed)
+        if not passed:
+          return(reason)
+    if self.gt_blacklist != None:
+      passed = not self.blacklisted(c)
+      prof.predicate('par_gt', passed)
+      if not passed:
+        return('par_gt')
+    return(None)
+
+  def call(self, tmp):
+    prof = self.prof
+    records = []
+    for c in self.proband_candidates(tmp) if self.lazy else self.candidates(tmp):
+      prof.enter('criteria')
+      failed = self.evaluate(c)
+      if failed != None:
+        prof.allele(failed)
+        continue
+      prof.enter('write')
+      prof.allele('called')
+      records.append(self.format(c))
+    return(records)
+
+  def call_batch(self, tmps):
+    prof = self.prof
+    prof.enter('parse')
+    batch = AlleleBatch()
+    cands = []
+    for tmp in tmps:
+      for c in self.candidates(tmp):
+        batch.add(c)
+        cands.append(c)
+
+    prof.enter('criteria')
+    if prof.enabled: # the masks do not tell which criterion failed: the criteria chain decides, once per candidate
+      keep = []
+      for k, c in enumerate(cands):
+        failed = self.evaluate(c)
+        prof.allele(failed if failed != None else 'called')
+        if failed == None:
+          keep.append(k)
+    else:
+      try:
+        keep = batch.passing(self.criteria)
+        if self.gt_blacklist != None:
+          keep = [k for k in keep if not self.blacklisted(cands[k])]
+      except ValueError: # a depth that does not convert: scalar criteria, which only convert what they reach
+        keep = [k for k, c in enumerate(cands) if self.failed(c) == None]
+
+    prof.enter('write')
+    return([self.format(cands[k]) for k in keep])
+
+
+class GVCFTrioCaller(TrioCaller):
+  '''
+  Proband gVCF (sample genotype information in the last column) with parent gVCF backends;
+  output as gvcf_to_denovo_v4.py (OUTPUT_HEAD, depths as ints, the proband record repeated).
+  Records with END= anywhere in the line are reference blocks.
+  '''
+
+  def reference_block(self, tmp):
+    for col in tmp:
+      if 'END=' in col:
+        return(True)
+    return(False)
+
+  def sample(self, site):
+    return(site.tmp[-1].split(':'))
+
+  def proband(self, site, values, a, altidx):
+    layout = site.layout # e.g. GT:AD:DP:GQ:PL:SB with values 0/1, 5,7,0, 12, 99, 157,0,104,172,125,297, 5,0,7,0
+    if layout.value(values, 'GT') == './.': ## ignore sites with missing genotypes
+      return('missing_gt')
+    if not (layout.has(values, 'AD') and layout.has(values, 'DP')): # ignore sites with no AD or DP information
+      return('missing_ad_dp')
+    ad = layout.value(values, 'AD').split(',')
+    return(Candidate(site, a, altidx, values, int(ad[0]), int(ad[altidx]), int(layout.value(values, 'DP'))))
+
+  def format(self, c):
+    site = c.site
+    adf = site.layout.value(c.values, 'F1R2').split(',') # strand-specific allelic depths
+    adr = site.layout.value(c.values, 'F2R1').split(',')
+    out = [self.sample_id, site.chr.strip('chr'), site.pos, site.ref, c.a, c.pb_refdp, c.pb_altdp, c.pb_dp, adf[0], adf[c.altidx], adr[0], adr[c.altidx]]
+    return(out + site.tmp + [c.fa.fmt, c.fa.gt, c.mo.fmt, c.mo.gt])
+
+
+class MergedTrioCaller(TrioCaller):
+  '''
+  Merged trio gVCF: proband, father and mother sample columns in every record (idx may be the
+  projection of a wider record, denovo.columns); output as gvcf_to_denovo_ALT.py
+  (TRIO_OUTPUT_HEAD, depths as in the gVCF with '.' allele depths as 0).
+  '''
+  head = TRIO_OUTPUT_HEAD
+  lazy = False # the parents are in the record: no lookup to save, skip on their GT / AD / DP first
+
+  def __init__(self, sample_id, faid, moid, idx, criteria, prof=None):
+    TrioCaller.__init__(self, sample_id, idx, TrioColumns(idx[faid]), TrioColumns(idx[moid]), criteria, prof)
+    self.column = idx[sample_id]
+
+  def reference_block(self, tmp):
+    return(tmp[self.idx['INFO']].startswith('END='))
+
+  def sample(self, site):
+    return(site.tmp[self.column].split(':'))
+
+  def proband(self, site, values, a, altidx):
+    layout = site.layout
+    if layout.value(values, 'GT') == './.': ## ignore sites with missing genotypes
+      return('missing_gt')
+    if not (layout.has(values, 'AD') and layout.has(values, 'DP')): # ignore sites with no AD or DP information
+      return('missing_ad_dp')
+    ad = layout.value(values, 'AD').split(',')
+    if len(ad) <= 1: # ensure there is alternate allele read support
+      return('no_alt_ad')
+    pb_altdp = ad[altidx]
+    if pb_altdp == '.':
+      pb_altdp = '0'
+    return(Candidate(site, a, altidx, values, ad[0], pb_altdp, layout.value(values, 'DP')))
+
+  def format(self, c):
+    site = c.site
+    adf = site.layout.value(c.values, 'F1R2').split(',') # strand-specific allelic depths
+    adr = site.layout.value(c.values, 'F2R1').split(',')
+    out = [self.sample_id, site.chr.strip('chr'), site.pos, site.ref, c.a, c.pb_refdp, c.pb_altdp, c.pb_dp, adf[0], adf[c.altidx], adr[0], adr[c.altidx]]
+    return(out + site.tmp[:self.idx['FORMAT']+1] + [site.tmp[self.column], c.fa.gt, c.mo.gt])
@@ -0,0 +1,138 @@
+## Purpose: turn the parent gVCF records overlapping a proband site into parent evidence
+'''
+Every parent lookup backend (tabix subprocess, streaming merge-join, ...) returns the raw
+parent gVCF lines overlapping chr:pos-pos, in file order, exactly as `tabix <gvcf> chr:pos-pos`
+would print them.  ParentSite then applies the original parse_parent() logic to those lines
+so that every backend produces identical output; SiteCache keeps the parsed sites so that a
+position is parsed once for all proband alleles and children asking for it.
+'''
+from collections import OrderedDict
+
+from denovo.records import ParentEvidence, format_layout
+
+
+DEFAULT_SITE_CACHE = 1024 # parsed parent sites kept per cache
+EMPTY_EVIDENCE = ParentEvidence(0, 0, 'NA', 'NA', 'NA') # no parent record at the site (shared, never modified)
+
+
+####################################################################################################
+## Function that returns the END coordinate of a gVCF record, using tabix (htslib) semantics:
+## END= in INFO if present (reference blocks), otherwise POS + len(REF) - 1
+####################################################################################################
+def record_end(pos, ref, info):
+  end = pos + len(ref) - 1
+  if info.startswith('END='):
+    s = 4
+  else:
+    s = info.find(';END=')
+    if s == -1:
+      return(end)
+    s += 5
+  e = info.find(';', s)
+  try:
+    info_end = int(info[s:] if e == -1 else info[s:e])
+  except ValueError:
+    return(end)
+  if info_end >= pos:
+    end = info_end
+  return(end)
+
+class ParentSite(object):
+  '''
+  The parent gVCF lines overlapping one proband site, parsed once (the original parse_parent()
+  logic on the tabix text output, including its handling of multi-line returns, e.g. sites
+  inside an upstream parental deletion).
+  evidence(alt) -> ParentEvidence (denovo.records) of one proband allele: the same for every
+                   allele unless the parent has a variant record at the site, whose AD is
+                   resolved once per allele
+  verbose=True prints '# parent variant found' for each allele found in a parent variant record,
+  as gvcf_to_denovo_v4.py did
+  '''
+  __slots__ = ('ev', 'par_alts', 'layout', 'values', 'resolved', 'verbose')
+
+  def __init__(self, tmp_cols, lines, chr, pos, verbose=False):
+    self.verbose = verbose
+    # intialize values
+    # handles the case of empty tabix return
+    self.par_alts = None # ALT alleles of a parent variant record at the site
+    self.resolved = None # {alt: ParentEvidence}
+    if len(lines) == 0:
+      self.ev = EMPTY_EVIDENCE
+      return
+
+    tmpv = '\n'.join(lines).strip().split('\t')
+    format, info = tmpv[tmp_cols.index('FORMAT')], tmpv[tmp_cols.index('INFO')]
+    layout = format_layout(format)
+    values = tmpv[-1].split(':') # FORMAT : GT values, by position in the layout
+    self.ev = ParentEvidence(0, 0, format, tmpv[-1], info)
+
+    ## check coordinates and parse AD, DP information
+    if ('END=' in info): # if non-variant block, altdp = 0
+      try:
+        self.ev.dp = int(layout.value(values, 'DP'))
+      except:
+        pass
+    elif ('AS_RAW' in info): # if variant block
+      if ('GT' in format) and ('AD' in format) and ('DP' in format): # check that necessary info is there
+        if tmpv[tmp_cols.index('#CHROM')] == chr and tmpv[tmp_cols.index('POS')] == pos: # check that coordinates are correct
+          self.par_alts = tmpv[tmp_cols.index('ALT')].strip(',<NON_REF>').split(',')
+          self.layout, self.values = layout, values
+
+  def evidence(self, alt):
+    if self.par_alts == None:
+      return(self.ev)
+    if self.resolved == None:
+      self.resolved = {}
+    if not alt in self.resolved:
+      self.resolved[alt] = self.resolve(alt)
+    return(self.resolved[alt])
+
+  def resolve(self, alt):
+    ev = ParentEvidence(0, 0, self.ev.fmt, self.ev.gt, self.ev.info)
+    layout, values = self.layout, self.values
+    if alt in self.par_alts: # check that proband variant allele present among ALT in parent
+      altidx = self.par_alts.index(alt) + 1 # Get index of alternate allele; for parsing ALT col, use altidx-1
+      if not './.' in layout.value(values, 'GT'):
+        ev.altdp = int(layout.value(values, 'AD').split(',')[altidx-1])
+        ev.dp = int(layout.value(values, 'DP'))
+        if self.verbose:
+          print('# parent variant found')
+    else: # if variant allele not present, parent has effective altdp = 0
+      try: # handle missing DP cases e.g. tabix 11003-mo.g.vcf.gz chr8:144530986-144530986
+        ev.dp = int(layout.value(values, 'DP'))
+      except:
+        pass
+    return(ev)
+
+
+class SiteCache(object):
+  '''
+  Bounded LRU cache of parsed parent sites, keyed by (parent gVCF, chr, pos), so that each
+  parent position is fetched and parsed at most once however many proband alleles (multiallelic
+  sites) or children (siblings of a cohort run) ask for it.
+  site(gvcf, source, chr, pos) -> ParentSite, from source.lines(chr, pos) and source.cols on a miss
+  size                         -> sites kept (0: no caching)
+  hits / misses                -> lookups answered from the cache / fetched and parsed
+  verbose                      -> passed to the ParentSites it parses
+  '''
+
+  def __init__(self, size=DEFAULT_SITE_CACHE, verbose=False):
+    self.size = size
+    self.verbose = verbose
+    self.cache = OrderedDict() # {(gvcf, chr, pos): ParentSite}
+    self.hits = 0
+    self.misses = 0
+
+  def site(self, gvcf, source, chr, pos):
+    key = (gvcf, chr, pos)
+    if key in self.cache:
+      self.cache.move_to_end(key)
+      self.hits += 1
+      return(self.cache[key])
+    self.misses += 1
+    site = ParentSite(source.cols, source.lines(chr, pos), chr, pos, self.verbose)
+    if self.size > 0:
+      self.cache[key] = site
+      if len(self.cache) > self.size:
+        self.cache.popitem(last=False)
+    return(site)
@@ -0,0 +1,222 @@
+## Purpose: array-backed per-contig interval index over a parent gVCF
+'''
+Most parent gVCF lines are END= reference blocks.  ContigIntervals reads one contig of a parent
+once and keeps compact columns (array module, viewed as NumPy arrays when NumPy is installed):
+  start, end   - record span (tabix semantics: END= or POS + len(REF) - 1)
+  max_end      - running maximum of end, so records overlapping a position form one index range
+  dp           - FORMAT DP of the record (0 if missing)
+  kind         - KIND_BLOCK (END= in INFO), KIND_VARIANT (AS_RAW in INFO) or KIND_OTHER
+  voffset      - BGZF virtual offset of the record, to re-read the raw line when needed
+For position p the overlapping records are the indices k..i with
+  k = first index with max_end >= p,  i = last index with start <= p
+(filtered on end >= p), i.e. two binary searches; resolve() does this for a whole batch of
+positions in one searchsorted call per column.  The -e interval engine collects the proband
+candidate positions first (candidate_positions()) and resolves all those of a contig with one
+depths() call when it reads the contig: sites inside a single reference block (or in no record,
+most of a gVCF) get their parent depths without any line being read or split; only sites
+overlapping variant records or several records are parsed from their lines.
+'''
+from array import array
+import bisect
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+from denovo.classify import snv_candidate
+from denovo.evidence import EMPTY_EVIDENCE, ParentSite, record_end
+
+
+KIND_BLOCK = 0
+KIND_VARIANT = 1
+KIND_OTHER = 2
+
+####################################################################################################
+## Function that returns the FORMAT DP of a record as an int, 0 if missing or not an integer
+####################################################################################################
+def record_dp(fmt, sample):
+  fmt = fmt.split(':')
+  if not 'DP' in fmt:
+    return(0)
+  sample = sample.split(':')
+  try:
+    return(int(sample[fmt.index('DP')]))
+  except:
+    return(0)
+
+
+class ContigIntervals(object):
+  '''
+  Interval columns for one contig of one parent gVCF, built from (voffset, line) records.
+  '''
+
+  def __init__(self, chr, records):
+    self.chr = chr
+    start, end, max_end = array('i'), array('i'), array('i')
+    dp, kind, voffset = array('i'), array('b'), array('Q')
+    m = 0
+    for voff, line in records:
+      tmpv = line.split('\t')
+      s = int(tmpv[1])
+      e = record_end(s, tmpv[3], tmpv[7])
+      m = max(m, e)
+      start.append(s)
+      end.append(e)
+      max_end.append(m)
+      voffset.append(voff)
+      if 'END=' in tmpv[7]:
+        kind.append(KIND_BLOCK)
+      elif 'AS_RAW' in tmpv[7]:
+        kind.append(KIND_VARIANT)
+      else:
+        kind.append(KIND_OTHER)
+      dp.append(record_dp(tmpv[8], tmpv[-1]) if len(tmpv) > 9 else 0)
+
+    if np is not None:
+      start, end, max_end = np.frombuffer(start, dtype=np.int32), np.frombuffer(end, dtype=np.int32), np.frombuffer(max_end, dtype=np.int32)
+      dp, kind, voffset = np.frombuffer(dp, dtype=np.int32), np.frombuffer(kind, dtype=np.int8), np.frombuffer(voffset, dtype=np.uint64)
+    self.start, self.end, self.max_end = start, end, max_end
+    self.dp, self.kind, self.voffset = dp, kind, voffset
+
+  def __len__(self):
+    return(len(self.start))
+
+  ## indices k..i of the records that may overlap pos (none if i < k)
+  def overlap_range(self, pos):
+    k = bisect.bisect_left(self.max_end, pos)
+    i = bisect.bisect_right(self.start, pos) - 1
+    return(k, i)
+
+  def overlaps(self, pos):
+    k, i = self.overlap_range(pos)
+    return([j for j in range(k, i+1) if self.end[j] >= pos])
+
+  ## vectorized overlap_range() for a sorted or unsorted batch of positions
+  def resolve(self, positions):
+    if np is not None:
+      positions = np.asarray(positions, dtype=np.int32)
+      return(np.searchsorted(self.max_end, positions, side='left'), np.searchsorted(self.start, positions, side='right') - 1)
+    ks = [bisect.bisect_left(self.max_end, p) for p in positions]
+    iis = [bisect.bisect_right(self.start, p) - 1 for p in positions]
+    return(ks, iis)
+
+  ## parent dp / altdp for a batch of positions without reading any gVCF line
+  ## return (dp, altdp, resolved, block); resolved is False where the site overlaps a variant
+  ## record or several records, which need the full parse of the parent lines; block is the
+  ## index of the one reference block overlapping the site, -1 if none
+  def depths(self, positions):
+    ks, iis = self.resolve(positions)
+    if np is not None:
+      altdp = np.zeros(len(ks), dtype=np.int32)
+      if len(self) == 0:
+        return(altdp.copy(), altdp, np.ones(len(ks), dtype=bool), altdp - 1)
+      safe = np.clip(iis, 0, len(self) - 1)
+      block = (ks == iis) & (self.kind[safe] == KIND_BLOCK)
+      dp = np.where(block, self.dp[safe], 0).astype(np.int32)
+      return(dp, altdp, block | (iis < ks), np.where(block, safe, -1))
+    dps, altdps, resolved, blocks = [], [], [], []
+    for k, i in zip(ks, iis):
+      if k == i and self.kind[i] == KIND_BLOCK:
+        dps.append(self.dp[i])
+        resolved.append(True)
+        blocks.append(i)
+      else:
+        dps.append(0)
+        resolved.append(i < k)
+        blocks.append(-1)
+      altdps.append(0)
+    return(dps, altdps, resolved, blocks)
+
+
+class BlockEvidence(object):
+  '''
+  ParentEvidence (denovo.records) of a site inside one parent reference block, from the interval
+  columns: altdp 0 and the block DP.  The block line is read (and parsed as in parse_parent())
+  only when fmt / gt / info are asked for, i.e. for the calls and the parent GT blacklist.
+  '''
+  __slots__ = ('altdp', 'dp', 'hit', 'index', 'voffset', 'chr', 'pos', 'ev')
+
+  def __init__(self, index, voffset, dp, chr, pos):
+    self.altdp, self.dp, self.hit = 0, dp, True
+    self.index, self.voffset, self.chr, self.pos = index, voffset, chr, pos
+    self.ev = None
+
+  def parsed(self):
+    if self.ev == None:
+      self.ev = ParentSite(self.index.cols, [self.index.parent.reader.line_at(self.voffset)], self.chr, self.pos).evidence(None)
+    return(self.ev)
+
+  fmt = property(lambda self: self.parsed().fmt)
+  gt = property(lambda self: self.parsed().gt)
+  info = property(lambda self: self.parsed().info)
+
+
+class IntervalIndex(object):
+  '''
+  Interval index lookups for one parent, on top of a local ParentGVCF.
+  Only the current contig is held in memory; moving to a new contig reads it once.
+  sites            -> {chr: sorted proband candidate positions} (candidate_positions()), or None
+  lines(chr, pos)  -> parent lines overlapping chr:pos-pos
+  block(chr, pos)  -> evidence of a candidate site in one reference block or in no record (from
+                      the depths() of all candidate positions of the contig, resolved in one call
+                      when the contig is read), None if the parent lines must be parsed
+  '''
+
+  def __init__(self, parent, sites=None):
+    if parent.reader is None:
+      raise IOError('## ERROR: interval index requires a local .tbi for %s'%(parent.gvcf))
+    self.parent = parent
+    self.cols = parent.cols
+    self.sites = sites
+    self.contig = None
+    self.positions = None # candidate positions of the current contig, and their depths() columns
+    self.dp, self.resolved, self.blocks = None, None, None
+
+  def intervals(self, chr):
+    if self.contig is None or self.contig.chr != chr:
+      self.contig = None # release the previous contig first
+      self.contig = ContigIntervals(chr, self.parent.reader.contig_records(chr))
+      self.positions = self.sites.get(chr) if self.sites != None else None
+      if self.positions:
+        dp, altdp, resolved, blocks = self.contig.depths(self.positions)
+        self.dp, self.resolved, self.blocks = list(dp), list(resolved), list(blocks)
+    return(self.contig)
+
+  def lines(self, chr, pos):
+    ci = self.intervals(chr)
+    pos = int(pos)
+    return([self.parent.reader.line_at(int(ci.voffset[j])) for j in ci.overlaps(pos)])
+
+  def block(self, chr, pos):
+    ci = self.intervals(chr)
+    if not self.positions:
+      return(None)
+    p = int(pos)
+    k = bisect.bisect_left(self.positions, p)
+    if k == len(self.positions) or self.positions[k] != p or not self.resolved[k]:
+      return(None)
+    j = self.blocks[k]
+    if j < 0: # no parent record at the site
+      return(EMPTY_EVIDENCE)
+    return(BlockEvidence(self, int(ci.voffset[j]), int(self.dp[k]), chr, pos))
+
+  def close(self):
+    self.contig = None
+
+####################################################################################################
+## Function that collects the proband candidate SNV positions per contig (denovo.classify)
+## return {chr: array of positions, sorted}
+####################################################################################################
+def candidate_positions(sample_lines):
+  sites = {}
+  for line in sample_lines:
+    if line.startswith('#') or not snv_candidate(line):
+      continue
+    tmp = line.split('\t', 2)
+    if not tmp[0] in sites:
+      sites[tmp[0]] = array('i')
+    sites[tmp[0]].append(int(tmp[1]))
+  for chr in sites:
+    sites[chr] = array('i', sorted(sites[chr]))
+  return(sites)
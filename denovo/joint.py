@@ -0,0 +1,212 @@
+## Purpose: call every trio of a joint-called multi-sample VCF in one pass over its records
+'''
+gvcf_to_denovo_ALT.py reads the proband / father / mother columns of a multi-sample VCF through
+idx[sample_id], idx[faid], idx[moid], one trio per run, so a joint-called cohort VCF is read
+(and decompressed and split) once per trio.  JointTrios evaluates all trios of a pedigree on
+each record instead: the GT / AD / DP values of every sample column a trio needs are parsed once
+per record, gathered into NumPy arrays indexed by trio, and the de novo criteria (denovo.vectorized.Criteria)
+are applied to all trios of an allele as boolean masks.  Only the trios the masks keep, and those
+whose depths do not all convert (e.g. a '.' depth, a short AD), go on to the MergedTrioCaller of
+the trio (denovo.engine), which evaluates and formats the allele exactly as gvcf_to_denovo_ALT.py
+does; the masks just spare it the trios that cannot be called.
+'''
+from denovo.engine import TRIO_OUTPUT_HEAD, MergedTrioCaller, Site
+from denovo.vectorized import np
+from denovo.writer import DEFAULT_FLUSH_INTERVAL, OutputWriter
+
+
+MAX_OPEN_OUTPUTS = 256 # per-trio files written at once by split_calls()
+
+####################################################################################################
+## Function that reads the trios of a plink pedigree whose three samples are columns of the VCF
+## columns: sample columns of the #CHROM line; fids (optional): only these families (first ped column)
+## return (list of (child, father, mother) in pedigree order, list of children skipped because
+## a sample column is missing)
+####################################################################################################
+def read_trios(ped, columns, fids=None):
+  trios = []
+  skipped = []
+  seen = set()
+  with open(ped, 'r') as pedf:
+    for line in pedf:
+      tmp = line.strip().split('\t')
+      if len(tmp) < 4:
+        continue
+      fid, sid, faid, moid = tmp[0], tmp[1], tmp[2], tmp[3]
+      if faid == '0' or moid == '0': # parent sample
+        continue
+      if fids is not None and not fid in fids:
+        continue
+      if sid in seen:
+        continue
+      seen.add(sid)
+      if sid in columns and faid in columns and moid in columns:
+        trios.append((sid, faid, moid))
+      else:
+        skipped.append(sid)
+  return(trios, skipped)
+
+####################################################################################################
+## Function that converts depth strings to a float array, NaN where a value is not an integer
+## (None for a missing value)
+####################################################################################################
+def depth_array(values):
+  try:
+    return(np.array(values).astype(np.int64).astype(np.float64))
+  except (ValueError, TypeError):
+    out = np.empty(len(values), dtype=np.float64)
+    for k, v in enumerate(values):
+      try:
+        out[k] = int(v)
+      except (ValueError, TypeError):
+        out[k] = np.nan
+    return(out)
+
+
+class JointTrios(object):
+  '''
+  Trios of one joint-called VCF.
+  trios        -> list of (child, father, mother) ids
+  callers      -> denovo.engine.MergedTrioCaller of each trio, which calls and formats its alleles
+  samples      -> ids of the sample columns used by any trio, each parsed once per record
+  call(tmp)    -> output records (lists of fields) of the alleles called de novo in one split
+                  record, as (trio number, record) in allele order, then trio order
+  Without NumPy every trio with usable sample columns goes to its caller.
+  '''
+
+  def __init__(self, trios, idx, criteria):
+    self.trios = trios
+    self.idx = idx
+    self.criteria = criteria
+    self.callers = [MergedTrioCaller(sid, faid, moid, idx, criteria) for sid, faid, moid in trios]
+    self.samples = []
+    pos = {}
+    for trio in trios:
+      for s in trio:
+        if not s in pos:
+          pos[s] = len(self.samples)
+          self.samples.append(s)
+    self.cols = [idx[s] for s in self.samples]
+    self.members = [(pos[sid], pos[faid], pos[moid]) for sid, faid, moid in trios]
+    if np is not None:
+      self.pb = np.array([m[0] for m in self.members], dtype=np.int64)
+      self.fa = np.array([m[1] for m in self.members], dtype=np.int64)
+      self.mo = np.array([m[2] for m in self.members], dtype=np.int64)
+
+  ## per sample column: (values split on ':', usable for calling, AD values split on ',')
+  def _parse(self, tmp, layout):
+    gi, ai, di = layout.index['GT'], layout.index['AD'], layout.index['DP']
+    need = max(ai, di)
+    parsed = []
+    for c in self.cols:
+      v = tmp[c].split(':')
+      if len(v) > need and len(v) > gi and v[gi] != './.':
+        parsed.append((v, True, v[ai].split(',')))
+      else:
+        parsed.append((v, False, None))
+    return(parsed)
+
+  ## trios whose three sample columns are usable and whose proband has an alternate AD value
+  def _usable(self, parsed):
+    return([t for t, (pb, fa, mo) in enumerate(self.members) if parsed[pb][1] and parsed[fa][1] and parsed[mo][1] and len(parsed[pb][2]) > 1])
+
+  ## per sample column arrays shared by the alleles of a record: usable, number of AD values,
+  ## AD is just '.', REF depth, DP
+  def _arrays(self, parsed, ai, di):
+    ok = np.array([p[1] for p in parsed], dtype=bool)
+    nad = np.array([len(p[2]) if p[1] else 0 for p in parsed], dtype=np.int64)
+    dot = np.array([p[1] and p[0][ai] == '.' for p in parsed], dtype=bool)
+    ref = depth_array([p[2][0] if p[1] else '0' for p in parsed])
+    dp = depth_array([p[0][di] if p[1] else '0' for p in parsed])
+    return(ok, nad, dot, ref, dp)
+
+  ## NumPy criteria for all trios of allele j
+  ## return trio numbers passing them, or with a depth that does not convert, in trio order
+  def _vectorized(self, parsed, arrays, j, ai, di):
+    ok, nad, dot, ref, dp = arrays
+    alt = [p[2][j] if p[1] and j < len(p[2]) else None for p in parsed]
+    alt = depth_array(['0' if a == '.' else a for a in alt]) # '.' alternate depth counts as 0
+    par_alt = np.where(dot, 0.0, alt)
+
+    pb, fa, mo = self.pb, self.fa, self.mo
+    valid = ok[pb] & ok[fa] & ok[mo] & (nad[pb] > 1)
+    pb_refdp, pb_altdp, pb_dp = ref[pb], alt[pb], dp[pb]
+    fa_altdp, fa_dp, mo_altdp, mo_dp = par_alt[fa], dp[fa], par_alt[mo], dp[mo]
+
+    ## trios with a depth that does not convert: left to the scalar criteria of their caller
+    unsure = valid & (np.isnan(pb_refdp) | np.isnan(pb_altdp) | np.isnan(pb_dp) | np.isnan(fa_altdp) | np.isnan(fa_dp) | np.isnan(mo_altdp) | np.isnan(mo_dp))
+
+    with np.errstate(invalid='ignore'):
+      pb_vaf = np.zeros(len(pb), dtype=np.float64)
+      np.divide(pb_altdp, pb_dp, out=pb_vaf, where=pb_dp > 0)
+      mask = valid & ~unsure & (pb_refdp != 0) & (pb_vaf >= self.criteria.pb_min_vaf)
+      mask &= (fa_altdp <= self.criteria.par_max_alt) & (mo_altdp <= self.criteria.par_max_alt)
+      mask &= (fa_dp >= self.criteria.par_min_dp) & (mo_dp >= self.criteria.par_min_dp)
+    return(np.flatnonzero(mask | unsure).tolist())
+
+  ## allele a of trio t, through the trio's caller: output record if called de novo, else None
+  def _call(self, t, site, values, a, altidx):
+    caller = self.callers[t]
+    c = caller.proband(site, values, a, altidx)
+    if isinstance(c, str) or caller.lookup(c, 'fa') != None or caller.lookup(c, 'mo') != None:
+      return(None)
+    if caller.failed(c) != None:
+      return(None)
+    return(caller.format(c))
+
+  def call(self, tmp):
+    idx = self.idx
+    if tmp[idx['INFO']].startswith('END=') or len(tmp) != len(idx):
+      return([])
+    site = Site(tmp, idx)
+    layout = site.layout
+    if not ('GT' in layout.index and 'AD' in layout.index and 'DP' in layout.index):
+      return([])
+    ai, di = layout.index['AD'], layout.index['DP']
+
+    parsed = None
+    records = []
+    for a in site.alts:
+      if a == '*' or not (len(site.ref) == 1 and len(a) == 1): # point deletions, indels
+        continue
+      j = site.alts.index(a) + 1
+      if parsed is None:
+        parsed = self._parse(tmp, layout)
+        if np is not None:
+          arrays = self._arrays(parsed, ai, di)
+        else:
+          usable = self._usable(parsed)
+
+      for t in self._vectorized(parsed, arrays, j, ai, di) if np is not None else usable:
+        record = self._call(t, site, parsed[self.members[t][0]][0], a, j)
+        if record is not None:
+          records.append((t, record))
+    return(records)
+
+####################################################################################################
+## Function that splits a combined output into one file per trio, <child id><suffix>, each with
+## the header (identical to the gvcf_to_denovo_ALT.py output of that trio); the combined output is
+## read once per MAX_OPEN_OUTPUTS trios
+## return list of per-trio output paths, in trio order
+####################################################################################################
+def split_calls(path, trios, suffix, flush_interval=DEFAULT_FLUSH_INTERVAL):
+  paths = [sid + suffix for sid, faid, moid in trios]
+  for first in range(0, len(trios), MAX_OPEN_OUTPUTS):
+    outfs = {}
+    for sid, faid, moid in trios[first:first + MAX_OPEN_OUTPUTS]:
+      outfs[sid] = OutputWriter(sid + suffix, flush_interval)
+      outfs[sid].write_record(TRIO_OUTPUT_HEAD)
+    try:
+      with open(path, 'r') as f:
+        f.readline() # header
+        for line in f:
+          outf = outfs.get(line[:line.find('\t')])
+          if outf is not None:
+            outf.write(line)
+    except:
+      for outf in outfs.values():
+        outf.abort()
+      raise
+    for outf in outfs.values():
+      outf.close()
+  return(paths)
@@ -0,0 +1,68 @@
+## Purpose: streaming parent gVCF lookups for a position-sorted proband gVCF
+'''
+Instead of forking `tabix -H` + `tabix <gvcf> chr:pos-pos` for every proband allele, each parent
+gVCF is read sequentially, one contig at a time, in step with the proband.  The stream keeps a
+small window of parent records (the active END= reference block plus any variant records) that
+can still overlap upcoming proband positions, so every lookup is amortized O(1).
+
+Lookups must arrive in non-decreasing position order within a contig; a lookup behind the
+current window (unsorted input) restarts the contig stream, so results are always correct.
+'''
+from denovo.evidence import record_end
+
+
+class ParentStream(object):
+  '''
+  Sequential view of one parent gVCF.
+  lines(chr, pos) returns the parent lines overlapping chr:pos-pos, in file order
+  Records come from parent.contig_lines(): a ParentGVCF (in-process reader or one tabix stream
+  per contig) or a RegionBatch (records of one batched tabix -R query).
+  '''
+
+  def __init__(self, parent):
+    self.parent = parent
+    self.cols = parent.cols
+    self.chr = None
+    self.source = None
+    self.window = [] # [(start, end, line)] of records that may overlap upcoming positions
+    self.next_rec = None # first record not yet in the window
+    self.last_pos = 0
+
+  def _open(self, chr):
+    self.close()
+    self.chr = chr
+    self.source = self.parent.contig_lines(chr)
+    self.window = []
+    self.next_rec = None
+    self.last_pos = 0
+    self._read_next()
+
+  def _read_next(self):
+    self.next_rec = None
+    for line in self.source:
+      if line == '' or line.startswith('#'):
+        continue
+      tmpv = line.split('\t', 8)
+      start = int(tmpv[1])
+      self.next_rec = (start, record_end(start, tmpv[3], tmpv[7]), line)
+      return
+
+  def lines(self, chr, pos):
+    pos = int(pos)
+    if chr != self.chr or pos < self.last_pos:
+      self._open(chr)
+    self.last_pos = pos
+
+    ## drop records ending before this position, then pull in records starting at or before it
+    self.window = [r for r in self.window if r[1] >= pos]
+    while self.next_rec is not None and self.next_rec[0] <= pos:
+      if self.next_rec[1] >= pos:
+        self.window.append(self.next_rec)
+      self._read_next()
+
+    return([r[2] for r in self.window])
+
+  def close(self):
+    if self.source is not None:
+      self.source.close()
+      self.source = None
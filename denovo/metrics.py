@@ -0,0 +1,105 @@
+## Purpose: merge the per-shard metrics sidecars of a scattered calling run into one summary
+'''
+Each call_denovos shard writes its --profile report (denovo.profile) next to its calls.
+gather_shards used to concatenate the calls only, so a sample whose wall time was set by one
+slow shard looked like any other.  summarize() lines the shard reports up and adds per sample
+  totals     - cpu seconds, record lines, candidates, parent lookups and hits, calls summed over
+               shards (peak RSS: the largest shard), seconds per stage summed over shards
+  wall       - the slowest shard (the critical path of the scatter), the median shard, the sum
+  stragglers - shards flagged as
+                 long  : wall time >= straggler_factor x the median shard wall time
+                 slow  : lines/sec <= the median shard lines/sec / straggler_factor
+               (long shards point at the sharding, slow ones at the VM or the inputs; shards
+               shorter than min_seconds are never flagged; '.' in the straggler column)
+with one row per shard (write_shard_rows) for a TSV that can be concatenated across samples.
+'''
+import json
+
+
+DEFAULT_STRAGGLER_FACTOR = 2.0
+DEFAULT_MIN_SECONDS = 60 # shards faster than this are not worth flagging
+SHARD_COLUMNS = ['sample_id', 'shard', 'contigs', 'wall', 'cpu', 'peak_rss_kb', 'lines', 'lines_per_sec', 'candidates', 'parent_lookups', 'parent_hits', 'calls', 'top_stage', 'straggler']
+
+####################################################################################################
+## Function that returns the median of a non-empty list of numbers
+####################################################################################################
+def median(values):
+  values = sorted(values)
+  n = len(values)
+  if n % 2 == 1:
+    return(values[n // 2])
+  return((values[n // 2 - 1] + values[n // 2]) / 2.0)
+
+####################################################################################################
+## Function that reads the metrics sidecars (denovo.profile reports) of the shards
+## return list of (shard name, report); missing or empty sidecars are reported as None
+####################################################################################################
+def read_shard_metrics(paths, names=None):
+  shards = []
+  for k, path in enumerate(paths):
+    name = names[k] if names != None else str(k)
+    try:
+      with open(path, 'r') as f:
+        shards.append((name, json.load(f)))
+    except (IOError, ValueError):
+      print('## WARNING: no metrics for shard %s (%s)'%(name, path))
+      shards.append((name, None))
+  return(shards)
+
+####################################################################################################
+## Function that merges shard reports into a per-sample performance summary
+## return summary dictionary (see module docstring); summary['shards'] holds one row per shard
+####################################################################################################
+def summarize(sample_id, shards, straggler_factor=DEFAULT_STRAGGLER_FACTOR, min_seconds=DEFAULT_MIN_SECONDS):
+  rows = []
+  stages = {}
+  for name, rep in shards:
+    if rep == None:
+      rows.append(dict([(c, None) for c in SHARD_COLUMNS], sample_id=sample_id, shard=name, straggler='missing'))
+      continue
+    for s, t in rep['stages'].items():
+      stages[s] = stages.get(s, 0.0) + t
+    contigs = rep['info'].get('contigs') or [rep['info'].get('region') or 'all']
+    rows.append({'sample_id': sample_id, 'shard': name, 'contigs': ','.join(contigs), 'wall': rep['wall'], 'cpu': rep['cpu'],
+                 'peak_rss_kb': rep['peak_rss_kb'], 'lines': rep['lines'], 'lines_per_sec': rep['lines'] / rep['wall'] if rep['wall'] > 0 else None,
+                 'candidates': rep['counts']['candidates'], 'parent_lookups': rep['counts']['parent_lookups'],
+                 'parent_hits': rep['counts']['parent_hits'], 'calls': rep['alleles']['called'],
+                 'top_stage': max(rep['stages'], key=lambda s: rep['stages'][s]), 'straggler': '.'})
+
+  done = [r for r in rows if r['wall'] != None]
+  summary = {'sample_id': sample_id, 'shards': rows, 'missing': [r['shard'] for r in rows if r['straggler'] == 'missing'],
+             'straggler_factor': straggler_factor, 'min_seconds': min_seconds, 'stragglers': []}
+  if len(done) == 0:
+    return(summary)
+
+  med_wall = median([r['wall'] for r in done])
+  rates = [r['lines_per_sec'] for r in done if r['lines_per_sec'] != None]
+  med_rate = median(rates) if len(rates) > 0 else None
+  for r in done:
+    flags = []
+    if r['wall'] >= min_seconds:
+      if r['wall'] >= straggler_factor * med_wall:
+        flags.append('long')
+      if med_rate != None and r['lines_per_sec'] != None and r['lines_per_sec'] <= med_rate / straggler_factor:
+        flags.append('slow')
+    r['straggler'] = ','.join(flags) if len(flags) > 0 else '.'
+    if len(flags) > 0:
+      summary['stragglers'].append(r['shard'])
+
+  slowest = max(done, key=lambda r: r['wall'])
+  summary['wall'] = {'max': slowest['wall'], 'max_shard': slowest['shard'], 'median': med_wall, 'sum': sum([r['wall'] for r in done])}
+  summary['lines_per_sec'] = {'median': med_rate}
+  summary['totals'] = dict([(c, sum([r[c] for r in done])) for c in ['cpu', 'lines', 'candidates', 'parent_lookups', 'parent_hits', 'calls']])
+  summary['totals']['peak_rss_kb'] = max([r['peak_rss_kb'] for r in done])
+  summary['stages'] = stages
+  return(summary)
+
+####################################################################################################
+## Function that writes the shard rows of one or more summaries as a tab-separated table
+####################################################################################################
+def write_shard_rows(path, summaries):
+  with open(path, 'w') as f:
+    f.write('\t'.join(SHARD_COLUMNS) + '\n')
+    for summary in summaries:
+      for r in summary['shards']:
+        f.write('\t'.join(['NA' if r[c] == None else ('%.3f'%(r[c]) if isinstance(r[c], float) else str(r[c])) for c in SHARD_COLUMNS]) + '\n')
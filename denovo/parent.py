@@ -0,0 +1,83 @@
+## Purpose: one persistent handle per parent gVCF
+'''
+ParentGVCF is created once per parent and reused for every proband site.  It holds the parsed
+#CHROM column layout (no `tabix -H` per lookup) and, when the .tbi is available locally, an
+open in-process TabixReader whose LRU cache of inflated BGZF blocks lets consecutive nearby
+lookups skip decompression entirely.  Without a local index (e.g. gs:// paths streamed by
+htslib) lookups fall back to the tabix command line.
+'''
+import os
+import subprocess
+
+from denovo.tabix import TabixReader
+
+
+DEFAULT_CACHE_BLOCKS = 64 # 64 x 64 KB of inflated blocks per parent
+
+####################################################################################################
+## Function that returns the #CHROM header line of a bgzipped, tabix-indexed gVCF as a list of columns
+####################################################################################################
+def read_header_columns(gvcf):
+  tmp_head = subprocess.run(['tabix', '-H', gvcf], stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8') # get header lines
+  return(tmp_head.stdout.strip().split('\n')[-1].split('\t'))
+
+####################################################################################################
+## Function that returns the lines of a gVCF overlapping a region, via `tabix <gvcf> <region>`
+####################################################################################################
+def tabix_region_lines(gvcf, region):
+  tmp = subprocess.run(['tabix', gvcf, region], stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').stdout
+  if tmp.strip() == '':
+    return([])
+  return(tmp.strip().split('\n'))
+
+####################################################################################################
+## Function that streams all records of one contig of a bgzipped, tabix-indexed gVCF
+## (a single `tabix <gvcf> <contig>` process per contig)
+####################################################################################################
+def tabix_contig_lines(gvcf, contig):
+  proc = subprocess.Popen(['tabix', gvcf, contig], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf8')
+  try:
+    for line in proc.stdout:
+      yield line.rstrip('\n')
+  finally:
+    proc.stdout.close()
+    proc.kill()
+    proc.wait()
+
+
+class ParentGVCF(object):
+  '''
+  Persistent handle on one parent gVCF.
+  cols / col_idx       -> #CHROM header columns and {column: index}
+  lines(chr, pos)      -> parent lines overlapping chr:pos-pos (like tabix chr:pos-pos)
+  contig_lines(chr)    -> every parent line of one contig, in file order
+  in_process=None picks the in-process reader whenever <gvcf>.tbi exists locally
+  '''
+
+  def __init__(self, gvcf, in_process=None, cache_blocks=DEFAULT_CACHE_BLOCKS):
+    self.gvcf = gvcf
+    if in_process is None:
+      in_process = os.path.exists(gvcf + '.tbi')
+
+    self.reader = None
+    if in_process:
+      self.reader = TabixReader(gvcf, cache_blocks=cache_blocks)
+      self.cols = self.reader.columns()
+    else:
+      self.cols = read_header_columns(gvcf)
+    self.col_idx = {col:index for index, col in enumerate(self.cols)}
+
+  def lines(self, chr, pos):
+    if self.reader is not None:
+      return(self.reader.fetch(chr, pos, pos))
+    return(tabix_region_lines(self.gvcf, '%s:%s-%s'%(chr, pos, pos)))
+
+  def contig_lines(self, chr):
+    if self.reader is not None:
+      return(self.reader.contig_lines(chr))
+    return(tabix_contig_lines(self.gvcf, chr))
+
+  def close(self):
+    if self.reader is not None:
+      self.reader.close()
+      self.reader = None
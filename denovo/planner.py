@@ -0,0 +1,172 @@
+## Purpose: choose streaming or random-access parent lookups per contig from the candidate density
+'''
+A sequential parent scan (merge-join) reads and parses every record of the parent contig, however
+few proband candidates it holds; random access (in-process .tbi query, or one tabix subprocess per
+site without a local index) pays per lookup.  A contig with a handful of candidate sites (chrM,
+small contigs, a targeted region) is far cheaper by random access, a large autosome by streaming.
+plan_contigs() (-e auto) estimates for every contig to be called
+  candidates  - proband SNV candidate records (denovo.classify): counted in sample_windows
+                genomic windows of window_bp spread over the contig (every record when they
+                cover it), scaled to the contig length (##contig header, else the linear index)
+  parent MB   - compressed bytes of each parent streamed to reach the end of the contig / region
+                (the stream starts at the contig start) and spanned by the region itself (parent
+                .tbi; without a local index the proband sizes stand in)
+and prices both ways per parent with the rough costs of the in-process code below, summed over
+the two parents
+  stream      - parent MB x STREAM_SECONDS_PER_MB
+  random      - candidates x LOOKUP_SECONDS[index | tabix]: the parent's own random access,
+                in-process index with a local .tbi, else a tabix subprocess per site
+                + (index only) min(candidates, parent blocks of the region) x BLOCK_SECONDS
+keeping the cheaper one (streaming on ties).  The decisions are printed as '## PLAN' lines and
+can be forced per contig (--plan chrM=random,chr1=stream) or for all contigs (-e <engine>).
+'''
+from denovo.classify import snv_candidate
+from denovo.proband import MAX_POS, parse_region
+from denovo.tabix import MIN_SHIFT, TabixReader
+
+
+DEFAULT_SAMPLE_WINDOWS = 8
+DEFAULT_WINDOW_BP = 1 << 16 # 4 linear index windows
+## costs on top of parsing the parent records at the site (paid either way), fitted to the
+## --profile 'parent' stage of the stream and index engines on synthetic trios
+STREAM_SECONDS_PER_MB = 0.4 # ParentStream: compressed parent MB inflated, split and windowed
+LOOKUP_SECONDS = {'index': 0.00001, 'tabix': 0.02} # per lookup: index query / tabix subprocess
+BLOCK_SECONDS = 0.0015 # seek + inflate of one BGZF block not yet in the block cache
+BLOCK_BYTES = 10000 # compressed bytes per BGZF block of a gVCF
+MODES = ['stream', 'random']
+
+####################################################################################################
+## Function that returns the contig lengths declared by the ##contig header lines of a reader
+####################################################################################################
+def contig_lengths(reader):
+  lengths = {}
+  for line in reader.header_lines():
+    if line.startswith('##contig=<ID=') and 'length=' in line:
+      chr = line[len('##contig=<ID='):].split(',', 1)[0].split('>', 1)[0]
+      lengths[chr] = int(line.split('length=', 1)[1].split(',', 1)[0].split('>', 1)[0])
+  return(lengths)
+
+####################################################################################################
+## Function that returns the compressed bytes of chr:beg-end, from the linear index (16 kb windows)
+####################################################################################################
+def compressed_bytes(reader, chr, beg, end):
+  chunks = reader._chunks(chr, 0, MAX_POS)
+  ioff = reader.refs[chr][1] if chr in reader.refs else []
+  if len(chunks) == 0 or len(ioff) == 0:
+    return(0)
+  first = ioff[min((beg - 1) >> MIN_SHIFT, len(ioff) - 1)] >> 16
+  last = (end - 1) >> MIN_SHIFT
+  stop = ioff[last + 1] >> 16 if last + 1 < len(ioff) else chunks[-1][1] >> 16
+  return(max(stop - first, 0) + 1)
+
+####################################################################################################
+## Function that estimates the proband SNV candidate records of chr:beg-end from sample windows
+## return (estimated candidates, candidates counted, bp sampled)
+####################################################################################################
+def estimate_candidates(reader, chr, beg, end, windows=DEFAULT_SAMPLE_WINDOWS, window_bp=DEFAULT_WINDOW_BP):
+  length = end - beg + 1
+  if windows * window_bp >= length: # small contig / region: count every record
+    starts = [beg]
+    window_bp = length
+  else:
+    step = (length - window_bp) // max(1, windows - 1)
+    starts = [beg + k * step for k in range(windows)]
+
+  n = 0
+  for wbeg in starts:
+    for line in reader.records_starting_in(chr, wbeg, wbeg + window_bp - 1):
+      if snv_candidate(line):
+        n += 1
+  sampled = len(starts) * window_bp
+  return((int(round(float(n) * length / sampled)), n, sampled))
+
+####################################################################################################
+## Function that prices streaming and random access for one parent contig
+## stream_bytes: compressed bytes from the contig start to the region end; region_bytes: of the region
+## return (stream seconds, random access seconds)
+####################################################################################################
+def lookup_costs(candidates, stream_bytes, region_bytes, random_engine):
+  stream = stream_bytes / 1e6 * STREAM_SECONDS_PER_MB
+  random = candidates * LOOKUP_SECONDS[random_engine]
+  if random_engine == 'index':
+    random += min(candidates, region_bytes // BLOCK_BYTES + 1) * BLOCK_SECONDS
+  return((stream, random))
+
+####################################################################################################
+## Function that parses --plan overrides: chr=stream|random[,chr=...]
+## return {contig: mode}
+####################################################################################################
+def parse_overrides(plan):
+  overrides = {}
+  if plan == None:
+    return(overrides)
+  for item in plan.split(','):
+    chr, mode = item.rsplit('=', 1)
+    if mode not in MODES:
+      raise ValueError('## ERROR: --plan %s: lookup mode must be one of %s'%(item, ', '.join(MODES)))
+    overrides[chr] = mode
+  return(overrides)
+
+####################################################################################################
+## Function that plans the parent lookups of every contig to call (proband bgzipped + local .tbi)
+## region / contigs restrict the contigs as in proband_lines(); overrides: {contig: mode}
+## return list of decision dictionaries (contig, length, candidates, parent_mb, stream_s,
+## random_s, random_engine: 'index', 'tabix' or father/mother engines, mode, forced), in proband
+## index order
+####################################################################################################
+def plan_contigs(sample_gvcf, fa_gvcf, mo_gvcf, region=None, contigs=None, overrides=None, windows=DEFAULT_SAMPLE_WINDOWS, window_bp=DEFAULT_WINDOW_BP):
+  if overrides == None:
+    overrides = {}
+  reader = TabixReader(sample_gvcf)
+  parents = []
+  for gvcf in [fa_gvcf, mo_gvcf]:
+    try:
+      parents.append(TabixReader(gvcf))
+    except IOError: # no local index: random access forks tabix, proband contig size as parent size
+      parents.append(None)
+  ## each parent is priced with its own random access, as PlannedBackend looks it up
+  engines = ['index' if p != None else 'tabix' for p in parents]
+  random_engine = engines[0] if engines[0] == engines[1] else '/'.join(engines)
+
+  if region != None:
+    targets = [parse_region(region)]
+  elif contigs != None:
+    targets = [(chr, 1, MAX_POS) for chr in contigs]
+  else:
+    targets = [(chr, 1, MAX_POS) for chr in reader.contigs]
+
+  lengths = contig_lengths(reader)
+  plan = []
+  try:
+    for chr, beg, end in targets:
+      if not chr in reader.refs:
+        continue
+      end = min(end, lengths.get(chr, len(reader.refs[chr][1]) << MIN_SHIFT))
+      if end < beg:
+        continue
+      candidates, counted, sampled = estimate_candidates(reader, chr, beg, end, windows, window_bp)
+      stream, random, parent_bytes = 0.0, 0.0, 0
+      for p, engine in zip(parents, engines):
+        sizer = p if p != None else reader
+        stream_bytes = compressed_bytes(sizer, chr, 1, end)
+        s, r = lookup_costs(candidates, stream_bytes, compressed_bytes(sizer, chr, beg, end), engine)
+        stream, random, parent_bytes = stream + s, random + r, parent_bytes + stream_bytes
+
+      mode = 'random' if random < stream else 'stream'
+      plan.append({'contig': chr, 'length': end - beg + 1, 'candidates': candidates, 'parent_mb': parent_bytes / 1e6,
+                   'stream_s': stream, 'random_s': random, 'random_engine': random_engine,
+                   'mode': overrides.get(chr, mode), 'forced': chr in overrides})
+  finally:
+    reader.close()
+    for p in parents:
+      if p != None:
+        p.close()
+  return(plan)
+
+####################################################################################################
+## Function that formats one plan decision as a log line
+####################################################################################################
+def describe(d):
+  mode = 'random access (%s)'%(d['random_engine']) if d['mode'] == 'random' else 'stream'
+  why = 'forced by --plan' if d['forced'] else 'est. %.1f s stream, %.1f s random access'%(d['stream_s'], d['random_s'])
+  return('## PLAN %s: ~%d candidate sites over %.2f Mb, parents %.1f MB to stream -> %s (%s)'%(d['contig'], d['candidates'], d['length'] / 1e6, d['parent_mb'], mode, why))
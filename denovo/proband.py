@@ -0,0 +1,86 @@
+## Purpose: read the proband gVCF directly, whole or restricted to contigs / regions through its index
+'''
+Replaces the per-contig uncompressed copies made by split_gvcf: the proband is read as
+  - a plain text gVCF, a bgzipped gVCF or '-' (stdin, header included), front to back, or
+  - a bgzipped, tabix-indexed gVCF restricted to whole contigs (--contigs) or to one region
+    (--region chr[:beg[-end]]), seeking straight to it through the .tbi.
+Region mode keeps records whose POS lies inside the region, so adjacent regions of one contig
+never process the same record twice.  Lines are returned with their trailing newline, exactly
+as iterating over an open text file would.  BGZF blocks are inflated on a thread pool
+(see denovo.bgzf.inflate_blocks), both for whole-file reads and from the index offset on.
+'''
+from denovo.bgzf import DEFAULT_THREADS, bgzf_lines, vcf_lines
+from denovo.tabix import TabixReader
+
+
+MAX_POS = 1 << 29 # largest position a tabix index can address
+
+####################################################################################################
+## Function that parses a samtools-style region string chr, chr:beg or chr:beg-end (1-based, inclusive)
+## return (chr, beg, end)
+####################################################################################################
+def parse_region(region):
+  if not ':' in region:
+    return((region, 1, MAX_POS))
+  chr, span = region.rsplit(':', 1)
+  span = span.replace(',', '')
+  if '-' in span:
+    beg, end = span.split('-', 1)
+    return((chr, int(beg), int(end) if end != '' else MAX_POS))
+  return((chr, int(span), MAX_POS))
+
+####################################################################################################
+## Function that yields the lines of the proband gVCF (header first), optionally restricted to
+## a region string or a list of contigs; threads is the number of BGZF inflating threads
+## progress (denovo.progress.Progress, optional) tracks the compressed bytes read of the whole
+## file, or of the index chunks spanned by the requested contigs / region, and the exact
+## (progress.target, progress.resume) position of lines for checkpoints
+## resume (optional) is such a (target, offset) position: the header lines are yielded, then
+## reading continues there
+####################################################################################################
+def proband_lines(sample_gvcf, region=None, contigs=None, threads=DEFAULT_THREADS, progress=None, resume=None):
+  if region is None and contigs is None:
+    for line in vcf_lines(sample_gvcf, threads, progress, resume[1] if resume is not None else None):
+      yield line
+    return
+
+  if sample_gvcf == '-':
+    raise IOError('## ERROR: --region/--contigs need a bgzipped, tabix-indexed proband gVCF, not stdin')
+  reader = TabixReader(sample_gvcf)
+  if region is not None:
+    targets = [parse_region(region)]
+  else:
+    targets = [(chr, 1, MAX_POS) for chr in contigs]
+  if progress is not None:
+    progress.size = 0
+    for chr, beg, end in targets:
+      chunks = reader._chunks(chr, beg - 1, end)
+      if len(chunks) > 0:
+        progress.size += (chunks[-1][1] >> 16) - (chunks[0][0] >> 16) + 1
+  try:
+    for line in reader.header_lines():
+      yield line + '\n'
+
+    ## read sequentially from the first index chunk of each target (or from the resume offset)
+    ## until the contig or region ends
+    for t, (chr, beg, end) in enumerate(targets):
+      chunks = reader._chunks(chr, beg - 1, end)
+      if len(chunks) == 0 or (resume is not None and t < resume[0]):
+        continue
+      voffset = chunks[0][0]
+      if resume is not None and t == resume[0]:
+        voffset = resume[1]
+      if progress is not None:
+        progress.target = t
+      lines = bgzf_lines(sample_gvcf, threads, voffset, progress)
+      try:
+        for line in lines:
+          tmpv = line.split('\t', 2)
+          if tmpv[0] != chr or int(tmpv[1]) > end:
+            break
+          if int(tmpv[1]) >= beg:
+            yield line
+      finally:
+        lines.close()
+  finally:
+    reader.close()
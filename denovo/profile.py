@@ -0,0 +1,199 @@
+## Purpose: per-stage wall time and skip reason counters of a calling run, written as a JSON report
+'''
+The calling loops only print how many lines they have read, so a slow run does not tell whether
+the time goes into inflating the input, splitting lines, parent lookups, the criteria or the
+output.  Profile keeps one stage current at a time: enter(stage) adds the time since the last
+switch to the current stage, and timed(lines) wraps the input so that the time spent waiting for
+each line is charged to 'read' (everything after it to 'parse' until the loop enters another
+stage).  Whatever path a line takes through the loop (including `continue`), every second of the
+run is charged to exactly one of
+  setup      - arguments, headers, opening the inputs (and whole-file parent queries)
+  read       - reading / inflating / merging input lines
+  parse      - pre-classification, splitting lines, proband and parent FORMAT fields
+  parent     - parent gVCF lookups (gvcf_to_denovo_v4.py; the trio gVCF has the parents in line)
+  criteria   - de novo calling criteria
+  write      - formatting calls and handing them to the output writer
+  wait       - waiting for the results of worker processes (gvcf_to_denovo_ALT.py --threads)
+  finish     - closing the output and the inputs
+With worker processes each genomic range is profiled in its worker and merged into the main
+process profile, so the stage times add up to more than the wall time.
+Counters record why records and alleles were dropped:
+  records    - ref_block, indel, star (pre-classifier), missing_fields
+  alleles    - star, indel, missing_gt, missing_ad_dp, no_alt_ad, the criterion failed first
+               (hom_alt, pb_min_vaf, par_max_alt, par_min_dp, par_gt) and called
+and counts tally the work done: candidates (records passing the pre-classifier), parent_lookups
+and parent_hits (lookups finding a parent record at the site), with pass / fail counts of each
+predicate of the lazy criteria chain (denovo.vectorized.Criteria.chain).  The report
+(--profile <json>), with CPU seconds, peak RSS and the run's info (sample, contigs, ...), is written when the
+interpreter exits; it doubles as the per-shard metrics sidecar merged by gather_metrics.py.
+--profile_interval prints a '## PROFILE' line with the same numbers every so many seconds.  NullProfile has the same
+methods doing nothing, so the calling loops pay close to nothing when profiling is off.
+'''
+import atexit
+import json
+import resource
+import time
+
+from denovo.classify import is_ref_block
+
+
+STAGES = ['setup', 'read', 'parse', 'parent', 'criteria', 'write', 'wait', 'finish']
+RECORD_REASONS = ['ref_block', 'indel', 'star', 'missing_fields']
+ALLELE_REASONS = ['star', 'indel', 'missing_gt', 'missing_ad_dp', 'no_alt_ad', 'hom_alt', 'pb_min_vaf', 'par_max_alt', 'par_min_dp', 'par_gt', 'called']
+COUNTS = ['candidates', 'parent_lookups', 'parent_hits']
+
+####################################################################################################
+## Function that tells why the pre-classifier (denovo.classify.snv_candidate) rejects a record line
+## return 'ref_block', 'indel' or 'star'
+####################################################################################################
+def reject_reason(line):
+  if is_ref_block(line):
+    return('ref_block')
+  tmp = line.split('\t', 5)
+  if len(tmp[3]) == 1 and len([a for a in tmp[4].strip(',<NON_REF>').split(',') if a != '*']) == 0:
+    return('star')
+  return('indel') # multi-base REF, or multi-base ALT alleles only
+
+
+class Profile(object):
+  '''
+  Stage timers and skip reason counters of one calling run.
+  enabled              -> True (False for NullProfile); guards extra work done only to count
+  enter(stage)         -> charge the time since the last switch to the current stage, make stage current
+  timed(lines, after)  -> iterate over lines, charging the wait for each one to 'read' and entering
+                          after ('parse') when it arrives; prints the progress line when due
+  rejected(line)       -> count a record line rejected by the pre-classifier, by reason
+  record(reason)       -> count a record dropped for reason
+  allele(reason)       -> count an allele dropped for reason (or 'called')
+  count(name, n)       -> add n to one of the COUNTS
+  predicate(name, passed) -> count one evaluation of a criteria chain predicate
+  info                 -> dictionary describing the run, copied into the report
+  merge(other)         -> add the times and counters of another profile (e.g. of a worker process)
+  report()             -> dictionary: wall, cpu, peak_rss_kb, stages, lines (record lines read),
+                          records, alleles, counts, predicates ({name: {pass, fail}}), info
+  summary()            -> one '## PROFILE' line
+  write()              -> write the report to path (registered to run at exit when path is given)
+  '''
+  enabled = True
+
+  ## path: JSON report written at exit (None: no report); interval: seconds between progress lines (0: none)
+  def __init__(self, path=None, interval=0):
+    self.path = path
+    self.interval = interval
+    self.times = dict((s, 0.0) for s in STAGES)
+    self.records = dict((r, 0) for r in RECORD_REASONS)
+    self.alleles = dict((r, 0) for r in ALLELE_REASONS)
+    self.counts = dict((c, 0) for c in COUNTS)
+    self.predicates = {}
+    self.info = {}
+    self.lines = 0
+    self.stage = 'setup'
+    self.start = time.perf_counter()
+    self.since = self.start
+    self.printed = self.start
+    self.cpu_start = time.process_time()
+    if path != None:
+      atexit.register(self.write)
+
+  def enter(self, stage):
+    now = time.perf_counter()
+    self.times[self.stage] += now - self.since
+    self.stage = stage
+    self.since = now
+    return(now)
+
+  def timed(self, lines, after='parse'):
+    self.enter('read')
+    for line in lines:
+      now = self.enter(after)
+      if not line.startswith('#'):
+        self.lines += 1
+      if self.interval and now - self.printed >= self.interval:
+        self.printed = now
+        print(self.summary())
+      yield line
+      self.enter('read')
+    self.enter(after)
+
+  def rejected(self, line):
+    self.records[reject_reason(line)] += 1
+
+  def record(self, reason):
+    self.records[reason] += 1
+
+  def allele(self, reason):
+    self.alleles[reason] += 1
+
+  def count(self, name, n=1):
+    self.counts[name] += n
+
+  def predicate(self, name, passed):
+    p = self.predicates.setdefault(name, {'pass': 0, 'fail': 0})
+    p['pass' if passed else 'fail'] += 1
+
+  def merge(self, other):
+    for s in other.times:
+      self.times[s] = self.times.get(s, 0.0) + other.times[s]
+    for r in other.records:
+      self.records[r] += other.records[r]
+    for r in other.alleles:
+      self.alleles[r] += other.alleles[r]
+    for c in other.counts:
+      self.counts[c] += other.counts[c]
+    for name, p in other.predicates.items():
+      q = self.predicates.setdefault(name, {'pass': 0, 'fail': 0})
+      q['pass'] += p['pass']
+      q['fail'] += p['fail']
+    self.lines += other.lines
+
+  def report(self):
+    self.enter(self.stage)
+    return({'wall': round(self.since - self.start, 6), 'cpu': round(time.process_time() - self.cpu_start, 6),
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'stages': dict((s, round(t, 6)) for s, t in self.times.items()), 'lines': self.lines,
+            'records': dict(self.records), 'alleles': dict(self.alleles), 'counts': dict(self.counts),
+            'predicates': dict((name, dict(p)) for name, p in self.predicates.items()), 'info': dict(self.info)})
+
+  def summary(self):
+    rep = self.report()
+    stages = ', '.join(['%s %.1f s'%(s, rep['stages'][s]) for s in STAGES if rep['stages'][s] > 0])
+    skipped = ', '.join(['%s %d'%(r, n) for r, n in list(rep['records'].items()) + list(rep['alleles'].items()) + list(rep['counts'].items()) if n > 0])
+    return('## PROFILE: %d lines, %s | %s'%(rep['lines'], stages, skipped))
+
+  def write(self):
+    with open(self.path, 'w') as f:
+      json.dump(self.report(), f, indent=2, sort_keys=True)
+
+
+class NullProfile(Profile):
+  '''
+  Profile that records nothing (profiling off); timed(lines) returns lines itself.
+  '''
+  enabled = False
+
+  def __init__(self):
+    Profile.__init__(self)
+
+  def enter(self, stage):
+    return(0)
+
+  def timed(self, lines, after='parse'):
+    return(lines)
+
+  def rejected(self, line):
+    pass
+
+  def record(self, reason):
+    pass
+
+  def allele(self, reason):
+    pass
+
+  def count(self, name, n=1):
+    pass
+
+  def predicate(self, name, passed):
+    pass
+
+  def merge(self, other):
+    pass
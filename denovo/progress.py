@@ -0,0 +1,49 @@
+## Purpose: progress and ETA of a sequential pass, from the input position instead of a line count
+'''
+Replaces the `cat <file> | grep -v "#" | wc -l` pre-pass (a full extra read, and a full extra
+decompression for compressed input) that was only used to print i/tot.  The line readers
+(denovo.bgzf.vcf_lines / bgzf_lines, denovo.proband.proband_lines) set size and advance
+position as they go: plain bytes for text files, compressed bytes for BGZF.
+'''
+import time
+
+
+####################################################################################################
+## Function that formats a number of seconds as h:mm:ss
+####################################################################################################
+def format_seconds(seconds):
+  seconds = int(seconds)
+  return('%d:%02d:%02d'%(seconds // 3600, (seconds % 3600) // 60, seconds % 60))
+
+
+class Progress(object):
+  '''
+  Progress of one pass over an input.
+  size        -> total input size, in the units of position (None if unknown, e.g. stdin)
+  position    -> input consumed so far
+  resume      -> exact offset of the line just handed out by the reader, where known (else None):
+                 everything before it has been processed once the caller starts on that line
+  target      -> index of the contig / region being read (--contigs / --region input)
+  fraction()  -> position / size, None if unknown
+  report(i)   -> progress line for i processed lines, with percent done and ETA when size is known
+  '''
+
+  def __init__(self, size=None):
+    self.size = size
+    self.position = 0
+    self.resume = None
+    self.target = 0
+    self.start = time.time()
+
+  def fraction(self):
+    if not self.size:
+      return(None)
+    return(min(1.0, float(self.position) / self.size))
+
+  def report(self, i):
+    frac = self.fraction()
+    elapsed = time.time() - self.start
+    if frac is None or frac <= 0:
+      return('## %d lines processed, %s elapsed ... '%(i, format_seconds(elapsed)))
+    eta = elapsed * (1.0 - frac) / frac
+    return('## %d lines processed, %.1f%% of input, %s elapsed, ETA %s ... '%(i, 100 * frac, format_seconds(elapsed), format_seconds(eta)))
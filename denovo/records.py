@@ -0,0 +1,90 @@
+## Purpose: compact record types of the calling hot path: interned FORMAT layouts, slotted candidates and evidence
+'''
+The calling loop used to build dictionaries for every record it touched: dict(zip(fmt, sample))
+for the proband (once per ALT allele), dict(zip(header, line)) and dict(zip(FORMAT, sample)) for
+each parent record, plus a candidate dictionary per allele and an evidence dictionary per parent
+lookup.  A gVCF has only a handful of distinct FORMAT strings, so
+  FormatLayout   - the fields of one FORMAT string and the position of each, built once per
+                   distinct string (format_layout(), interned in FORMATS); a sample is then just
+                   its split values, read by position
+  Candidate      - one proband SNV allele being called (__slots__: no per-instance dictionary)
+  ParentEvidence - what one parent's data says about an allele (__slots__, the fields of the
+                   former parse_parent() dictionary)
+Field lookups keep the dict(zip()) semantics: the last occurrence of a repeated field wins and a
+field without a value (sample shorter than FORMAT) is missing.
+'''
+
+
+FORMATS = {} # {FORMAT string: FormatLayout}; a few distinct strings per gVCF
+
+
+class FormatLayout(object):
+  '''
+  One distinct FORMAT string.
+  format, fields         -> the FORMAT string, and split on ':'
+  has(values, field)     -> True if the sample values (sample split on ':') hold field
+  value(values, field)   -> value of field, KeyError if the sample does not hold it
+  '''
+  __slots__ = ('format', 'fields', 'index')
+
+  def __init__(self, format):
+    self.format = format
+    self.fields = format.split(':')
+    self.index = dict(zip(self.fields, range(len(self.fields))))
+
+  def has(self, values, field):
+    k = self.index.get(field)
+    return(k != None and k < len(values))
+
+  def value(self, values, field):
+    k = self.index.get(field)
+    if k == None or k >= len(values):
+      raise KeyError(field)
+    return(values[k])
+
+####################################################################################################
+## Function that returns the interned layout of a FORMAT string
+####################################################################################################
+def format_layout(format):
+  layout = FORMATS.get(format)
+  if layout == None:
+    layout = FORMATS[format] = FormatLayout(format)
+  return(layout)
+
+
+class Candidate(object):
+  '''
+  One proband SNV allele being called.
+  site, a, altidx            -> the record (denovo.engine.Site), the allele and its index in AD
+  values                     -> proband sample values (split on ':'; layout site.layout)
+  pb_refdp, pb_altdp, pb_dp  -> proband depths (ints, or gVCF strings from a merged trio)
+  fa, mo                     -> ParentEvidence of each parent, None until looked up
+  fa_altdp, fa_dp, mo_altdp, mo_dp -> parent depths, set with the evidence
+  '''
+  __slots__ = ('site', 'a', 'altidx', 'values', 'pb_refdp', 'pb_altdp', 'pb_dp', 'fa', 'mo', 'fa_altdp', 'fa_dp', 'mo_altdp', 'mo_dp')
+
+  def __init__(self, site, a, altidx, values, pb_refdp, pb_altdp, pb_dp):
+    self.site, self.a, self.altidx, self.values = site, a, altidx, values
+    self.pb_refdp, self.pb_altdp, self.pb_dp = pb_refdp, pb_altdp, pb_dp
+    self.fa = self.mo = None
+
+  def set_parent(self, party, ev):
+    if party == 'fa':
+      self.fa, self.fa_altdp, self.fa_dp = ev, ev.altdp, ev.dp
+    else:
+      self.mo, self.mo_altdp, self.mo_dp = ev, ev.altdp, ev.dp
+
+
+class ParentEvidence(object):
+  '''
+  Parent evidence for one proband allele.
+  altdp, dp  -> parent allele / total depth (ints from parent gVCF files, strings from trio columns)
+  fmt, gt    -> parent FORMAT and sample column ('NA' without a parent record at the site)
+  info       -> parent INFO ('NA' without a record, None for trio columns)
+  hit        -> True if there is a parent record at the site
+  '''
+  __slots__ = ('altdp', 'dp', 'fmt', 'gt', 'info', 'hit')
+
+  def __init__(self, altdp, dp, fmt, gt, info):
+    self.altdp, self.dp, self.fmt, self.gt, self.info = altdp, dp, fmt, gt, info
+    self.hit = fmt != 'NA'
@@ -0,0 +1,96 @@
+## Purpose: batched parent queries, one `tabix -h -R <regions> <gvcf>` per parent per shard
+'''
+Two-step alternative to one tabix query per proband site: collect every candidate proband
+(chr, pos) of the shard first, write them to a regions file, then query each parent once
+with `tabix -h -R` (header + all overlapping records in one process) and join the records
+back to the sites in memory.  Works on remote (gs://) parent gVCFs as well.
+
+RegionBatch has the same cols / contig_lines(chr) interface as ParentGVCF, so lookups are
+answered by a ParentStream sweep over the batch result.
+'''
+import os
+import subprocess
+import tempfile
+
+from denovo.classify import snv_candidate
+
+
+####################################################################################################
+## Function that collects candidate SNV sites from the lines of a proband gVCF (non-reference-block
+## lines with a single-base REF and at least one single-base ALT other than '*')
+## return list of (chr, pos) in file order
+####################################################################################################
+def proband_candidate_sites(sample_lines):
+  sites = []
+  for line in sample_lines:
+    if line.startswith('#') or 'END=' in line or not snv_candidate(line):
+      continue
+    tmp = line.split('\t', 2)
+    sites.append((tmp[0], int(tmp[1])))
+  return(sites)
+
+####################################################################################################
+## Function that writes (chr, pos) sites as a tabix regions file (chr, beg, end; 1-based inclusive)
+####################################################################################################
+def write_regions(sites, path):
+  with open(path, 'w') as f:
+    for chr, pos in sites:
+      f.write('%s\t%d\t%d\n'%(chr, pos, pos))
+
+
+class RegionBatch(object):
+  '''
+  Result of one `tabix -h -R <regions> <gvcf>` query, grouped by contig.
+  cols               -> #CHROM header columns
+  contig_lines(chr)  -> records of that contig overlapping any region, in file order
+  '''
+
+  def __init__(self, gvcf, regions_file):
+    self.gvcf = gvcf
+    proc = subprocess.run(['tabix', '-h', '-R', regions_file, gvcf], stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8')
+    if proc.returncode != 0: # missing index, bad path, no access: never an empty (call-free) batch
+      raise IOError('## ERROR: tabix -h -R %s %s failed (exit %d): %s'%(regions_file, gvcf, proc.returncode, proc.stderr.strip()))
+    tmp = proc.stdout
+
+    self.cols = []
+    self.records = {} # {chr: [line, ...]}
+    seen = set() # older htslib prints records overlapping several regions more than once
+    for line in tmp.split('\n'):
+      if line == '':
+        continue
+      if line.startswith('#'):
+        if line.startswith('#CHROM'):
+          self.cols = line.split('\t')
+        continue
+      if line in seen:
+        continue
+      seen.add(line)
+      self.records.setdefault(line.split('\t', 1)[0], []).append(line)
+
+    ## restore file order (sorted by POS) if regions were visited out of order
+    for chr in self.records:
+      self.records[chr].sort(key=lambda l: int(l.split('\t', 2)[1]))
+
+  def contig_lines(self, chr):
+    for line in self.records.get(chr, []):
+      yield line
+
+  def close(self):
+    self.records = {}
+
+####################################################################################################
+## Function that queries both parents once for all candidate sites of a proband gVCF
+## (sample_lines: iterable over the proband lines, e.g. denovo.proband.proband_lines())
+## return (father RegionBatch, mother RegionBatch)
+####################################################################################################
+def batch_parent_queries(sample_lines, fa_gvcf, mo_gvcf):
+  sites = proband_candidate_sites(sample_lines)
+  fd, regions_file = tempfile.mkstemp(prefix='tmp.', suffix='.regions.txt')
+  os.close(fd)
+  try:
+    write_regions(sites, regions_file)
+    fa_batch = RegionBatch(fa_gvcf, regions_file)
+    mo_batch = RegionBatch(mo_gvcf, regions_file)
+  finally:
+    os.remove(regions_file)
+  return(fa_batch, mo_batch)
@@ -0,0 +1,259 @@
+## Purpose: in-process tabix (.tbi) index reader and region queries over a BGZF gVCF
+'''
+Replaces `tabix <gvcf> chr:beg-end` / `tabix -H <gvcf>` subprocesses with a reader that
+opens the gVCF and its .tbi once.  Region queries use the index bins (UCSC binning scheme,
+min_shift 14, depth 5) and the linear index to find the BGZF chunks to scan, and return
+overlapping records in file order, exactly as the tabix command line does.
+'''
+import gzip
+import os
+import struct
+
+from denovo.bgzf import BgzfReader
+from denovo.evidence import record_end
+
+
+TBI_MAGIC = b'TBI\x01'
+MIN_SHIFT = 14
+
+####################################################################################################
+## Function that returns the bins that may contain records overlapping [beg, end) (0-based)
+####################################################################################################
+def reg2bins(beg, end):
+  end -= 1
+  bins = [0]
+  for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+    bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+  return(bins)
+
+####################################################################################################
+## Function that parses a .tbi file
+## return (index settings dict, list of contig names, {contig: (bins dict, linear index list)})
+####################################################################################################
+def read_tbi(tbi):
+  with gzip.open(tbi, 'rb') as f: # concatenated BGZF blocks == multi-member gzip
+    data = f.read()
+  if data[:4] != TBI_MAGIC:
+    raise IOError('## ERROR: %s is not a tabix index'%(tbi))
+
+  n_ref, fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack('<8i', data[4:36])
+  names = data[36:36+l_nm].split(b'\x00')[:n_ref]
+  names = [n.decode('utf8') for n in names]
+  settings = {'format': fmt, 'col_seq': col_seq, 'col_beg': col_beg, 'col_end': col_end, 'meta': chr(meta), 'skip': skip}
+
+  off = 36 + l_nm
+  refs = {}
+  for name in names:
+    n_bin = struct.unpack('<i', data[off:off+4])[0]
+    off += 4
+    bins = {}
+    for b in range(n_bin):
+      bin_id, n_chunk = struct.unpack('<Ii', data[off:off+8])
+      off += 8
+      chunks = struct.unpack('<%dQ'%(2*n_chunk), data[off:off+16*n_chunk])
+      off += 16*n_chunk
+      bins[bin_id] = list(zip(chunks[0::2], chunks[1::2]))
+    n_intv = struct.unpack('<i', data[off:off+4])[0]
+    off += 4
+    ioff = list(struct.unpack('<%dQ'%(n_intv), data[off:off+8*n_intv]))
+    off += 8*n_intv
+    refs[name] = (bins, ioff)
+
+  return(settings, names, refs)
+
+
+class TabixReader(object):
+  '''
+  Random access to a bgzipped, tabix-indexed gVCF.
+  header_lines()        -> header lines (like tabix -H)
+  columns()             -> #CHROM header line split into column names
+  fetch(chr, beg, end)  -> lines overlapping 1-based chr:beg-end, in file order (like tabix chr:beg-end)
+  contig_lines(chr)     -> generator over every line of one contig (like tabix chr)
+  contig_records(chr)   -> same, as (virtual offset, line) pairs
+  records_starting_in(chr, beg, end) -> lines with POS in [beg, end] (for splitting work by range)
+  line_at(voffset)      -> the line starting at a virtual offset
+  '''
+
+  def __init__(self, gvcf, tbi=None, cache_blocks=0):
+    if tbi is None:
+      tbi = gvcf + '.tbi'
+    if not os.path.exists(tbi):
+      raise IOError('## ERROR: missing tabix index %s'%(tbi))
+    self.gvcf = gvcf
+    self.settings, self.contigs, self.refs = read_tbi(tbi)
+    self.bgzf = BgzfReader(gvcf, cache_blocks)
+    self._cols = None
+    self._hint = None
+
+  def header_lines(self):
+    meta = self.settings['meta']
+    self.bgzf.seek(0)
+    head = []
+    while True:
+      line = self.bgzf.readline()
+      if line == b'' or not line.startswith(meta.encode('utf8')):
+        break
+      head.append(line.decode('utf8').rstrip('\n'))
+    return(head)
+
+  def columns(self):
+    if self._cols is None:
+      head = self.header_lines()
+      self._cols = head[-1].split('\t') if len(head) > 0 else []
+    return(self._cols)
+
+  ## merged list of (start, end) virtual offset chunks that may hold records overlapping [beg, end)
+  def _chunks(self, chr, beg, end):
+    if chr not in self.refs:
+      return([])
+    bins, ioff = self.refs[chr]
+    min_off = 0
+    if len(ioff) > 0:
+      min_off = ioff[min(beg >> MIN_SHIFT, len(ioff) - 1)]
+
+    chunks = []
+    for b in reg2bins(beg, end):
+      for c in bins.get(b, []):
+        if c[1] > min_off:
+          chunks.append(c)
+    chunks.sort()
+
+    merged = []
+    for c in chunks:
+      if len(merged) > 0 and c[0] <= merged[-1][1]:
+        if c[1] > merged[-1][1]:
+          merged[-1] = (merged[-1][0], c[1])
+      else:
+        merged.append(c)
+    if len(merged) > 0 and merged[0][0] < min_off:
+      merged[0] = (min_off, merged[0][1])
+    return(merged)
+
+  def fetch(self, chr, beg, end):
+    beg0 = int(beg) - 1
+    end0 = int(end)
+    chunks = self._chunks(chr, beg0, end0)
+    if len(chunks) == 0:
+      return([])
+
+    ## moving forward along a contig, skip the records the previous query already found to end
+    ## before its start (hint = (chr, beg0, first chunk start, first record not ending before beg0))
+    hint = self._hint
+    scanned_from = chunks[0][0]
+    if hint is not None and hint[0] == chr and hint[1] <= beg0 and hint[2] <= chunks[0][0] < hint[3] < chunks[0][1]:
+      scanned_from = hint[2]
+      chunks[0] = (hint[3], chunks[0][1])
+    self._hint = None
+
+    chr_b = chr.encode('utf8')
+    out = []
+    for ci, (cbeg, cend) in enumerate(chunks):
+      self.bgzf.seek(cbeg)
+      while True:
+        voffset = self.bgzf.tell()
+        if voffset >= cend:
+          break
+        line = self.bgzf.readline()
+        if line == b'':
+          break
+        tmpv = line.split(b'\t', 8)
+        if tmpv[0] != chr_b:
+          break
+        start = int(tmpv[1])
+        if start <= end0 and record_end(start, tmpv[3], tmpv[7].decode('utf8')) <= beg0:
+          continue # record ends before the query
+        if ci == 0 and self._hint is None:
+          self._hint = (chr, beg0, scanned_from, voffset)
+        if start > end0: # records are sorted by start
+          return(out)
+        out.append(line.decode('utf8').rstrip('\n'))
+    return(out)
+
+  def records_starting_in(self, chr, beg, end):
+    ## lines whose POS lies in 1-based [beg, end]; consecutive ranges never share a record
+    chunks = self._chunks(chr, int(beg) - 1, int(end))
+    if len(chunks) == 0:
+      return
+    voffset = chunks[0][0]
+    chr_b = chr.encode('utf8')
+    while True:
+      self.bgzf.seek(voffset)
+      line = self.bgzf.readline()
+      voffset = self.bgzf.tell()
+      tmpv = line.split(b'\t', 2)
+      if line == b'' or tmpv[0] != chr_b:
+        return
+      start = int(tmpv[1])
+      if start > end:
+        return
+      if start >= beg:
+        yield line.decode('utf8').rstrip('\n')
+
+  def contig_records(self, chr):
+    chunks = self._chunks(chr, 0, 1 << 29)
+    if len(chunks) == 0:
+      return
+    voffset = chunks[0][0]
+    while True:
+      ## re-seek on every line so that fetch() calls in between do not move this iterator
+      self.bgzf.seek(voffset)
+      line = self.bgzf.readline()
+      next_voffset = self.bgzf.tell()
+      if line == b'':
+        return
+      line = line.decode('utf8').rstrip('\n')
+      if not line.startswith(chr + '\t'):
+        return
+      yield (voffset, line)
+      voffset = next_voffset
+
+  def contig_lines(self, chr):
+    for voffset, line in self.contig_records(chr):
+      yield line
+
+  def line_at(self, voffset):
+    self.bgzf.seek(voffset)
+    return(self.bgzf.readline().decode('utf8').rstrip('\n'))
+
+  def close(self):
+    self.bgzf.close()
+
+####################################################################################################
+## Function that splits an indexed gVCF into about n_ranges genomic ranges holding similar amounts
+## of compressed data, cut at linear index (16 kb) window boundaries and never spanning contigs
+## return list of (chr, beg, end), 1-based inclusive, in file order
+####################################################################################################
+def split_ranges(reader, n_ranges):
+  ## compressed offset at which each contig starts, in file order
+  starts = []
+  for chr in reader.contigs:
+    chunks = reader._chunks(chr, 0, 1 << 29)
+    if len(chunks) > 0:
+      starts.append((chunks[0][0] >> 16, chr))
+  starts.sort()
+  file_size = os.path.getsize(reader.gvcf)
+
+  ## compressed bytes per linear index window of each contig
+  sizes = []
+  for k, (cstart, chr) in enumerate(starts):
+    cend = starts[k+1][0] if k + 1 < len(starts) else file_size
+    coffs = [max(cstart, ioff >> 16) for ioff in reader.refs[chr][1]] + [cend]
+    for w in range(1, len(coffs)):
+      coffs[w] = max(coffs[w], coffs[w-1])
+    sizes.append((chr, [coffs[w+1] - coffs[w] for w in range(len(coffs) - 1)]))
+
+  total = sum(sum(w) for chr, w in sizes)
+  target = max(1, total // max(1, n_ranges))
+
+  ranges = []
+  for chr, windows in sizes:
+    first = 0
+    acc = 0
+    for w, size in enumerate(windows):
+      acc += size
+      if acc >= target and w + 1 < len(windows):
+        ranges.append((chr, (first << MIN_SHIFT) + 1, (w + 1) << MIN_SHIFT))
+        first = w + 1
+        acc = 0
+    ranges.append((chr, (first << MIN_SHIFT) + 1, 1 << 29))
+  return(ranges)
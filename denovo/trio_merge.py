@@ -0,0 +1,315 @@
+## Purpose: streaming merge of proband, father and mother gVCFs into in-memory trio records
+'''
+Replaces the `bcftools merge -g <ref> -m all` task that wrote (and compressed and indexed) a full
+<sample>.TRIO.g.vcf.gz only for gvcf_to_denovo_ALT.py to read it back.  trio_lines() reads the
+three single-sample gVCFs side by side, in position order, and yields trio VCF lines: a header
+with the three sample columns, then one record per position where at least one sample has a
+variant record.  At such a position
+  - REF is the longest REF of the variant records; shorter alleles are padded with its suffix
+  - ALT is the union of the alleles in proband, father, mother order, <NON_REF> last
+  - a sample in a reference block (END=) covering the position contributes its block values
+    (GT 0/0, DP, ... ; AD missing), i.e. blocks are expanded at every variant position
+  - a sample with no record covering the position is missing (./.)
+  - Number=R / A / G FORMAT fields (AD, F1R2, F2R1, PL, ...) are re-indexed to the merged alleles,
+    '.' for alleles the sample does not have; GT is re-indexed as well
+  - ID, QUAL (maximum), FILTER and INFO come from the first sample with a variant record.
+Positions where every sample is in a reference block are not emitted: the calling loop never
+calls them, so no merged reference block records (and no reference FASTA) are needed.  Records
+come out in the ##contig order of the headers.
+'''
+import collections
+import itertools
+
+from denovo.bgzf import DEFAULT_THREADS, vcf_lines
+from denovo.classify import is_ref_block
+from denovo.cohort import contig_order
+from denovo.evidence import record_end
+
+
+SYMBOLIC = ['<NON_REF>', '<*>'] # gVCF "any other allele"
+GATK_NUMBERS = {'AD': 'R', 'F1R2': 'R', 'F2R1': 'R', 'PL': 'G'} # used when the headers do not declare them
+
+####################################################################################################
+## Function that returns {FORMAT id: Number} declared by ##FORMAT header lines
+####################################################################################################
+def format_numbers(header):
+  numbers = {}
+  for line in header:
+    if not line.startswith('##FORMAT=<'):
+      continue
+    id, number = None, None
+    for part in line[len('##FORMAT=<'):].split(','):
+      if part.startswith('ID='):
+        id = part[3:]
+      elif part.startswith('Number='):
+        number = part[7:]
+      if id is not None and number is not None:
+        numbers[id] = number
+        break
+  return(numbers)
+
+####################################################################################################
+## Function that returns the index of diploid genotype j/k (j <= k) in a Number=G list
+####################################################################################################
+def genotype_index(j, k):
+  return(k * (k + 1) // 2 + j)
+
+####################################################################################################
+## Function that re-indexes one FORMAT value of a sample to the merged alleles
+## m: merged allele index of each sample allele (0 = REF); n: number of merged alleles incl. REF
+####################################################################################################
+def remap_value(key, number, value, m, n):
+  if value == '.':
+    return(value)
+  if key == 'GT':
+    out = ''
+    allele = ''
+    for ch in value + '/':
+      if ch in '/|':
+        if allele == '.' or not allele.isdigit() or int(allele) >= len(m):
+          out += '.'
+        else:
+          out += str(m[int(allele)])
+        out += ch
+        allele = ''
+      else:
+        allele += ch
+    return(out[:-1])
+
+  vals = value.split(',')
+  if number == 'R' and len(vals) == len(m):
+    new = ['.'] * n
+    for old, i in enumerate(m):
+      new[i] = vals[old]
+  elif number == 'A' and len(vals) == len(m) - 1:
+    new = ['.'] * (n - 1)
+    for old, i in enumerate(m[1:]):
+      new[i-1] = vals[old]
+  elif number == 'G' and len(vals) == genotype_index(0, len(m)):
+    new = ['.'] * genotype_index(0, n)
+    for k in range(len(m)):
+      for j in range(k + 1):
+        new[genotype_index(min(m[j], m[k]), max(m[j], m[k]))] = vals[genotype_index(j, k)]
+  else:
+    return(value)
+  return(','.join(new))
+
+
+class SampleStream(object):
+  '''
+  Records of one single-sample gVCF, read ahead to its next variant record.
+  header / name / numbers -> '##' header lines, sample column name, ##FORMAT Numbers
+  start(ranks)    -> start reading records; ranks ({contig: rank}) orders the contigs
+  var             -> (rank, pos, chr, line) of the next variant record, None at the end
+  take()          -> columns of the variant record var; then reads ahead to the next one
+  block_at(rank, pos) -> columns of the reference block covering the position, None if there is
+                     none; positions must not decrease (blocks ending before it are dropped)
+  Reference blocks read on the way to the next variant record are kept as raw lines and only
+  split when a variant of another sample falls before that record.
+  '''
+
+  def __init__(self, lines):
+    self.lines = iter(lines)
+    self.header = []
+    self.name = None
+    self.var = None
+    self.blocks = collections.deque() # raw reference block lines before var
+    self.block = None # (rank, start, end, columns) of the first block, once split
+    first = []
+    for line in self.lines:
+      if line.startswith('##'):
+        self.header.append(line.rstrip('\n'))
+      elif line.startswith('#'):
+        self.name = line.rstrip('\n').split('\t')[-1]
+      else:
+        first.append(line)
+        break
+    self.lines = itertools.chain(first, self.lines)
+    self.numbers = format_numbers(self.header)
+
+  def _rank(self, chr):
+    rank = self.ranks.get(chr)
+    if rank is None: # contig without a ##contig header line: ranked on first sight
+      rank = self.ranks.setdefault(chr, len(self.ranks))
+    return(rank)
+
+  def start(self, ranks):
+    self.ranks = ranks
+    self._fill()
+
+  def _fill(self):
+    self.var = None
+    for line in self.lines:
+      if is_ref_block(line):
+        self.blocks.append(line)
+        continue
+      tmpv = line.split('\t', 2)
+      self.var = (self._rank(tmpv[0]), int(tmpv[1]), tmpv[0], line)
+      return
+
+  def take(self):
+    tmp = self.var[3].rstrip('\n').split('\t')
+    self.blocks.clear()
+    self.block = None
+    self._fill()
+    return(tmp)
+
+  def block_at(self, rank, pos):
+    while True:
+      if self.block is None:
+        if len(self.blocks) == 0:
+          return(None)
+        tmp = self.blocks.popleft().rstrip('\n').split('\t')
+        start = int(tmp[1])
+        self.block = (self._rank(tmp[0]), start, record_end(start, tmp[3], tmp[7]), tmp)
+      b = self.block
+      if b[0] < rank or (b[0] == rank and b[2] < pos): # ends before the position
+        self.block = None
+        continue
+      if b[0] != rank or b[1] > pos:
+        return(None)
+      return(b[3])
+
+####################################################################################################
+## Functions that return the merged ID (first one set) and QUAL (maximum) of variant records
+####################################################################################################
+def merged_id(variants):
+  for tmp in variants:
+    if tmp[2] != '.':
+      return(tmp[2])
+  return('.')
+
+def merged_qual(variants):
+  qual = '.'
+  for tmp in variants:
+    if tmp[5] != '.' and (qual == '.' or float(tmp[5]) > float(qual)):
+      qual = tmp[5]
+  return(qual)
+
+####################################################################################################
+## Function that merges the records of the trio samples at one position
+## samples: per sample (columns, is_variant) or None (no record covering the position)
+## numbers: {FORMAT id: Number}
+## return trio VCF line (with newline)
+####################################################################################################
+def merge_record(chr, pos, samples, numbers):
+  variants = [tmp for tmp, is_var in [s for s in samples if s is not None] if is_var]
+  first = variants[0]
+
+  ## every sample has a variant record with the same alleles and FORMAT: nothing to re-index
+  if len(variants) == len(samples) and all(tmp[3] == first[3] and tmp[4] == first[4] and tmp[8] == first[8] for tmp in variants):
+    return('\t'.join(first[:2] + [merged_id(variants), first[3], first[4], merged_qual(variants)] + first[6:9] + [tmp[9] for tmp in variants]) + '\n')
+
+  ref = first[3]
+  for tmp in variants:
+    if len(tmp[3]) > len(ref):
+      ref = tmp[3]
+
+  ## merged alleles and, per sample, the merged index of each of its alleles
+  alts = []
+  symbolic = None
+  maps = []
+  for s in samples:
+    if s is None:
+      maps.append(None)
+      continue
+    tmp, is_var = s
+    m = [0]
+    for a in tmp[4].split(','):
+      if a in SYMBOLIC:
+        symbolic = symbolic or a
+        m.append(None) # set once the number of merged alleles is known
+      elif a == '.':
+        continue
+      else:
+        if is_var and a != '*':
+          a = a + ref[len(tmp[3]):]
+        if not a in alts:
+          alts.append(a)
+        m.append(alts.index(a) + 1)
+    maps.append(m)
+  if symbolic is not None:
+    alts.append(symbolic)
+  n = len(alts) + 1
+  maps = [[n - 1 if i is None else i for i in m] if m is not None else None for m in maps]
+
+  ## FORMAT keys in order of appearance, GT first
+  keys = []
+  for s in samples:
+    if s is not None:
+      for key in s[0][8].split(':'):
+        if not key in keys:
+          keys.append(key)
+  if 'GT' in keys:
+    keys.remove('GT')
+    keys.insert(0, 'GT')
+
+  format = ':'.join(keys)
+  identity = list(range(n))
+  columns = []
+  for s, m in zip(samples, maps):
+    if s is None:
+      columns.append(':'.join(['./.' if key == 'GT' else '.' for key in keys]))
+      continue
+    tmp = s[0]
+    if tmp[8] == format and m == identity: # same FORMAT and alleles as the merged record
+      columns.append(tmp[9])
+      continue
+    values = dict(zip(tmp[8].split(':'), tmp[9].split(':')))
+    columns.append(':'.join([remap_value(key, numbers.get(key), values[key], m, n) if key in values else ('./.' if key == 'GT' else '.') for key in keys]))
+
+  return('\t'.join([chr, str(pos), merged_id(variants), ref, ','.join(alts) if len(alts) > 0 else '.', merged_qual(variants), first[6], first[7], format] + columns) + '\n')
+
+####################################################################################################
+## Function that yields the lines of the trio gVCF merged from three single-sample gVCFs
+## (plain text or bgzipped; BGZF blocks inflated on threads), header first
+## names: sample column names (proband, father, mother); default the names in the gVCF headers
+####################################################################################################
+def trio_lines(pb_gvcf, fa_gvcf, mo_gvcf, names=None, threads=DEFAULT_THREADS, progress=None):
+  readers = [vcf_lines(pb_gvcf, threads, progress), vcf_lines(fa_gvcf, threads), vcf_lines(mo_gvcf, threads)]
+  try:
+    streams = [SampleStream(lines) for lines in readers]
+    if names is None:
+      names = [s.name for s in streams]
+
+    ranks = {}
+    numbers = {}
+    extra = [] # ##FORMAT lines of the parents missing from the proband header
+    for s in streams:
+      for chr in contig_order(s.header):
+        ranks.setdefault(chr, len(ranks))
+      for line in s.header:
+        if line.startswith('##FORMAT=<') and not line in streams[0].header and not line in extra:
+          extra.append(line)
+      for key, number in s.numbers.items():
+        numbers.setdefault(key, number)
+    for key, number in GATK_NUMBERS.items():
+      numbers.setdefault(key, number)
+
+    if progress is not None:
+      progress.resume = None # three inputs: no single resume offset
+    for line in streams[0].header + extra:
+      yield line + '\n'
+    yield '\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + list(names)) + '\n'
+
+    for s in streams:
+      s.start(ranks)
+    while True:
+      heads = [s.var for s in streams if s.var is not None]
+      if len(heads) == 0:
+        return
+      rank, pos, chr = min((h[0], h[1], h[2]) for h in heads)
+
+      samples = []
+      for s in streams:
+        if s.var is not None and s.var[0] == rank and s.var[1] == pos:
+          samples.append((s.take(), True))
+        else:
+          block = s.block_at(rank, pos)
+          samples.append((block, False) if block is not None else None)
+      if progress is not None:
+        progress.resume = None
+      yield merge_record(chr, pos, samples, numbers)
+  finally:
+    for lines in readers:
+      lines.close()
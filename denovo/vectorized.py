@@ -0,0 +1,120 @@
+## Purpose: vectorized de novo calling criteria over batches of candidate alleles (NumPy)
+'''
+The scalar calling loop applies the criteria one allele at a time in nested ifs, converting the
+same CLI threshold strings with int()/float() for every allele.  AlleleBatch collects the
+depth fields of many candidate alleles, converts each column with one NumPy call and evaluates
+  pb_refdp != 0
+  pb_vaf   >= pb_min_vaf        (pb_vaf = pb_altdp / pb_dp, 0.0 when pb_dp is 0)
+  fa_altdp <= par_max_alt  and  mo_altdp <= par_max_alt
+  fa_dp    >= par_min_dp   and  mo_dp    >= par_min_dp
+as boolean masks, so that only the passing alleles are formatted.  A column that does not convert
+(e.g. a '.' depth) raises ValueError; callers then fall back to the scalar criteria for that
+batch, which only convert the fields they reach, exactly like the per-allele loop.
+'''
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+COLUMNS = ['pb_refdp', 'pb_altdp', 'pb_dp', 'fa_altdp', 'fa_dp', 'mo_altdp', 'mo_dp']
+DEFAULT_BATCH_SIZE = 4096 # records per batch
+
+
+class Criteria(object):
+  '''
+  De novo calling thresholds, converted from the command line strings once.
+  failed(pb_refdp, pb_altdp, pb_dp, fa_altdp, fa_dp, mo_altdp, mo_dp)
+      -> name of the first criterion one allele fails (hom_alt, pb_min_vaf, par_max_alt,
+         par_min_dp), None if it is called; depths as ints or gVCF strings
+  chain
+      -> the same criteria as a lazy chain of (evidence, [(predicate, reason, test)]) stages in
+         cost order: proband predicates (no I/O), then the father's, then the mother's, so that a
+         caller only looks a parent up when every earlier predicate has passed
+         (denovo.engine.TrioCaller.evaluate); test(c) takes a candidate allele
+         (denovo.records.Candidate) holding the COLUMNS
+  '''
+
+  def __init__(self, pb_min_vaf, par_max_alt, par_min_dp):
+    self.pb_min_vaf = float(pb_min_vaf)
+    self.par_max_alt = int(par_max_alt)
+    self.par_min_dp = int(par_min_dp)
+    self.chain = [('pb', [('hom_alt', 'hom_alt', self.pb_not_hom_alt), ('pb_min_vaf', 'pb_min_vaf', self.pb_vaf)]),
+                  ('fa', [('fa_max_alt', 'par_max_alt', self.fa_max_alt), ('fa_min_dp', 'par_min_dp', self.fa_min_dp)]),
+                  ('mo', [('mo_max_alt', 'par_max_alt', self.mo_max_alt), ('mo_min_dp', 'par_min_dp', self.mo_min_dp)])]
+
+  ## predicates of the chain: True if the candidate allele passes
+  def pb_not_hom_alt(self, c):
+    return(int(c.pb_refdp) != 0)
+
+  def pb_vaf(self, c):
+    if int(c.pb_dp) > 0:
+      return(float(c.pb_altdp)/float(c.pb_dp) >= self.pb_min_vaf)
+    return(0.0 >= self.pb_min_vaf)
+
+  def fa_max_alt(self, c):
+    return(int(c.fa_altdp) <= self.par_max_alt)
+
+  def fa_min_dp(self, c):
+    return(int(c.fa_dp) >= self.par_min_dp)
+
+  def mo_max_alt(self, c):
+    return(int(c.mo_altdp) <= self.par_max_alt)
+
+  def mo_min_dp(self, c):
+    return(int(c.mo_dp) >= self.par_min_dp)
+
+  def failed(self, pb_refdp, pb_altdp, pb_dp, fa_altdp, fa_dp, mo_altdp, mo_dp):
+    if int(pb_dp) > 0:
+      pb_vaf = float(pb_altdp)/float(pb_dp)
+    else:
+      pb_vaf = 0.0
+
+    if int(pb_refdp) == 0: # hom alt site
+      return('hom_alt')
+    if pb_vaf < self.pb_min_vaf:
+      return('pb_min_vaf')
+    if int(fa_altdp) > self.par_max_alt or int(mo_altdp) > self.par_max_alt:
+      return('par_max_alt')
+    if int(fa_dp) < self.par_min_dp or int(mo_dp) < self.par_min_dp:
+      return('par_min_dp')
+    return(None)
+
+
+class AlleleBatch(object):
+  '''
+  Depth columns of a batch of candidate alleles.
+  add(allele)         -> append one candidate (denovo.records.Candidate, COLUMNS as gVCF strings)
+  passing(criteria)   -> indices of the candidates passing every criterion, in insertion order
+  '''
+
+  def __init__(self):
+    self.cols = dict((c, []) for c in COLUMNS)
+    self.n = 0
+
+  def __len__(self):
+    return(self.n)
+
+  def add(self, allele):
+    for c in COLUMNS:
+      self.cols[c].append(getattr(allele, c))
+    self.n += 1
+
+  def passing(self, criteria):
+    if self.n == 0:
+      return([])
+    pb_refdp = np.array(self.cols['pb_refdp']).astype(np.int64)
+    pb_altdp = np.array(self.cols['pb_altdp']).astype(np.float64)
+    pb_dp = np.array(self.cols['pb_dp']).astype(np.int64)
+    fa_altdp = np.array(self.cols['fa_altdp']).astype(np.int64)
+    fa_dp = np.array(self.cols['fa_dp']).astype(np.int64)
+    mo_altdp = np.array(self.cols['mo_altdp']).astype(np.int64)
+    mo_dp = np.array(self.cols['mo_dp']).astype(np.int64)
+
+    pb_vaf = np.zeros(self.n, dtype=np.float64)
+    np.divide(pb_altdp, pb_dp, out=pb_vaf, where=pb_dp > 0)
+
+    mask = (pb_refdp != 0) & (pb_vaf >= criteria.pb_min_vaf)
+    mask &= (fa_altdp <= criteria.par_max_alt) & (mo_altdp <= criteria.par_max_alt)
+    mask &= (fa_dp >= criteria.par_min_dp) & (mo_dp >= criteria.par_min_dp)
+    return(np.flatnonzero(mask).tolist())
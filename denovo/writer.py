@@ -0,0 +1,120 @@
+## Purpose: buffered output writer with a background thread, periodic flush and atomic rename
+'''
+The calling loops used to flush() + os.fsync() the output file after every de novo call, which
+serializes the whole pipeline on disk latency (network disks on preemptible VMs).  OutputWriter
+takes records from the calling loop through a queue; a background thread joins the fields,
+writes them in batches and flushes + fsyncs at most once per flush interval.  Output goes to
+<output>.tmp and is renamed to <output> only when close() completes, so a partial file is never
+mistaken for a finished shard.  Checkpoints (denovo.checkpoint) go through the same queue, so a
+saved checkpoint always matches the output written before it.
+'''
+import os
+import queue
+import threading
+import time
+
+
+DEFAULT_FLUSH_INTERVAL = 30 # seconds between flush + fsync of the partial output
+BATCH_LINES = 1000 # lines joined into one write() call
+
+
+class OutputWriter(object):
+  '''
+  Buffered writer for one output file.
+  write(text)           -> queue raw text
+  write_line(line)      -> queue one line (newline added on the writer thread)
+  write_record(fields)  -> queue one tab-separated line; str() and joining happen on the writer thread
+  checkpoint(ckpt, state) -> write out everything queued so far, fsync, then ckpt.save(state) with
+                           state['output_bytes'] set to the output length
+  close()               -> write everything, fsync once and rename <path>.tmp to <path>
+  abort()               -> stop and remove <path>.tmp, leaving no output
+  '''
+
+  ## resume_bytes: continue a checkpointed <path>.tmp, truncated to that length
+  def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL, resume_bytes=None):
+    if flush_interval <= 0: # the writer thread would flush + fsync in a busy loop
+      raise ValueError('## ERROR: flush interval must be positive, not %s'%(flush_interval))
+    self.path = path
+    self.tmp_path = path + '.tmp'
+    self.flush_interval = flush_interval
+    self.lines = 0
+    self.error = None
+    self.queue = queue.Queue()
+    if resume_bytes is None:
+      self.handle = open(self.tmp_path, 'wb')
+    else:
+      self.handle = open(self.tmp_path, 'r+b')
+      self.handle.truncate(resume_bytes)
+      self.handle.seek(resume_bytes)
+    self.thread = threading.Thread(target=self._run, name='denovo-writer', daemon=True)
+    self.thread.start()
+
+  def write(self, text):
+    self.queue.put(('text', text))
+
+  def write_line(self, line):
+    self.queue.put(('line', line))
+
+  def write_record(self, fields):
+    self.queue.put(('record', fields))
+
+  def checkpoint(self, ckpt, state):
+    self.queue.put(('checkpoint', (ckpt, state)))
+
+  def _write(self, buf):
+    self.handle.write(''.join(buf).encode('utf8'))
+    self.lines += len(buf)
+
+  ## writer thread: format and buffer queued items, write in batches, flush + fsync on the interval
+  def _run(self):
+    buf = []
+    next_flush = time.time() + self.flush_interval
+    try:
+      while True:
+        try:
+          kind, item = self.queue.get(timeout=max(0.0, next_flush - time.time()))
+        except queue.Empty:
+          kind, item = None, None
+
+        if kind == 'text':
+          buf.append(item)
+        elif kind == 'line':
+          buf.append(item + '\n')
+        elif kind == 'record':
+          buf.append('\t'.join(map(str, item)) + '\n')
+
+        if len(buf) >= BATCH_LINES or (kind in ['close', 'abort', 'checkpoint'] and len(buf) > 0):
+          self._write(buf)
+          buf = []
+        if kind in ['close', 'abort']:
+          return
+        if kind == 'checkpoint' or time.time() >= next_flush:
+          if len(buf) > 0:
+            self._write(buf)
+            buf = []
+          self.handle.flush()
+          os.fsync(self.handle)
+          next_flush = time.time() + self.flush_interval
+        if kind == 'checkpoint':
+          ckpt, state = item
+          ckpt.save(dict(state, output_bytes=self.handle.tell()))
+    except Exception as e:
+      self.error = e
+
+  def close(self):
+    self.queue.put(('close', None))
+    self.thread.join()
+    if self.error is not None:
+      self.handle.close()
+      raise self.error
+    self.handle.flush()
+    os.fsync(self.handle)
+    self.handle.close()
+    os.replace(self.tmp_path, self.path)
+
+  def abort(self):
+    self.queue.put(('abort', None))
+    self.thread.join()
+    self.handle.close()
+    if os.path.exists(self.tmp_path):
+      os.remove(self.tmp_path)
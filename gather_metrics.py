@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+## Purpose: merge the metrics sidecars of the call_denovos shards of one sample into a performance summary
+'''
+Usage: gather_metrics.py -s <sample id> \
+                         -i <file listing the shard metrics JSON files, one per line, in shard order> \
+                         -o <summary JSON> \
+                         -t <per-shard table (TSV)> \
+                         --straggler_factor <x the median shard flagged as a straggler (default 2)> \
+                         --min_seconds <shards faster than this are never flagged (default 60)>
+
+## CAVEATS:
+# -shards are named by their position in the list (the scatter index of call_denovos)
+# -a missing or unreadable sidecar is listed under "missing" instead of failing the gather
+
+# Output format:
+# summary JSON: sample_id, wall (max, max_shard, median, sum), lines_per_sec, totals, stages,
+#               stragglers, missing, shards (one dictionary per shard)
+# table: sample_id, shard, contigs, wall, cpu, peak_rss_kb, lines, lines_per_sec, candidates,
+#        parent_lookups, parent_hits, calls, top_stage, straggler (long / slow / long,slow / .)
+'''
+import sys
+import json
+from optparse import OptionParser
+
+from denovo.metrics import DEFAULT_MIN_SECONDS, DEFAULT_STRAGGLER_FACTOR, read_shard_metrics, summarize, write_shard_rows
+
+####################################################################################################
+## handle arguments
+####################################################################################################
+parser = OptionParser()
+parser.add_option('-s', '--sid', dest='sample_id', help='sample id')
+parser.add_option('-i', '--input', dest='metrics_list', help='file listing the shard metrics JSON files, one per line')
+parser.add_option('-o', '--output', dest='output_file', help='summary JSON')
+parser.add_option('-t', '--table', dest='table', help='per-shard table (TSV), one row per shard')
+parser.add_option('--straggler_factor', dest='straggler_factor', type='float', default=DEFAULT_STRAGGLER_FACTOR, help='flag shards taking >= this x the median shard wall time, or running at <= the median lines/sec / this (default %g)'%(DEFAULT_STRAGGLER_FACTOR))
+parser.add_option('--min_seconds', dest='min_seconds', type='float', default=DEFAULT_MIN_SECONDS, help='never flag shards faster than this many seconds (default %d)'%(DEFAULT_MIN_SECONDS))
+(options, args) = parser.parse_args()
+
+## check all arguments present
+if (options.sample_id == None or options.metrics_list == None or options.output_file == None):
+	print('\n' + '## ERROR: missing arguments' + '\n')
+	parser.print_help()
+	print('\n')
+	sys.exit()
+
+
+with open(options.metrics_list, 'r') as f:
+  paths = [line.strip() for line in f if line.strip() != '']
+
+summary = summarize(options.sample_id, read_shard_metrics(paths), options.straggler_factor, options.min_seconds)
+
+with open(options.output_file, 'w') as f:
+  json.dump(summary, f, indent=2, sort_keys=True)
+if options.table != None:
+  write_shard_rows(options.table, [summary])
+
+print('## %s: %d shards, %d without metrics'%(options.sample_id, len(summary['shards']), len(summary['missing'])))
+if 'wall' in summary:
+  print('## SLOWEST SHARD %s: %.1f s (median %.1f s, %.1f s summed over shards)'%(summary['wall']['max_shard'], summary['wall']['max'], summary['wall']['median'], summary['wall']['sum']))
+for r in summary['shards']:
+  if r['straggler'] not in ['.', 'missing']:
+    print('## STRAGGLER shard %s (%s): %s, %.1f s, %d lines, top stage %s'%(r['shard'], r['contigs'], r['straggler'], r['wall'], r['lines'], r['top_stage']))
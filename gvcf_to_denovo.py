@@ -45,6 +45,8 @@ import subprocess
 import os
 import gzip
 
+from denovo.progress import Progress
+
 ####################################################################################################
 ## handle arguments
 ####################################################################################################
@@ -244,10 +246,8 @@ mo_gvcf = pathd[pedd[sample_id]['mo']]
 #local_sample_gvcf = gsutil_localize(sample_gvcf, tmpname) # get new localized file path
 
 
-print('## COUNTING TOTAL VARIANT LINES')
-cmd2 = 'zcat < %s | grep -v "#"| wc -l'%(sample_gvcf)
-tot = int(subprocess.check_output(cmd2, shell=True).strip().split(' ')[0])
-print('## TOTAL VARIANT LINES: %s'%(str(tot)))
+## progress / ETA from the compressed byte offset in the proband gVCF (no zcat line-count pre-pass)
+progress = Progress(os.path.getsize(sample_gvcf))
 
 
 print('')
@@ -280,7 +280,8 @@ with gzip.open(sample_gvcf, 'r') as f:
     else:
       i += 1
       if i%1000 == 0:
-        print('## %d/%d lines processed ... '%(i, tot))
+        progress.position = f.fileobj.tell() # position in the compressed file
+        print(progress.report(i))
 
       ## initialize values to avoid iteration bugs
       chr, pos, ref, alt = '', '', '',''
@@ -2,14 +2,27 @@
 ## Purpose: call de novos from a trio gvcf
 '''
 Usage: gvcf_to_denovo.py -s <sample id> \
-                         -g <gzipped trio gvcf>
+                         -g <trio gvcf: plain or bgzipped>
+                            | --pb_gvcf <proband gvcf> --fa_gvcf <father gvcf> --mo_gvcf <mother gvcf>
                          -p <PED file>
                          -x <proband min vaf> \
                          -y <parent max altdp> \
                          -z <parent min dp> \
-                         -o <output filename> 
+                         -o <output filename> \
+                         -t <number of worker processes (default 1)> \
+                         -j <threads inflating a bgzipped gvcf (single process mode)> \
+                         --flush_interval <seconds between flushes of the partial output> \
+                         --checkpoint <checkpoint file, written periodically> \
+                         --checkpoint_interval <seconds between checkpoints> \
+                         --resume <continue from the checkpoint file of an interrupted run> \
+                         -b <records per vectorized criteria batch, 0 for one record at a time> \
+                         --profile <JSON report of per-stage times and skip reason counts> \
+                         --profile_interval <seconds between '## PROFILE' progress lines>
 
 ## CAVEATS:
+# -with --pb_gvcf/--fa_gvcf/--mo_gvcf the three single-sample gvcfs are merged in memory while
+#  calling (denovo.trio_merge) instead of reading a bcftools-merged trio gvcf; single process only,
+#  no checkpoints
 # -SNVs only, no indels or SVs
 # -splits multiallelic sites into individual lines
 # -ignores missing genotypes ('./.') and sites without AD or DP information
@@ -20,11 +33,22 @@ Usage: gvcf_to_denovo.py -s <sample id> \
 #                <mother FORMAT field>, <mother GT information>
 '''
 import sys
+import contextlib
 from optparse import OptionParser
-import subprocess
-import gzip
-import io
 import os
+import multiprocessing
+
+from denovo.bgzf import DEFAULT_THREADS, vcf_lines
+from denovo.checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint
+from denovo.classify import snv_candidate
+from denovo.columns import ColumnProjector
+from denovo.engine import TRIO_OUTPUT_HEAD, MergedTrioCaller
+from denovo.profile import NullProfile, Profile
+from denovo.progress import Progress
+from denovo.tabix import TabixReader, split_ranges
+from denovo.trio_merge import trio_lines
+from denovo.vectorized import DEFAULT_BATCH_SIZE, Criteria, np
+from denovo.writer import DEFAULT_FLUSH_INTERVAL, OutputWriter
 
 
 
@@ -36,18 +60,34 @@ parser.add_option('-s', '--sid', dest='sample_id',help='sample id')
 parser.add_option('-f', '--faid', dest='faid', help='father id')
 parser.add_option('-m', '--moid', dest='moid', help='mother id')
 parser.add_option('-g', '--gvcf', dest='gvcf', help='trio gvcf')
+parser.add_option('--pb_gvcf', dest='pb_gvcf', help='proband gvcf, merged in memory with --fa_gvcf and --mo_gvcf (instead of -g)')
+parser.add_option('--fa_gvcf', dest='fa_gvcf', help='father gvcf (with --pb_gvcf)')
+parser.add_option('--mo_gvcf', dest='mo_gvcf', help='mother gvcf (with --pb_gvcf)')
 parser.add_option('-x', '--min_vaf', dest='pb_min_vaf',help='proband minimum variant allele frequency')
 parser.add_option('-y', '--max_alt', dest='par_max_alt',help='parent maximum alternate allele read depth')
 parser.add_option('-z', '--min_dp', dest='par_min_dp',help='parent minimum read depth')
 parser.add_option('-o', '--output', dest='output_file',help='output tab-separated variants file')
+parser.add_option('-t', '--threads', dest='threads', type='int', default=1, help='number of worker processes; >1 splits the bgzipped, tabix-indexed gvcf into genomic ranges')
+parser.add_option('-j', '--decompress_threads', dest='decompress_threads', type='int', default=DEFAULT_THREADS, help='threads inflating BGZF blocks of a bgzipped gvcf when -t is 1 (default %d)'%(DEFAULT_THREADS))
+parser.add_option('--flush_interval', dest='flush_interval', type='float', default=DEFAULT_FLUSH_INTERVAL, help='seconds (> 0) between flush + fsync of the partial output (default %d); the output is renamed into place when complete'%(DEFAULT_FLUSH_INTERVAL))
+parser.add_option('--checkpoint', dest='checkpoint', help='checkpoint file, holding the position and the partial output of the run, written every --checkpoint_interval seconds (default: no checkpoints)')
+parser.add_option('--checkpoint_interval', dest='checkpoint_interval', type='float', default=DEFAULT_CHECKPOINT_INTERVAL, help='seconds between checkpoints (default %d, 0 disables)'%(DEFAULT_CHECKPOINT_INTERVAL))
+parser.add_option('--resume', dest='resume', action='store_true', default=False, help='continue from the --checkpoint file of an interrupted run with the same arguments and input files, if any')
+parser.add_option('-b', '--batch_size', dest='batch_size', type='int', default=DEFAULT_BATCH_SIZE, help='records per batch for the vectorized (NumPy) calling criteria (default %d); 0 applies the criteria one record at a time'%(DEFAULT_BATCH_SIZE))
+parser.add_option('--profile', dest='profile', help='write per-stage wall times and counts of skipped records / alleles by reason to this JSON file at exit (with -t, stage times are summed over the worker processes)')
+parser.add_option('--profile_interval', dest='profile_interval', type='float', default=0, help='seconds between "## PROFILE" lines with the same numbers (default 0: none)')
 (options, args) = parser.parse_args()
 
 ## check all arguments present
-if (options.sample_id == None or options.gvcf == None or options.faid == None or options.moid == None  or options.pb_min_vaf == None or options.par_max_alt == None or options.par_min_dp == None):
+trio_gvcfs = [options.pb_gvcf, options.fa_gvcf, options.mo_gvcf]
+if (options.sample_id == None or (options.gvcf == None and None in trio_gvcfs) or options.faid == None or options.moid == None  or options.pb_min_vaf == None or options.par_max_alt == None or options.par_min_dp == None):
 	print('\n' + '## ERROR: missing arguments' + '\n')
 	parser.print_help()
 	print('\n')
 	sys.exit()
+if options.flush_interval <= 0:
+	print('\n' + '## ERROR: --flush_interval must be a positive number of seconds' + '\n')
+	sys.exit(1)
 
 
 sample_id = options.sample_id
@@ -58,334 +98,217 @@ pb_min_vaf = options.pb_min_vaf
 par_max_alt = options.par_max_alt
 par_min_dp = options.par_min_dp
 output_file = options.output_file
+threads = options.threads
+decompress_threads = options.decompress_threads
+flush_interval = options.flush_interval
+checkpoint_interval = options.checkpoint_interval
+batch_size = options.batch_size
+if np is None: # vectorized criteria need NumPy
+  batch_size = 0
+criteria = Criteria(pb_min_vaf, par_max_alt, par_min_dp)
+merge_trio = gvcf == None # merge the single-sample gvcfs in memory
+
+if merge_trio and threads > 1:
+  print('\n' + '## ERROR: --threads needs a merged, indexed trio gvcf (-g)' + '\n')
+  sys.exit(1)
+if merge_trio or gvcf == '-': # three inputs (or stdin): no single offset to resume from
+  checkpoint_interval = 0
+
+## stage timers and skip reason counters (no-ops unless --profile / --profile_interval)
+if options.profile != None or options.profile_interval > 0:
+  prof = Profile(options.profile, options.profile_interval)
+else:
+  prof = NullProfile()
+prof.info.update({'script': 'gvcf_to_denovo_ALT.py', 'sample_id': sample_id, 'gvcf': gvcf, 'trio_gvcfs': trio_gvcfs, 'threads': threads})
+
+####################################################################################################
+## Function that calls the records of one batch (batch_size > 0), or of one line
+## return list of output records, in input order
+####################################################################################################
+def call_pending(pending):
+  if batch_size > 0:
+    return(caller.call_batch(pending))
+  records = []
+  for tmp in pending:
+    records.extend(caller.call(tmp))
+  return(records)
 
 ####################################################################################################
-## Function that, given parent gvcf and variant information, checks if variant is present
-## if multi-line return, iterate over tabix result and compare chr:pos:ref:alt
-## return parent dp, parent altdp, parent FORMAT, parent gt
+## Function that calls the records starting in one genomic range
+## (--threads mode: runs in a worker process, each worker keeps its own open TabixReader)
+## return (number of variant lines, list of output records, profile of the range)
 ####################################################################################################
-def parse_parent(gvcf, region, chr, pos, ref, alt):
-  tabix_cmd = 'tabix -H %s'%(gvcf)
-  #tmp_head = subprocess.run(tabix_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8', text=True) # get header lines
-  tmp_head = subprocess.run(tabix_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8') # get header lines
-  tmp_cols = tmp_head.stdout.strip().split('\n')[-1].split('\t')
-
-  tmp = subprocess.run('tabix %s %s'%(gvcf, region), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').stdout
-  
-
-
-  #print('##')
-  #print('## %s'%(tabix_cmd))
-  #print('## %s'%('tabix %s %s'%(gvcf, region)))
-  #print('## %s'%(tmp))
-
-  # intialize values
-  # handles the case of empty tabix return
-  dp = 0
-  altdp = 0
-  fmt = 'NA'
-  gt = 'NA'
-  inf = 'NA'
-  
-  if len([tmp]) == 1 and (not [tmp][0] == ''): # single variant return, non-empty tabix result
-    tmpv = tmp.strip().split('\t')
-    tmp_d = dict(zip(tmp_cols, tmpv))
-    tmp_gtd = dict(zip(tmp_d['FORMAT'].split(':'), tmpv[-1].split(':'))) # dictionary of FORMAT : GT value mapping
-
-    fmt = tmp_d['FORMAT']
-    gt = tmpv[-1]
-    inf = tmp_d['INFO']
-    ## check coordinates and parse AD, DP information 
-    if ('END=' in tmp_d['INFO']): # if non-variant block, altdp = 0
-      try:
-        dp = int(tmp_gtd['DP'])
-      except:
-        dp = 0
-    elif ('AS_RAW' in tmp_d['INFO']): # if variant block
-      if ('GT' in tmp_d['FORMAT']) and ('AD' in tmp_d['FORMAT']) and ('DP' in tmp_d['FORMAT']): # check that necessary info is there
-        
-        if tmp_d['#CHROM'] == chr and tmp_d['POS'] == pos: # check that coordinates are correct
-          if alt in tmp_d['ALT'].strip(',<NON_REF>').split(','): # check that proband variant allele present among ALT in parent
-            altidx = tmp_d['ALT'].strip(',<NON_REF>').split(',').index(alt) + 1 # Get index of alternate allele
-            if tmp_d['ALT'].strip(',<NON_REF>').split(',')[altidx-1] == alt: # note: alt_idx is for parsing GT field.  For parsing ALT col, use alt_idx-1
-              if not './.' in tmp_gtd['GT']:
-                altdp = int(tmp_gtd['AD'].split(',')[altidx-1])
-                dp = int(tmp_gtd['DP'])
-                #print('# parent variant found')
-          else: # if variant allele not present, parent has effective altdp = 0
-            try: # handle missing DP cases e.g. tabix 11003-mo.g.vcf.gz chr8:144530986-144530986
-              dp = int(tmp_gtd['DP'])
-            except:
-              dp = 0
-
-  elif len(tmp) > 1 and (not tmp[0] == ''): # multiple variant return, non-empty tabix result
-    for v in tmp:
-      tmpv = v.split('\t')
-      tmp_d = dict(zip(tmp_cols, tmpv))
-      tmp_gtd = dict(zip(tmp_d['FORMAT'].split(':'), tmpv[-1].split(':'))) # dictionary of FORMAT : GT value mapping
-      
-      fmt = tmp_d['FORMAT']
-      gt = tmpv[-1]
-      inf = tmp_d['INFO']
-      ## check coordinates and parse AD, DP information 
-      if ('END=' in tmp_d['INFO']): # if non-variant block, altdp = 0
-        altdp = 0
-        try:
-          dp = int(tmp_gtd['DP'])
-        except:
-          dp = 0
-      elif ('AS_RAW' in tmp_d['INFO']): # if variant block
-        if ('GT' in tmp_d['FORMAT']) and ('AD' in tmp_d['FORMAT']) and ('DP' in tmp_d['FORMAT']): # check that necessary info is there
-
-          if tmp_d['#CHROM'] == chr and tmp_d['POS'] == pos: # check that coordinates are correct
-            if alt in tmp_d['ALT'].strip(',<NON_REF>').split(','): # check that proband variant allele present among ALT in parent
-              altidx = tmp_d['ALT'].strip(',<NON_REF>').split(',').index(alt) + 1 # Get index of alternate allele
-              if tmp_d['ALT'].strip(',<NON_REF>').split(',')[altidx-1] == alt: # note: alt_idx is for parsing GT field.  For parsing ALT col, use alt_idx-1
-                if not './.' in tmp_gtd['GT']:
-                  altdp = int(tmp_gtd['AD'].split(',')[altidx-1])
-                  dp = int(tmp_gtd['DP'])
-                  #print('# parent variant found')
-            else: # if variant allele not present, parent has effective altdp = 0
-              altdp = 0
-              try: # handle missing DP cases e.g. tabix 11003-mo.g.vcf.gz chr8:144530986-144530986
-                dp = int(tmp_gtd['DP'])
-              except:
-                dp = 0
-
-  outd = {'altdp': altdp, 'dp': dp, 'fmt': fmt, 'gt':gt, 'info': inf}
-
-  return(outd)
+worker_reader = None
+
+def call_denovo_range(region):
+  global worker_reader, prof
+  if worker_reader is None:
+    worker_reader = TabixReader(gvcf)
+  prof = Profile() if prof.enabled else NullProfile() # merged into the main process profile
+  caller.prof = prof
+
+  chr, beg, end = region
+  n = 0
+  records = []
+  pending = []
+  for line in prof.timed(worker_reader.records_starting_in(chr, beg, end)):
+    n += 1
+    if not snv_candidate(line): # reference blocks, indels, '*' alleles
+      prof.rejected(line)
+      continue
+    tmp = projector.split(line) # fixed + trio columns only
+    if tmp == None: # missing fields
+      prof.record('missing_fields')
+      continue
+    prof.count('candidates')
+    pending.append(tmp)
+    if len(pending) >= max(batch_size, 1):
+      records.extend(call_pending(pending))
+      pending = []
+  records.extend(call_pending(pending))
+  prof.enter('finish')
+  return(n, records, prof)
 
 
 
 ####################################################################################################
 ## iterate over proband gVCF and 
 ####################################################################################################
+## with --resume, continue from the checkpoint of an interrupted run with the same arguments and inputs
+## (the number of worker processes is part of the signature: it determines the ranges)
+signature = [sample_id, faid, moid, gvcf, trio_gvcfs, pb_min_vaf, par_max_alt, par_min_dp, output_file, max(threads, 1)]
+ckpt = Checkpoint(options.checkpoint, output_file, signature, [gvcf] + trio_gvcfs, checkpoint_interval)
+state = ckpt.load() if options.resume else None
+if state == None and ckpt.enabled and ckpt.exists():
+  print('## NOT RESUMING FROM CHECKPOINT %s: %s'%(ckpt.path, 'different arguments or input files' if options.resume else 'no --resume'))
+
 #bufsize=1
 #outf = open(output_file, 'w', buffering=bufsize)
-outf = open(output_file, 'w')
-
-#cmd2 = 'zcat < %s | grep -v "#"| wc -l'%(gvcf)
-cmd2 = 'cat %s | grep -v "#"| wc -l'%(gvcf)
-tot = int(subprocess.Popen(cmd2, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').communicate()[0].strip().split(' ')[0])
-print('## TOTAL VARIANT LINES: %s'%(str(tot)))
+## buffered writer thread: writes <output>.tmp, renamed to <output> by close()
+if state == None:
+  outf = OutputWriter(output_file, flush_interval)
+else:
+  print('## RESUMING FROM CHECKPOINT: %d lines processed, %d de novo variants found'%(state['lines'], state['calls']))
+  outf = OutputWriter(output_file, flush_interval, state['output_bytes'])
 
-print('')
-print('## ITERATING OVER VARIANT LINES')
-print('')
-
-head = ['id', 'chr', 'pos', 'ref', 'alt', 'refdp', 'altdp', 'dp', 'adfref', 'adfalt', 'adrref', 'adralt', 'CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT', 'S_GT', 'FA_GT', 'MO_GT']
-#print '\t'.join(head)
-outf.write('\t'.join(head) + '\n')
+#print '\t'.join(TRIO_OUTPUT_HEAD)
+if state == None:
+  outf.write_record(TRIO_OUTPUT_HEAD)
 
 i = 0
 dnct = 0
+if state != None:
+  i, dnct = state['lines'], state['calls']
 
-
-## iterate over gVCF
-
-#with gzip.open(gvcf, 'rb') as f:
-#  with io.TextIOWrapper(f, encoding='utf-8') as decodef:  
-#    for line in decodef:
-
-with open(gvcf, 'r') as f:
-  for line in f:
-    tmp = line.strip().split('\t')
-
-    ## handle vcf header information
-    if line.startswith('##'):
-      continue
+####################################################################################################
+## Function that writes the output records of de novo calls and counts them
+####################################################################################################
+def write_calls(records):
+  global dnct
+  for record in records:
+    outf.write_record(record)
+
+    dnct += 1
+
+    print('## %d de novo variants found ...'%(dnct))
+
+
+if threads > 1:
+  ## split the indexed gVCF into balanced genomic ranges, call each range in a worker process
+  ## and write the per-range results back in genomic order
+  if not os.path.exists(gvcf + '.tbi'):
+    print('## ERROR: --threads requires a bgzipped gVCF with a .tbi index')
+    outf.abort()
+    sys.exit(1)
+  reader = TabixReader(gvcf)
+  projector = ColumnProjector(reader.columns(), [sample_id, faid, moid])
+  caller = MergedTrioCaller(sample_id, faid, moid, projector.idx, criteria, prof) # copied into the workers
+  ranges = split_ranges(reader, threads * 8)
+  reader.close()
+  print('## SPLIT INTO %d RANGES OVER %d WORKERS'%(len(ranges), threads))
+  done = state['ranges'] if state != None else 0 # ranges completed before a checkpoint
+
+  print('')
+  print('## ITERATING OVER VARIANT LINES')
+  print('')
+
+  progress = Progress(len(ranges)) # ranges hold similar amounts of compressed data
+  with multiprocessing.get_context('fork').Pool(threads) as pool:
+    prof.enter('wait')
+    for r, (n, records, range_prof) in enumerate(pool.imap(call_denovo_range, ranges[done:]), done): # imap returns results in input order
+      prof.enter('write')
+      prof.merge(range_prof)
+      i += n
+      for record in records:
+        outf.write_record(record)
+        dnct += 1
+      if ckpt.due():
+        outf.checkpoint(ckpt, {'ranges': r + 1, 'lines': i, 'calls': dnct})
+      progress.position = r + 1
+      print('## %d/%d ranges processed, %d de novo variants found'%(r+1, len(ranges), dnct))
+      print(progress.report(i))
+      prof.enter('wait')
+
+else:
+  print('')
+  print('## ITERATING OVER VARIANT LINES')
+  print('')
+
+  ## iterate over gVCF (plain text, or bgzipped with BGZF blocks inflated on a thread pool);
+  ## progress and ETA come from the position in the file, no line-count pre-pass
+  progress = Progress()
+  resume = state['offset'] if state != None else None
+  pending = [] # variant lines waiting for the vectorized criteria (batch_size > 0)
+  if merge_trio: # trio records merged in memory from the proband, father and mother gvcfs
+    lines = trio_lines(trio_gvcfs[0], trio_gvcfs[1], trio_gvcfs[2], [sample_id, faid, moid], decompress_threads, progress)
+  else:
+    lines = vcf_lines(gvcf, decompress_threads, progress, resume)
+  with contextlib.closing(lines) as f:
+    for line in prof.timed(f):
+      ## checkpoint where the reader knows the exact offset of this line: all earlier lines are done
+      if progress.resume != None and ckpt.due():
+        write_calls(call_pending(pending))
+        pending = []
+        outf.checkpoint(ckpt, {'offset': progress.resume, 'lines': i, 'calls': dnct})
+
+      ## handle vcf header information
+      if line.startswith('##'):
+        continue
     
-    ## handle vcf header containing column information
-    if line.startswith('#CHROM'):
-      idx = {col:index for index, col in enumerate(tmp)}
-
-    ## handle variant lines
-    else:
-      i += 1
-      if i%100000 == 0:
-        print('## %d/%d lines processed ... '%(i, tot))
-
-
-      ## initialize values to avoid iteration bugs
-      chr, pos, ref, alt = '', '', '',''
-      region = ''
-      info = ''
-      fmt, gt = [], []
-      gtd = {}
-
-
-      ## ignore non-variant blocks 
-      if not tmp[idx['INFO']].startswith('END='):
-        
-        ## get proband variant information
-        chr, pos, ref = tmp[idx['#CHROM']], tmp[idx['POS']], tmp[idx['REF']]
-
-        # get region for tabixing parents
-        region = chr + ':' + pos + '-' + pos
-
-
-
-        ## parse alt allele
-        alt = tmp[idx['ALT']].strip(',<NON_REF>')
-
-        
-        ## how to handle multiallelic sites? e.g. chr1    1646352 .       A       C,G,<NON_REF>
-        ## iterate over all alternate alleles present in ALT
-        for a in alt.split(','):
-
-
-          if not a == '*': # ignore point deletions for now; messy when matching alleles with parents
-            #if len(ref) == 1 and len(a) == 1: # ignore indels for now;
-            if len(ref) == 1 and len(ref) == len(a):  
-
-              if len(tmp) == len(idx.keys()): # ignore lines with missing fields
-                
-                # Get index of current alternate allele
-                pb_altidx = alt.split(',').index(a) + 1
-
-                
-
-
-                
-
-
-
-
-
-
-                # save INFO field
-                info = tmp[idx['INFO']]
-
-                # create dictionary of FORMAT:GT mapping
-                fmt = tmp[idx['FORMAT']].split(':')
-                
-                '''
-                try:
-                  fmt = tmp[idx['FORMAT']].split(':')
-                except:
-                  print('')
-                  print('## ERROR - MISSING FORMAT FIELD')
-                  print(line)
-                  sys.exit()
-                '''
-
-
-                pb_gt = tmp[idx[sample_id]].split(':') ## ASSUMES THAT SAMPLE GENOTYPE INFORMATION IS IN THE LAST COLUMN; didn't use ID since column ID differs from sample id....
-                pb_gtd = dict(zip(fmt, pb_gt)) # e.g. {'GT': '0/1', 'AD': '5,7,0', 'GQ': '99', 'PL': '157,0,104,172,125,297', 'SB': '5,0,7,0', 'DP': '12'}
-
-                fa_gt = tmp[idx[faid]].split(':')
-                fa_gtd = dict(zip(fmt, fa_gt))
-
-                mo_gt = tmp[idx[moid]].split(':')
-                mo_gtd = dict(zip(fmt, mo_gt))
-
-                ## CHECK THAT ALL NECESSARY INFORMATION IS PRESENT
-                #if not (pb_gtd['GT'] == './.'): ## ignore sites with missing genotypes
-                #  if ('AD'in pb_gtd) and ('DP' in pb_gtd): # ignore sites with no AD or DP information
-                if not './.' in [pb_gtd['GT'], fa_gtd['GT'], mo_gtd['GT']]:
-                  
-                  if 'AD' in pb_gtd and 'DP' in pb_gtd and 'AD' in fa_gtd and 'DP' in fa_gtd and 'AD' in mo_gtd and 'DP' in mo_gtd:
-
-                    if len(pb_gtd['AD'].split(',')) > 1: # ensure there is alternate allele read support
-                      #if not pb_gtd['GT'] in ['0/0', '0|0']:
-                        
-                      #print(line)
-
-
-                      ## parse strand-specific allelic depth information
-                      adf = pb_gtd['F1R2']
-                      adr = pb_gtd['F2R1']
-
-                      adfref = adf.split(',')[0]
-                      adrref = adr.split(',')[0]
-
-                      adfalt = adf.split(',')[pb_altidx]
-                      adralt = adr.split(',')[pb_altidx]
-
-                      pb_refdp = pb_gtd['AD'].split(',')[0]
-                      pb_altdp = pb_gtd['AD'].split(',')[pb_altidx]
-                      if pb_altdp == '.':
-                        pb_altdp = '0'
-                      pb_dp = pb_gtd['DP']
-
-                      if int(pb_dp) > 0:
-                        pb_vaf = float(pb_altdp)/float(pb_dp)
-                      else:
-                        pb_vaf = 0.0
-
-
-                      ## parse parental information
-                      fa_dp = fa_gtd['DP']
-                      fa_refdp = fa_gtd['AD'].split(',')[0]
-
-                      if fa_gtd['AD'] == '.': # handle case where AD is just .
-                        fa_altdp = '0'
-                      else:
-                        fa_altdp = fa_gtd['AD'].split(',')[pb_altidx]
-                        if fa_altdp == '.': # handle case where AD is 10,.,3
-                          fa_altdp = '0'
-                      
-                      mo_dp = mo_gtd['DP']
-                      mo_refdp = mo_gtd['AD'].split(',')[0]
-                      #mo_altdp = mo_gtd['AD'].split(',')[pb_altidx]
-
-                      if mo_gtd['AD'] == '.': # handle case where AD is just .
-                        mo_altdp = '0'
-                      else:
-                        mo_altdp = mo_gtd['AD'].split(',')[pb_altidx]
-                        if mo_altdp == '.': # handle case where AD is 10,.,3
-                          mo_altdp = '0'
-                      
-                      '''
-                      ################################
-                      ## TESTING
-                      if chr == "chr1":
-                        if pos == "183629":
-
-                          print('')
-                          print(line)
-                          print('alt allele: %s'%(a))
-                          print('alt idx: %s'%(pb_altidx))
-                          print('pb_dp: %s'%(pb_dp))
-                          print('pb_altdp: %s'%(pb_altdp))
-                          print('fa_dp: %s'%(fa_dp))
-                          print('fa_altdp: %s'%(fa_altdp))
-                          print('mo_dp: %s'%(mo_dp))
-                          print('mo_altdp: %s'%(mo_altdp))
-                          print('')
-
-                        elif int(pos) > 183629:
-                          print(line)
-                          sys.exit()
-                      ################################
-                      '''
-                      
-
-                      ## APPLY DE NOVO CALLING CRITERIA
-                      if not (int(pb_refdp) == 0): # ignore hom alt sites
-                        if float(pb_vaf) >= float(pb_min_vaf):
-                          if int(fa_altdp) <= int(par_max_alt) and int(mo_altdp) <= int(par_max_alt):
-                            if int(fa_dp) >= int(par_min_dp) and int(mo_dp) >= int(par_min_dp):
-                              out = map(str, [sample_id, chr.strip('chr'), pos, ref, a, pb_refdp, pb_altdp, pb_dp, adfref, adfalt, adrref, adralt])
-
-                              #print '\t'.join(out) + '\t' + '\t'.join(tmp) + '\t' + tmpfa_d['FORMAT'] + '\t' + tmpfa[-1] + '\t' + tmpmo_d['FORMAT'] + '\t' + tmpmo[-1]
-                              #outf.write('\t'.join(out) + '\t' + '\t'.join(tmp) + '\t' + tmpfa_d['FORMAT'] + '\t' + tmpfa[-1] + '\t' + tmpmo_d['FORMAT'] + '\t' + tmpmo[-1] + '\n')
-                              outstring = '\t'.join(out) + '\t' + '\t'.join(tmp[:idx['FORMAT']+1]) + '\t' + ':'.join(pb_gt) + '\t' +  ':'.join(fa_gt) + '\t' + ':'.join(mo_gt)
-                              #print(outstring)
-                              outf.write(outstring + '\n')
-                              # deal with empty output?
-                              outf.flush()
-                              os.fsync(outf)
-
-                              dnct += 1
-
-                              print('## %d de novo variants found ...'%(dnct))
-
-
-
-
-
+      ## handle vcf header containing column information
+      ## (records are projected onto the fixed and trio columns, the caller indexes the projection)
+      if line.startswith('#CHROM'):
+        projector = ColumnProjector(line.strip().split('\t'), [sample_id, faid, moid])
+        caller = MergedTrioCaller(sample_id, faid, moid, projector.idx, criteria, prof)
+
+      ## handle variant lines
+      else:
+        i += 1
+        if i%100000 == 0:
+          print(progress.report(i))
+
+        ## reference blocks, indels and '*' alleles are rejected on the raw line, before splitting
+        ## it into (per-sample) columns
+        if not snv_candidate(line):
+          prof.rejected(line)
+          continue
+
+        ## on wide (cohort) lines only the fixed and trio sample columns are sliced out
+        tmp = projector.split(line)
+        if tmp == None: # missing fields
+          prof.record('missing_fields')
+          continue
+        prof.count('candidates')
+        pending.append(tmp)
+        if len(pending) >= max(batch_size, 1):
+          write_calls(call_pending(pending))
+          pending = []
+
+  write_calls(call_pending(pending))
+
+
+prof.enter('finish')
 outf.close()
+ckpt.remove()
 
 
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+## Purpose: call de novos for every child of a cohort, one pass over each family's gVCFs
+'''
+Usage: gvcf_to_denovo_cohort.py -m <sample map (picard): id <tab> gvcf path> \
+                                -r <relations in pedigree format> \
+                                -x <proband min vaf> \
+                                -y <parent max altdp> \
+                                -z <parent min dp> \
+                                -o <output filename suffix, output is <child id><suffix>> \
+                                --families <fid1,fid2,...> \
+                                --region <chr[:beg-end]> | --contigs <chr1,chr2,...> \
+                                -j <threads inflating bgzipped child gvcfs> \
+                                --site_cache <parsed parent sites kept> \
+                                --flush_interval <seconds between flushes of the partial outputs>
+
+Children are grouped by parent pair (e.g. proband and sibling of a quad).  For each family the
+gVCFs of all children are read together, merged by position, and both parent gVCFs are streamed
+once, in step with the merged children; each parent site is fetched and parsed once (SiteCache)
+and serves every child.
+The output of each child is identical to that of gvcf_to_denovo_v4.py run on that child alone.
+
+## CAVEATS:
+# -assumes parent gvcfs are tabix indexed and .tbi files are present in same directory as gvcf
+# -child gvcfs need ##contig header lines (their order is the merge order); with --region/--contigs
+#  they must be bgzipped and tabix indexed
+# -SNVs only, no indels or SVs
+# -no checkpoints: an interrupted family is called again from the start
+
+# Output format: as gvcf_to_denovo_v4.py, one file per child
+'''
+import sys
+from optparse import OptionParser
+import os
+
+from denovo.backends import open_parents
+from denovo.bgzf import DEFAULT_THREADS
+from denovo.classify import snv_candidate
+from denovo.cohort import read_families, sibling_records
+from denovo.engine import OUTPUT_HEAD, GVCFTrioCaller
+from denovo.evidence import DEFAULT_SITE_CACHE, SiteCache
+from denovo.proband import proband_lines
+from denovo.progress import Progress
+from denovo.vectorized import Criteria
+from denovo.writer import DEFAULT_FLUSH_INTERVAL, OutputWriter
+
+####################################################################################################
+## handle arguments
+####################################################################################################
+parser = OptionParser()
+parser.add_option('-m', '--smap', dest='sample_map',help='sample map (picard)')
+parser.add_option('-r', '--ped', dest='ped', help='ped file')
+parser.add_option('-x', '--min_vaf', dest='pb_min_vaf',help='proband minimum variant allele frequency')
+parser.add_option('-y', '--max_alt', dest='par_max_alt',help='parent maximum alternate allele read depth')
+parser.add_option('-z', '--min_dp', dest='par_min_dp',help='parent minimum read depth')
+parser.add_option('-o', '--output_suffix', dest='output_suffix', default='.denovo.txt', help='output filename suffix; one tab-separated variants file <child id><suffix> per child (default .denovo.txt)')
+parser.add_option('--families', dest='families', help='comma-separated family ids (first ped column) to call; default all families')
+parser.add_option('--region', dest='region', help='only call child records starting in this region, chr[:beg-end] (bgzipped + indexed child gvcfs)')
+parser.add_option('--contigs', dest='contigs', help='comma-separated contigs to call (bgzipped + indexed child gvcfs)')
+parser.add_option('-j', '--decompress_threads', dest='decompress_threads', type='int', default=DEFAULT_THREADS, help='threads inflating BGZF blocks of each bgzipped child gvcf (default %d)'%(DEFAULT_THREADS))
+parser.add_option('--site_cache', dest='site_cache', type='int', default=DEFAULT_SITE_CACHE, help='parsed parent sites kept, shared by the children of a family and the alleles of multiallelic sites (default %d, 0 disables)'%(DEFAULT_SITE_CACHE))
+parser.add_option('--flush_interval', dest='flush_interval', type='float', default=DEFAULT_FLUSH_INTERVAL, help='seconds (> 0) between flush + fsync of the partial outputs (default %d); outputs are renamed into place when complete'%(DEFAULT_FLUSH_INTERVAL))
+(options, args) = parser.parse_args()
+
+## check all arguments present
+if (options.sample_map == None or options.ped == None or options.pb_min_vaf == None or options.par_max_alt == None or options.par_min_dp == None):
+	print('\n' + '## ERROR: missing arguments' + '\n')
+	parser.print_help()
+	print('\n')
+	sys.exit()
+if options.flush_interval <= 0:
+	print('\n' + '## ERROR: --flush_interval must be a positive number of seconds' + '\n')
+	sys.exit(1)
+
+
+sample_map = options.sample_map
+ped = options.ped
+criteria = Criteria(options.pb_min_vaf, options.par_max_alt, options.par_min_dp)
+output_suffix = options.output_suffix
+decompress_threads = options.decompress_threads
+flush_interval = options.flush_interval
+region = options.region
+contigs = options.contigs.split(',') if options.contigs != None else None
+fids = options.families.split(',') if options.families != None else None
+site_cache = SiteCache(options.site_cache) # keyed by parent gVCF: one cache for all families
+
+if region != None and contigs != None:
+  print('\n' + '## ERROR: use either --region or --contigs, not both' + '\n')
+  sys.exit(1)
+
+####################################################################################################
+## read pedigree file and sample map, group children by parent pair
+####################################################################################################
+print('')
+print('## READING PEDIGREE FILE AND SAMPLE MAP')
+print('')
+families = read_families(ped, sample_map, fids)
+print('## %d FAMILIES, %d CHILDREN'%(len(families), sum(len(fam.children) for fam in families)))
+
+####################################################################################################
+## call de novos for all children of one family in a single pass
+####################################################################################################
+def call_family(fam):
+  print('')
+  print('## FAMILY %s: FATHER %s, MOTHER %s, CHILDREN %s'%(fam.fid, fam.fa, fam.mo, ','.join(fam.children)))
+  print('## FATHER: %s'%(fam.paths[fam.fa]))
+  print('## MOTHER: %s'%(fam.paths[fam.mo]))
+  for sid in fam.children:
+    print('## CHILD %s: %s'%(sid, fam.paths[sid]))
+    if (region != None or contigs != None) and not os.path.exists(fam.paths[sid] + '.tbi'):
+      print('## ERROR: --region/--contigs require bgzipped child gvcfs with a local .tbi')
+      sys.exit(1)
+
+  outfs = [OutputWriter(sid + output_suffix, flush_interval) for sid in fam.children]
+  for outf in outfs:
+    outf.write_record(OUTPUT_HEAD)
+
+  ## each parent gVCF is opened once and read sequentially, in step with the merged children
+  fa, mo = open_parents('stream', fam.paths[fam.fa], fam.paths[fam.mo], cache=site_cache)
+  callers = [None for sid in fam.children] # one caller per child, over the shared parent streams
+
+  progress = [Progress() for sid in fam.children]
+  total = Progress()
+  lines = [proband_lines(fam.paths[sid], region, contigs, decompress_threads, progress[k]) for k, sid in enumerate(fam.children)]
+  i = 0
+  n = [0 for sid in fam.children]
+  dnct = [0 for sid in fam.children]
+  try:
+    for k, idx, line in sibling_records(lines):
+      i += 1
+      n[k] += 1
+      if i%100000 == 0:
+        total.size = sum(p.size or 0 for p in progress)
+        total.position = sum(p.position for p in progress)
+        print(total.report(i))
+
+      ## reference blocks, indels and '*' alleles are rejected on the raw line, before splitting it
+      if not snv_candidate(line):
+        continue
+
+      if callers[k] == None or callers[k].idx is not idx:
+        callers[k] = GVCFTrioCaller(fam.children[k], idx, fa, mo, criteria)
+      for record in callers[k].call(line.strip().split('\t')):
+        outfs[k].write_record(record)
+        dnct[k] += 1
+  except:
+    for outf in outfs:
+      outf.abort()
+    raise
+  finally:
+    for f in lines:
+      f.close()
+    fa.close()
+    mo.close()
+
+  for k, sid in enumerate(fam.children):
+    outfs[k].close()
+    print('## CHILD %s: %d lines processed, %d de novo variants found'%(sid, n[k], dnct[k]))
+
+
+for fam in families:
+  call_family(fam)
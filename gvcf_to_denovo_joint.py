@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+## Purpose: call de novos for every trio of a joint-called VCF in one pass
+'''
+Usage: gvcf_to_denovo_joint.py -g <joint-called VCF / gVCF: plain or bgzipped> \
+                               -r <relations in pedigree format> \
+                               -x <proband min vaf> \
+                               -y <parent max altdp> \
+                               -z <parent min dp> \
+                               -o <combined output filename> \
+                               --per_trio_suffix <also write one file <child id><suffix> per trio> \
+                               --families <fid1,fid2,...> \
+                               -j <threads inflating a bgzipped VCF> \
+                               --flush_interval <seconds between flushes of the partial output>
+
+Every child of the pedigree whose father and mother are also columns of the VCF is called.  Each
+record is read and split once; the GT / AD / DP of the sample columns used by the trios are parsed
+once and the calling criteria are applied to all trios together (denovo.joint).  The calls of a
+trio are identical to those of gvcf_to_denovo_ALT.py -s <child> -f <father> -m <mother> -g <VCF>.
+
+## CAVEATS:
+# -SNVs only, no indels or SVs
+# -splits multiallelic sites into individual lines
+# -ignores missing genotypes ('./.') and sites without AD or DP information
+# -no checkpoints: an interrupted run is called again from the start
+
+# Output format: as gvcf_to_denovo_ALT.py; the combined output holds the calls of all trios, in VCF
+# order (first column: child id)
+'''
+import sys
+import contextlib
+from optparse import OptionParser
+
+from denovo.bgzf import DEFAULT_THREADS, vcf_lines
+from denovo.classify import snv_candidate
+from denovo.engine import TRIO_OUTPUT_HEAD
+from denovo.joint import JointTrios, read_trios, split_calls
+from denovo.progress import Progress
+from denovo.vectorized import Criteria
+from denovo.writer import DEFAULT_FLUSH_INTERVAL, OutputWriter
+
+####################################################################################################
+## handle arguments
+####################################################################################################
+parser = OptionParser()
+parser.add_option('-g', '--gvcf', dest='gvcf', help='joint-called multi-sample vcf / gvcf')
+parser.add_option('-r', '--ped', dest='ped', help='ped file')
+parser.add_option('-x', '--min_vaf', dest='pb_min_vaf',help='proband minimum variant allele frequency')
+parser.add_option('-y', '--max_alt', dest='par_max_alt',help='parent maximum alternate allele read depth')
+parser.add_option('-z', '--min_dp', dest='par_min_dp',help='parent minimum read depth')
+parser.add_option('-o', '--output', dest='output_file',help='combined output tab-separated variants file (all trios)')
+parser.add_option('--per_trio_suffix', dest='per_trio_suffix', help='also split the combined output into one file <child id><suffix> per trio')
+parser.add_option('--families', dest='families', help='comma-separated family ids (first ped column) to call; default all families')
+parser.add_option('-j', '--decompress_threads', dest='decompress_threads', type='int', default=DEFAULT_THREADS, help='threads inflating BGZF blocks of a bgzipped vcf (default %d)'%(DEFAULT_THREADS))
+parser.add_option('--flush_interval', dest='flush_interval', type='float', default=DEFAULT_FLUSH_INTERVAL, help='seconds (> 0) between flush + fsync of the partial output (default %d); outputs are renamed into place when complete'%(DEFAULT_FLUSH_INTERVAL))
+(options, args) = parser.parse_args()
+
+## check all arguments present
+if (options.gvcf == None or options.ped == None or options.output_file == None or options.pb_min_vaf == None or options.par_max_alt == None or options.par_min_dp == None):
+	print('\n' + '## ERROR: missing arguments' + '\n')
+	parser.print_help()
+	print('\n')
+	sys.exit()
+if options.flush_interval <= 0:
+	print('\n' + '## ERROR: --flush_interval must be a positive number of seconds' + '\n')
+	sys.exit(1)
+
+
+gvcf = options.gvcf
+ped = options.ped
+criteria = Criteria(options.pb_min_vaf, options.par_max_alt, options.par_min_dp)
+output_file = options.output_file
+per_trio_suffix = options.per_trio_suffix
+decompress_threads = options.decompress_threads
+flush_interval = options.flush_interval
+fids = options.families.split(',') if options.families != None else None
+
+####################################################################################################
+## iterate over the joint VCF once, calling every trio on each record
+####################################################################################################
+outf = OutputWriter(output_file, flush_interval)
+outf.write_record(TRIO_OUTPUT_HEAD)
+
+progress = Progress()
+joint = None
+i = 0
+dnct = None
+try:
+  with contextlib.closing(vcf_lines(gvcf, decompress_threads, progress)) as f:
+    for line in f:
+      ## handle vcf header information
+      if line.startswith('##'):
+        continue
+
+      ## handle vcf header containing column information: trios of the pedigree with all three columns
+      if line.startswith('#CHROM'):
+        idx = {col:index for index, col in enumerate(line.strip().split('\t'))}
+        trios, skipped = read_trios(ped, idx, fids)
+        for sid in skipped:
+          print('## SKIPPING %s: child or parent not in the VCF'%(sid))
+        print('')
+        print('## CALLING %d TRIOS'%(len(trios)))
+        print('')
+        joint = JointTrios(trios, idx, criteria)
+        dnct = [0 for trio in trios]
+        continue
+
+      i += 1
+      if i%100000 == 0:
+        print(progress.report(i))
+
+      ## reference blocks, indels and '*' alleles are rejected on the raw line, before splitting it
+      if not snv_candidate(line):
+        continue
+
+      for t, record in joint.call(line.strip().split('\t')):
+        outf.write_record(record)
+        dnct[t] += 1
+except:
+  outf.abort()
+  raise
+outf.close()
+
+for t, (sid, faid, moid) in enumerate(joint.trios):
+  print('## TRIO %s (FATHER %s, MOTHER %s): %d de novo variants found'%(sid, faid, moid, dnct[t]))
+print('## %d lines processed, %d de novo variants found'%(i, sum(dnct)))
+
+if per_trio_suffix != None:
+  print('')
+  print('## WRITING ONE OUTPUT PER TRIO')
+  split_calls(output_file, joint.trios, per_trio_suffix, flush_interval)
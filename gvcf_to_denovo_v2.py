@@ -29,6 +29,8 @@ import os
 import gzip
 import io
 
+from denovo.progress import Progress
+
 ####################################################################################################
 ## handle arguments
 ####################################################################################################
@@ -204,10 +206,8 @@ if pedd[sample_id]['fa'] == '0' or pedd[sample_id]['mo'] == '0':
 
 
 
-cmd2 = 'zcat < %s | grep -v "#"| wc -l'%(sample_gvcf)
-#tot = int(subprocess.check_output(cmd2, shell=True, encoding='utf8').strip().split(' ')[0])
-tot = int(subprocess.Popen(cmd2, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').communicate()[0].strip().split(' ')[0])
-print('## TOTAL VARIANT LINES: %s'%(str(tot)))
+## progress / ETA from the compressed byte offset in the proband gVCF (no zcat line-count pre-pass)
+progress = Progress(os.path.getsize(sample_gvcf))
 
 
 print('')
@@ -248,7 +248,8 @@ with gzip.open(sample_gvcf, 'rb') as f:
       else:
         i += 1
         if i%1000 == 0:
-          print('## %d/%d lines processed ... '%(i, tot))
+          progress.position = f.fileobj.tell() # position in the compressed file
+          print(progress.report(i))
 
 
         ## initialize values to avoid iteration bugs
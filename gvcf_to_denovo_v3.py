@@ -29,6 +29,8 @@ import os
 import gzip
 import io
 
+from denovo.progress import Progress
+
 ####################################################################################################
 ## handle arguments
 ####################################################################################################
@@ -204,10 +206,8 @@ if pedd[sample_id]['fa'] == '0' or pedd[sample_id]['mo'] == '0':
 
 
 
-cmd2 = 'cat %s | grep -v "#"| wc -l'%(sample_gvcf)
-#tot = int(subprocess.check_output(cmd2, shell=True, encoding='utf8').strip().split(' ')[0])
-tot = int(subprocess.Popen(cmd2, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').communicate()[0].strip().split(' ')[0])
-print('## TOTAL VARIANT LINES: %s'%(str(tot)))
+## progress / ETA from the byte offset in the proband gVCF (no line-count pre-pass)
+progress = Progress(os.path.getsize(sample_gvcf))
 
 
 print('')
@@ -226,7 +226,7 @@ dnct = 0
 #  with io.TextIOWrapper(f, encoding='utf-8') as decodef:  
 #    for line in decodef:
 
-with open(sample_gvcf, 'r') as f:
+with open(sample_gvcf, 'rb') as rawf, io.TextIOWrapper(rawf, encoding='utf-8') as f:
 
   for line in f:
     #print(line)
@@ -245,7 +245,8 @@ with open(sample_gvcf, 'r') as f:
     else:
       i += 1
       if i%1000 == 0:
-        print('## %d/%d lines processed ... '%(i, tot))
+        progress.position = rawf.tell() # bytes read from the file (read-ahead included)
+        print(progress.report(i))
 
 
       ## initialize values to avoid iteration bugs
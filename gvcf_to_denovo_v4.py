@@ -2,17 +2,30 @@
 ## Purpose: call de novos from a single sample gVCF
 '''
 Usage: gvcf_to_denovo.py -s <sample id> \
-                         -p <proband gvcf> \
+                         -p <proband gvcf: plain, bgzipped or - for stdin> \
                          -f <father gvcf> \
                          -m <mother gvcf> \
                          -r <relations in pedigree format>
                          -x <proband min altdp> \
                          -y <parent max altdp> \
                          =z <parent min dp> \
-                         -o <output filename> 
+                         -o <output filename> \
+                         -e <parent lookup engine: auto (default), stream, regions, interval, index or tabix> \
+                         --plan <chr=stream|random,...: lookup mode of some contigs with -e auto> \
+                         --region <chr[:beg-end]> | --contigs <chr1,chr2,...> \
+                         -j <threads inflating a bgzipped proband gvcf> \
+                         --site_cache <parsed parent sites kept, 0 to disable> \
+                         --flush_interval <seconds between flushes of the partial output> \
+                         --checkpoint <checkpoint file, written periodically> \
+                         --checkpoint_interval <seconds between checkpoints> \
+                         --resume <continue from the checkpoint file of an interrupted run> \
+                         --profile <JSON report of per-stage times and skip reason counts> \
+                         --profile_interval <seconds between '## PROFILE' progress lines>
 
 ## CAVEATS:
 # -assumes parent gvcfs are tabix indexed and .tbi files are present in same directory as gvcf
+# -with --region/--contigs the proband gvcf must be bgzipped and tabix indexed as well; only the
+#  records of those contigs (or starting inside that region) are read, seeking through the index
 # -SNVs only, no indels or SVs
 # -splits multiallelic sites into individual lines
 # -ignores missing genotypes ('./.') and sites without AD or DP information
@@ -23,11 +36,22 @@ Usage: gvcf_to_denovo.py -s <sample id> \
 #                <mother FORMAT field>, <mother GT information>
 '''
 import sys
+import contextlib
 from optparse import OptionParser
-import subprocess
 import os
-import gzip
-import io
+
+from denovo.backends import BACKENDS, LOCAL_INDEX_BACKENDS, open_parents
+from denovo.bgzf import DEFAULT_THREADS
+from denovo.checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint
+from denovo.classify import snv_candidate
+from denovo.engine import OUTPUT_HEAD, GVCFTrioCaller
+from denovo.evidence import DEFAULT_SITE_CACHE, SiteCache
+from denovo.proband import proband_lines
+from denovo.profile import NullProfile, Profile
+from denovo.planner import describe, parse_overrides, plan_contigs
+from denovo.progress import Progress
+from denovo.vectorized import Criteria
+from denovo.writer import DEFAULT_FLUSH_INTERVAL, OutputWriter
 
 ####################################################################################################
 ## handle arguments
@@ -42,6 +66,18 @@ parser.add_option('-x', '--min_vaf', dest='pb_min_vaf',help='proband minimum var
 parser.add_option('-y', '--max_alt', dest='par_max_alt',help='parent maximum alternate allele read depth')
 parser.add_option('-z', '--min_dp', dest='par_min_dp',help='parent minimum read depth')
 parser.add_option('-o', '--output', dest='output_file',help='output tab-separated variants file')
+parser.add_option('-e', '--engine', dest='engine', type='choice', choices=BACKENDS, default='auto', help='parent lookup engine: auto (stream or random access per contig, from the proband candidate density; default), stream (read parent gVCFs in step with the proband), regions (one batched tabix -R query per parent for all candidate sites), interval (per-contig interval index, binary search per site), index (in-process .tbi region query per site) or tabix (one tabix subprocess per site, e.g. for remote gVCFs)')
+parser.add_option('--plan', dest='plan', help='with -e auto, comma-separated chr=stream|random forcing the parent lookup mode of those contigs (the others are planned)')
+parser.add_option('--region', dest='region', help='only call proband records starting in this region, chr[:beg-end] (bgzipped + indexed proband gvcf)')
+parser.add_option('--contigs', dest='contigs', help='comma-separated contigs to call (bgzipped + indexed proband gvcf)')
+parser.add_option('-j', '--decompress_threads', dest='decompress_threads', type='int', default=DEFAULT_THREADS, help='threads inflating BGZF blocks of a bgzipped proband gvcf (default %d)'%(DEFAULT_THREADS))
+parser.add_option('--site_cache', dest='site_cache', type='int', default=DEFAULT_SITE_CACHE, help='parsed parent sites kept, so that the alleles of a multiallelic site fetch and parse each parent once (default %d, 0 disables)'%(DEFAULT_SITE_CACHE))
+parser.add_option('--flush_interval', dest='flush_interval', type='float', default=DEFAULT_FLUSH_INTERVAL, help='seconds (> 0) between flush + fsync of the partial output (default %d); the output is renamed into place when complete'%(DEFAULT_FLUSH_INTERVAL))
+parser.add_option('--checkpoint', dest='checkpoint', help='checkpoint file, holding the position and the partial output of the run, written every --checkpoint_interval seconds (default: no checkpoints)')
+parser.add_option('--checkpoint_interval', dest='checkpoint_interval', type='float', default=DEFAULT_CHECKPOINT_INTERVAL, help='seconds between checkpoints (default %d, 0 disables)'%(DEFAULT_CHECKPOINT_INTERVAL))
+parser.add_option('--resume', dest='resume', action='store_true', default=False, help='continue from the --checkpoint file of an interrupted run with the same arguments and input files, if any')
+parser.add_option('--profile', dest='profile', help='write per-stage wall times and counts of skipped records / alleles by reason to this JSON file at exit')
+parser.add_option('--profile_interval', dest='profile_interval', type='float', default=0, help='seconds between "## PROFILE" lines with the same numbers (default 0: none)')
 (options, args) = parser.parse_args()
 
 ## check all arguments present
@@ -50,6 +86,9 @@ if (options.sample_id == None or options.sample_gvcf == None or options.fa_gvcf
 	parser.print_help()
 	print('\n')
 	sys.exit()
+if options.flush_interval <= 0:
+	print('\n' + '## ERROR: --flush_interval must be a positive number of seconds' + '\n')
+	sys.exit(1)
 
 
 sample_id = options.sample_id
@@ -61,103 +100,30 @@ pb_min_vaf = options.pb_min_vaf
 par_max_alt = options.par_max_alt
 par_min_dp = options.par_min_dp
 output_file = options.output_file
-
-####################################################################################################
-## Function that, given parent gvcf and variant information, checks if variant is present
-## if multi-line return, iterate over tabix result and compare chr:pos:ref:alt
-## return parent dp, parent altdp, parent FORMAT, parent gt
-####################################################################################################
-def parse_parent(gvcf, region, chr, pos, ref, alt):
-  tabix_cmd = 'tabix -H %s'%(gvcf)
-  #tmp_head = subprocess.run(tabix_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8', text=True) # get header lines
-  tmp_head = subprocess.run(tabix_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8') # get header lines
-  tmp_cols = tmp_head.stdout.strip().split('\n')[-1].split('\t')
-
-  tmp = subprocess.run('tabix %s %s'%(gvcf, region), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').stdout
-  
-
-
-  #print('##')
-  #print('## %s'%(tabix_cmd))
-  #print('## %s'%('tabix %s %s'%(gvcf, region)))
-  #print('## %s'%(tmp))
-
-  # intialize values
-  # handles the case of empty tabix return
-  dp = 0
-  altdp = 0
-  fmt = 'NA'
-  gt = 'NA'
-  inf = 'NA'
-  
-  if len([tmp]) == 1 and (not [tmp][0] == ''): # single variant return, non-empty tabix result
-    tmpv = tmp.strip().split('\t')
-    tmp_d = dict(zip(tmp_cols, tmpv))
-    tmp_gtd = dict(zip(tmp_d['FORMAT'].split(':'), tmpv[-1].split(':'))) # dictionary of FORMAT : GT value mapping
-
-    fmt = tmp_d['FORMAT']
-    gt = tmpv[-1]
-    inf = tmp_d['INFO']
-    ## check coordinates and parse AD, DP information 
-    if ('END=' in tmp_d['INFO']): # if non-variant block, altdp = 0
-      try:
-        dp = int(tmp_gtd['DP'])
-      except:
-        dp = 0
-    elif ('AS_RAW' in tmp_d['INFO']): # if variant block
-      if ('GT' in tmp_d['FORMAT']) and ('AD' in tmp_d['FORMAT']) and ('DP' in tmp_d['FORMAT']): # check that necessary info is there
-        
-        if tmp_d['#CHROM'] == chr and tmp_d['POS'] == pos: # check that coordinates are correct
-          if alt in tmp_d['ALT'].strip(',<NON_REF>').split(','): # check that proband variant allele present among ALT in parent
-            altidx = tmp_d['ALT'].strip(',<NON_REF>').split(',').index(alt) + 1 # Get index of alternate allele
-            if tmp_d['ALT'].strip(',<NON_REF>').split(',')[altidx-1] == alt: # note: alt_idx is for parsing GT field.  For parsing ALT col, use alt_idx-1
-              if not './.' in tmp_gtd['GT']:
-                altdp = int(tmp_gtd['AD'].split(',')[altidx-1])
-                dp = int(tmp_gtd['DP'])
-                print('# parent variant found')
-          else: # if variant allele not present, parent has effective altdp = 0
-            try: # handle missing DP cases e.g. tabix 11003-mo.g.vcf.gz chr8:144530986-144530986
-              dp = int(tmp_gtd['DP'])
-            except:
-              dp = 0
-
-  elif len(tmp) > 1 and (not tmp[0] == ''): # multiple variant return, non-empty tabix result
-    for v in tmp:
-      tmpv = v.split('\t')
-      tmp_d = dict(zip(tmp_cols, tmpv))
-      tmp_gtd = dict(zip(tmp_d['FORMAT'].split(':'), tmpv[-1].split(':'))) # dictionary of FORMAT : GT value mapping
-      
-      fmt = tmp_d['FORMAT']
-      gt = tmpv[-1]
-      inf = tmp_d['INFO']
-      ## check coordinates and parse AD, DP information 
-      if ('END=' in tmp_d['INFO']): # if non-variant block, altdp = 0
-        altdp = 0
-        try:
-          dp = int(tmp_gtd['DP'])
-        except:
-          dp = 0
-      elif ('AS_RAW' in tmp_d['INFO']): # if variant block
-        if ('GT' in tmp_d['FORMAT']) and ('AD' in tmp_d['FORMAT']) and ('DP' in tmp_d['FORMAT']): # check that necessary info is there
-
-          if tmp_d['#CHROM'] == chr and tmp_d['POS'] == pos: # check that coordinates are correct
-            if alt in tmp_d['ALT'].strip(',<NON_REF>').split(','): # check that proband variant allele present among ALT in parent
-              altidx = tmp_d['ALT'].strip(',<NON_REF>').split(',').index(alt) + 1 # Get index of alternate allele
-              if tmp_d['ALT'].strip(',<NON_REF>').split(',')[altidx-1] == alt: # note: alt_idx is for parsing GT field.  For parsing ALT col, use alt_idx-1
-                if not './.' in tmp_gtd['GT']:
-                  altdp = int(tmp_gtd['AD'].split(',')[altidx-1])
-                  dp = int(tmp_gtd['DP'])
-                  print('# parent variant found')
-            else: # if variant allele not present, parent has effective altdp = 0
-              altdp = 0
-              try: # handle missing DP cases e.g. tabix 11003-mo.g.vcf.gz chr8:144530986-144530986
-                dp = int(tmp_gtd['DP'])
-              except:
-                dp = 0
-
-  outd = {'altdp': altdp, 'dp': dp, 'fmt': fmt, 'gt':gt, 'info': inf}
-
-  return(outd)
+engine = options.engine
+decompress_threads = options.decompress_threads
+flush_interval = options.flush_interval
+checkpoint_interval = options.checkpoint_interval
+region = options.region
+contigs = options.contigs.split(',') if options.contigs != None else None
+criteria = Criteria(pb_min_vaf, par_max_alt, par_min_dp)
+
+## stage timers and skip reason counters (no-ops unless --profile / --profile_interval)
+if options.profile != None or options.profile_interval > 0:
+  prof = Profile(options.profile, options.profile_interval)
+else:
+  prof = NullProfile()
+prof.info.update({'script': 'gvcf_to_denovo_v4.py', 'sample_id': sample_id, 'proband_gvcf': sample_gvcf, 'engine': engine, 'region': region, 'contigs': contigs})
+
+if region != None and contigs != None:
+  print('\n' + '## ERROR: use either --region or --contigs, not both' + '\n')
+  sys.exit(1)
+if options.plan != None and engine != 'auto':
+  print('\n' + '## ERROR: --plan applies to engine "auto" only' + '\n')
+  sys.exit(1)
+if (region != None or contigs != None) and not os.path.exists(sample_gvcf + '.tbi'):
+  print('\n' + '## ERROR: --region/--contigs require a bgzipped proband gvcf with a local .tbi' + '\n')
+  sys.exit(1)
 
 ####################################################################################################
 ## read pedigree file and create dictionaary
@@ -184,10 +150,27 @@ print('## GVCF PATHS:')
 print('## PROBAND: %s'%(sample_gvcf))
 print('## FATHER: %s'%(fa_gvcf))
 print('## MOTHER: %s'%(mo_gvcf))
+print('## PARENT LOOKUP ENGINE: %s'%(engine))
+if region != None:
+  print('## PROBAND REGION: %s'%(region))
+if contigs != None:
+  print('## PROBAND CONTIGS: %s'%(','.join(contigs)))
+
+## with --resume, continue from the checkpoint of an interrupted run with the same arguments and inputs
+signature = [sample_id, sample_gvcf, fa_gvcf, mo_gvcf, ped, pb_min_vaf, par_max_alt, par_min_dp, output_file, region, contigs]
+ckpt = Checkpoint(options.checkpoint, output_file, signature, [sample_gvcf, fa_gvcf, mo_gvcf, ped], checkpoint_interval if sample_gvcf != '-' else 0)
+state = ckpt.load() if options.resume else None
+if state == None and ckpt.enabled and ckpt.exists():
+  print('## NOT RESUMING FROM CHECKPOINT %s: %s'%(ckpt.path, 'different arguments or input files' if options.resume else 'no --resume'))
 
 #bufsize=1
 #outf = open(output_file, 'w', buffering=bufsize)
-outf = open(output_file, 'w')
+## buffered writer thread: writes <output>.tmp, renamed to <output> by close()
+if state == None:
+  outf = OutputWriter(output_file, flush_interval)
+else:
+  print('## RESUMING FROM CHECKPOINT: %d lines processed, %d de novo variants found'%(state['lines'], state['calls']))
+  outf = OutputWriter(output_file, flush_interval, state['output_bytes'])
 
 ##
 ## IF NOT PROBAND OR SIBLING, WRITE ERROR MESSAGE AND EXIT
@@ -204,34 +187,67 @@ if pedd[sample_id]['fa'] == '0' or pedd[sample_id]['mo'] == '0':
 
 
 
-cmd2 = 'cat %s | grep -v "#"| wc -l'%(sample_gvcf)
-#tot = int(subprocess.check_output(cmd2, shell=True, encoding='utf8').strip().split(' ')[0])
-tot = int(subprocess.Popen(cmd2, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8').communicate()[0].strip().split(' ')[0])
-print('## TOTAL VARIANT LINES: %s'%(str(tot)))
-
-
 print('')
 print('## ITERATING OVER VARIANT LINES')
 print('')
 
-head = ['id', 'chr', 'pos', 'ref', 'alt', 'refdp', 'altdp', 'dp', 'adfref', 'adfalt', 'adrref', 'adralt', 'CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT', 'S_GT', 'FA_FORMAT', 'FA_GT', 'MO_FORMAT', 'MO_GT']
-#print '\t'.join(head)
-outf.write('\t'.join(head) + '\n')
+#print '\t'.join(OUTPUT_HEAD)
+if state == None:
+  outf.write_record(OUTPUT_HEAD)
 
 i = 0
 dnct = 0
+resume = None
+if state != None:
+  i, dnct = state['lines'], state['calls']
+  resume = (state['target'], state['offset'])
+
+## open each parent gVCF once: cached header columns + in-process tabix reader when the .tbi is local
+if engine in LOCAL_INDEX_BACKENDS and not (os.path.exists(fa_gvcf + '.tbi') and os.path.exists(mo_gvcf + '.tbi')):
+  print('## ERROR: engine "%s" requires local .tbi files for both parent gVCFs'%(engine))
+  outf.abort()
+  sys.exit(1)
+if engine == 'regions' and sample_gvcf == '-':
+  print('## ERROR: engine "regions" reads the proband twice and cannot read it from stdin')
+  outf.abort()
+  sys.exit(1)
+## auto: stream or random access per contig, priced from the candidate density sampled through
+## the proband index (every contig streamed without one)
+plan = None
+if engine == 'auto':
+  plan = parse_overrides(options.plan)
+  if sample_gvcf != '-' and os.path.exists(sample_gvcf + '.tbi'):
+    for d in plan_contigs(sample_gvcf, fa_gvcf, mo_gvcf, region, contigs, plan):
+      print(describe(d))
+      plan[d['contig']] = d['mode']
+  else:
+    print('## PLAN: no local index for the proband gVCF, streaming all contigs not set by --plan')
+  prof.info['plan'] = plan
+if engine == 'regions':
+  print('## QUERYING PARENTS FOR ALL CANDIDATE SITES')
+  prof.enter('parent')
+if engine == 'interval' and sample_gvcf != '-':
+  print('## COLLECTING CANDIDATE SITES (PARENT DEPTHS RESOLVED PER CONTIG IN ONE BATCH)')
+  prof.enter('parent')
+## parent evidence backends: all engines answer evidence(site, alt, altidx) -> ParentEvidence
+## (the proband is read once more to collect the candidate sites, unless it comes from stdin)
+site_cache = SiteCache(options.site_cache, verbose=True) # v4 prints '# parent variant found' per parent hit
+proband = (lambda: proband_lines(sample_gvcf, region, contigs, decompress_threads)) if sample_gvcf != '-' else None
+fa, mo = open_parents(engine, fa_gvcf, mo_gvcf, proband, plan, site_cache)
+prof.enter('setup')
 
 ## iterate over proband gVCF
-#with gzip.open(sample_gvcf, 'rb') as f:
-#  with io.TextIOWrapper(f, encoding='utf-8') as decodef:  
-#    for line in decodef:
+## plain / bgzipped / stdin proband, or only the requested contigs / region via the proband .tbi
+## (progress and ETA come from the position in the proband file, no line-count pre-pass)
+progress = Progress()
+with contextlib.closing(proband_lines(sample_gvcf, region, contigs, decompress_threads, progress, resume)) as f:
 
-with open(sample_gvcf, 'r') as f:
-
-  for line in f:
+  for line in prof.timed(f):
     #print(line)
 
-    tmp = line.strip().split('\t')
+    ## checkpoint where the reader knows the exact offset of this line: all earlier lines are done
+    if progress.resume != None and ckpt.due():
+      outf.checkpoint(ckpt, {'target': progress.target, 'offset': progress.resume, 'lines': i, 'calls': dnct})
 
     ## handle vcf header information
     if line.startswith('##'):
@@ -239,133 +255,38 @@ with open(sample_gvcf, 'r') as f:
     
     ## handle vcf header containing column information
     if line.startswith('#CHROM'):
-      idx = {col:index for index, col in enumerate(tmp)}
+      idx = {col:index for index, col in enumerate(line.strip().split('\t'))}
+      caller = GVCFTrioCaller(sample_id, idx, fa, mo, criteria, prof)
 
     ## handle variant lines
     else:
       i += 1
       if i%1000 == 0:
-        print('## %d/%d lines processed ... '%(i, tot))
-
-
-      ## initialize values to avoid iteration bugs
-      chr, pos, ref, alt = '', '', '',''
-      region = ''
-      info = ''
-      fmt, gt = [], []
-      gtd = {}
-
-
-      ## ignore non-variant blocks 
-      if not 'END=' in line.strip():
-        
-        ## get proband variant information
-        chr, pos, ref = tmp[idx['#CHROM']], tmp[idx['POS']], tmp[idx['REF']]
-
-
-
-        ## parse alt allele
-        alt = tmp[idx['ALT']].strip(',<NON_REF>')
-
-        
-        ## how to handle multiallelic sites? e.g. chr1    1646352 .       A       C,G,<NON_REF>
-        ## iterate over all alternate alleles present in ALT
-        for a in alt.split(','):
-
-
-          if not a == '*': # ignore point deletions for now; messy when matching alleles with parents
-            if len(ref) == 1 and len(a) == 1: # ignore indels for now;
-              
-              
-              # Get index of current alternate allele
-              pb_altidx = alt.split(',').index(a) + 1 
+        print(progress.report(i))
 
-              # get region for tabixing parents
-              region = chr + ':' + pos + '-' + pos
-
-
-
-
-              # save INFO field
-              info = tmp[idx['INFO']]
-
-              # create dictionary of FORMAT:GT mapping
-              fmt = tmp[idx['FORMAT']].split(':')
-              gt = tmp[-1].split(':') ## ASSUMES THAT SAMPLE GENOTYPE INFORMATION IS IN THE LAST COLUMN; didn't use ID since column ID differs from sample id....
-
-              gtd = dict(zip(fmt, gt)) # e.g. {'GT': '0/1', 'AD': '5,7,0', 'GQ': '99', 'PL': '157,0,104,172,125,297', 'SB': '5,0,7,0', 'DP': '12'}
-              
-              print(region)
-              #print(gtd)
-
-
-              if not gtd['GT'] == './.': ## ignore sites with missing genotypes
-                if ('AD'in gtd) and ('DP' in gtd): # ignore sites with no AD or DP information
-
-                  ## parse strand-specific allelic depth information
-                  adf = gtd['F1R2']
-                  adr = gtd['F2R1']
-
-                  adfref = adf.split(',')[0]
-                  adrref = adr.split(',')[0]
-
-                  adfalt = adf.split(',')[pb_altidx]
-                  adralt = adr.split(',')[pb_altidx]
-
-                  pb_refdp = int(gtd['AD'].split(',')[0])
-                  pb_altdp = int(gtd['AD'].split(',')[pb_altidx])
-                  pb_dp = int(gtd['DP'])
-
-                  if pb_dp > 0:
-                    pb_vaf = float(pb_altdp)/float(pb_dp)
-                  else:
-                    pb_vaf = 0.0
-
-                  ## parse father gvcf using tabix
-                  fa_d = parse_parent(fa_gvcf, region, chr, pos, ref, a)
-
-                  fa_altdp = fa_d['altdp']
-                  fa_dp = fa_d['dp']
-                  fa_fmt = fa_d['fmt']
-                  fa_gt = fa_d['gt']
-
-                  ## parse mother gvcf using tabix
-                  mo_d = parse_parent(mo_gvcf, region, chr, pos, ref, a)
-
-                  mo_altdp = mo_d['altdp']
-                  mo_dp = mo_d['dp']
-                  mo_fmt = mo_d['fmt']
-                  mo_gt = mo_d['gt']
-
-                  
-
-                  ## APPLY DE NOVO CALLING CRITERIA
-                  if not (int(pb_refdp) == 0): # ignore hom alt sites
-                    if float(pb_vaf) >= float(pb_min_vaf):
-                      if int(fa_altdp) <= int(par_max_alt) and int(mo_altdp) <= int(par_max_alt):
-                        if int(fa_dp) >= int(par_min_dp) and int(mo_dp) >= int(par_min_dp):
-                          out = map(str, [sample_id, chr.strip('chr'), pos, ref, a, pb_refdp, pb_altdp, pb_dp, adfref, adfalt, adrref, adralt])
-
-                          #print '\t'.join(out) + '\t' + '\t'.join(tmp) + '\t' + tmpfa_d['FORMAT'] + '\t' + tmpfa[-1] + '\t' + tmpmo_d['FORMAT'] + '\t' + tmpmo[-1]
-                          #outf.write('\t'.join(out) + '\t' + '\t'.join(tmp) + '\t' + tmpfa_d['FORMAT'] + '\t' + tmpfa[-1] + '\t' + tmpmo_d['FORMAT'] + '\t' + tmpmo[-1] + '\n')
-                          outstring = '\t'.join(out) + '\t' + '\t'.join(tmp) + '\t' + fa_fmt + '\t' + fa_gt + '\t' + mo_fmt + '\t' + mo_gt
-                          print(outstring)
-                          outf.write(outstring + '\n')
-                          # deal with empty output?
-                          outf.flush()
-                          os.fsync(outf)
-
-                          dnct += 1
-
-                          print('## %d de novo variants found ...'%(dnct))
+      ## reference blocks, indels and '*' alleles are rejected on the raw line, before splitting it
+      if not snv_candidate(line):
+        prof.rejected(line)
+        continue
+      prof.count('candidates')
 
+      ## split multiallelic sites, proband + parent evidence per SNV allele, de novo calling criteria
+      for record in caller.call(line.strip().split('\t')):
+        ## joined and written on the writer thread
+        outf.write_record(record)
 
+        dnct += 1
 
+        print('## %d de novo variants found ...'%(dnct))
 
 
+prof.enter('finish')
 outf.close()
+ckpt.remove()
+prof.info['site_cache'] = {'size': site_cache.size, 'hits': site_cache.hits, 'misses': site_cache.misses}
 
-
+fa.close()
+mo.close()
 
 
 